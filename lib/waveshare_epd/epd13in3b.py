@@ -30,11 +30,16 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 960
 EPD_HEIGHT      = 680
 
+# Frame upload is bus bound on this panel, clock it above the 4 MHz default.
+# EPD_SPI_SPEED_HZ in .env overrides it.
+SPI_SPEED_HZ    = 10000000
+
 GRAY1  = 0xff #white
 GRAY2  = 0xC0
 GRAY3  = 0x80 #gray
@@ -43,65 +48,57 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
-        if (epdconfig.module_init() != 0):
-            return -1
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.SPI.writebytes2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
-            epdconfig.delay_ms(20)
-        epdconfig.delay_ms(20)
+        self.backend.wait_busy(1)
+        self.backend.delay_ms(20)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xF7)
+        self.send(0x22, 0xF7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
 
     def TurnOnDisplay_Part(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xFF)
+        self.send(0x22, 0xFF) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
         
     def init(self):
+        if (self.backend.module_init(speed_hz=SPI_SPEED_HZ) != 0):
+            return -1
         # EPD hardware init start
         self.reset()
         self.ReadBusy()
@@ -109,46 +106,23 @@ class EPD:
         self.send_command(0x12) #SWRESET
         self.ReadBusy()
 
-        self.send_command(0x0C) 
-        self.send_data(0xAE)
-        self.send_data(0xC7)  
-        self.send_data(0xC3)
-        self.send_data(0xC0)
-        self.send_data(0x80)
-
-        self.send_command(0x01) 
-        self.send_data(0xA7)
-        self.send_data(0x02)  
-        self.send_data(0x00)
-
-        self.send_command(0x11) 
-        self.send_data(0x03)
-
-        self.send_command(0x44) 
-        self.send_data(0x00)
-        self.send_data(0x00)  
-        self.send_data(0xBF)
-        self.send_data(0x03) 
+        self.send(0x0C, 0xAE, 0xC7, 0xC3, 0xC0, 0x80)
+
+        self.send(0x01, 0xA7, 0x02, 0x00)
+
+        self.send(0x11, 0x03)
+
+        self.send(0x44, 0x00, 0x00, 0xBF, 0x03)
         
-        self.send_command(0x45) 
-        self.send_data(0x00)
-        self.send_data(0x00)  
-        self.send_data(0xA7)
-        self.send_data(0x02)
+        self.send(0x45, 0x00, 0x00, 0xA7, 0x02)
 
-        self.send_command(0x3C)
-        self.send_data(0x01)
+        self.send(0x3C, 0x01)
 
-        self.send_command(0x18) 
-        self.send_data(0x80)
+        self.send(0x18, 0x80)
 
-        self.send_command(0x4E) 
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x4E, 0x00, 0x00)
 
-        self.send_command(0x4F) 
-        self.send_data(0x00)
-        self.send_data(0x00) 
+        self.send(0x4F, 0x00, 0x00)
         self.ReadBusy()
 
         # EPD hardware init end
@@ -156,46 +130,25 @@ class EPD:
 
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_data2(bytes([0xFF]) * (int(self.width/8) * self.height))
         self.send_command(0x26)
-        self.send_data2([0x00] * (int(self.width/8) * self.height))
+        self.send_data2(bytes([0x00]) * (int(self.width/8) * self.height))
 
         self.TurnOnDisplay()
 
     def Clear_Base(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_data2(bytes([0xFF]) * (int(self.width/8) * self.height))
         self.send_command(0x26)
-        self.send_data2([0x00] * (int(self.width/8) * self.height))
+        self.send_data2(bytes([0x00]) * (int(self.width/8) * self.height))
 
         self.TurnOnDisplay()
         self.send_command(0x26)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_data2(bytes([0xFF]) * (int(self.width/8) * self.height))
     
     def display(self, blackimage, ryimage):
         if(self.width % 8 == 0):
@@ -209,7 +162,7 @@ class EPD:
         if (ryimage != None):
             for j in range(Height):
                 for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
+                    ryimage[i + j * Width] = ~ryimage[i + j * Width] & 0xFF
             self.send_command(0x26)
             self.send_data2(ryimage)
 
@@ -227,7 +180,7 @@ class EPD:
         if (ryimage != None):
             for j in range(Height):
                 for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
+                    ryimage[i + j * Width] = ~ryimage[i + j * Width] & 0xFF
             self.send_command(0x26)
             self.send_data2(ryimage)
 
@@ -256,26 +209,13 @@ class EPD:
         Xend -= 1
         Yend -= 1
 
-        self.send_command(0x3C) 
-        self.send_data(0x80)
+        self.send(0x3C, 0x80)
 	
-        self.send_command(0x44) 
-        self.send_data((Xstart*8) & 0xff) 
-        self.send_data((Xstart>>5) & 0x01) 
-        self.send_data((Xend*8) & 0xff)  
-        self.send_data((Xend>>5) & 0x01) 
-        self.send_command(0x45)   
-        self.send_data(Ystart & 0xff) 
-        self.send_data((Ystart>>8) & 0x01)  
-        self.send_data(Yend & 0xff) 
-        self.send_data((Yend>>8) & 0x01)   
-
-        self.send_command(0x4E) 
-        self.send_data((Xstart*8) & 0xff)
-        self.send_data((Xstart>>5) & 0x01)  
-        self.send_command(0x4F) 
-        self.send_data(Ystart & 0xff)
-        self.send_data((Ystart>>8) & 0x01)
+        self.send(0x44, (Xstart*8) & 0xff, (Xstart>>5) & 0x01, (Xend*8) & 0xff, (Xend>>5) & 0x01)
+        self.send(0x45, Ystart & 0xff, (Ystart>>8) & 0x01, Yend & 0xff, (Yend>>8) & 0x01)
+
+        self.send(0x4E, (Xstart*8) & 0xff, (Xstart>>5) & 0x01)
+        self.send(0x4F, Ystart & 0xff, (Ystart>>8) & 0x01)
 
         self.send_command(0x24) 
         for j in range(Height):
@@ -291,9 +231,8 @@ class EPD:
                     self.send_data(Image[i + j * Width])
 
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP
-        self.send_data(0x03)
+        self.send(0x10, 0x03) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 80
@@ -38,11 +39,13 @@ EPD_HEIGHT      = 128
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
     
@@ -91,40 +94,32 @@ class EPD:
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)         # module reset
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)         # module reset
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        busy =not(busy & 0x01)
-        while(busy):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-            busy =not(busy & 0x01)
-        epdconfig.delay_ms(800)
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0x71), poll_ms=0)
+        self.backend.delay_ms(800)
         logger.debug("e-Paper busy release")        
 
     def TurnOnDisplay(self):
         self.send_command(0x12)
-        epdconfig.delay_ms(10)
+        self.backend.delay_ms(10)
         self.ReadBusy()
 
     def SetFulltReg(self):
@@ -146,13 +141,12 @@ class EPD:
             self.send_data(self.lut_b[count])     
 
     def Init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0xD2)			
-        self.send_data(0x3F)
+        self.send(0xD2, 0x3F)
 
         self.send_command(0x00)  			
         self.send_data (0x6F)  #from outside
@@ -163,31 +157,25 @@ class EPD:
         self.send_data (0x2b)		
         self.send_data (0x2b) 
 
-        self.send_command(0x06)  #Configuring the charge pump
-        self.send_data(0x3f)
+        self.send(0x06, 0x3f) #Configuring the charge pump
 
-        self.send_command(0x2A)  #Setting XON and the options of LUT
-        self.send_data(0x00) 
-        self.send_data(0x00) 
+        self.send(0x2A, 0x00, 0x00) #Setting XON and the options of LUT
 
-        self.send_command(0x30)  #Set the clock frequency
-        self.send_data(0x17) #50Hz
+        self.send(0x30, #Set the clock frequency
+                  0x17) #50Hz
 
-        self.send_command(0x50)  #Set VCOM and data output interval
-        self.send_data(0x57)			
+        self.send(0x50, 0x57) #Set VCOM and data output interval
 
-        self.send_command(0x60)  #Set The non-overlapping period of Gate and Source.
-        self.send_data(0x22)
+        self.send(0x60, 0x22) #Set The non-overlapping period of Gate and Source.
 
         self.send_command(0x61)  #resolution setting
         self.send_data (0x50)    #source 128 	 
         self.send_data (0x80)       
 
-        self.send_command(0x82)  #sets VCOM_DC value
-        self.send_data(0x12)  #-1v
+        self.send(0x82, #sets VCOM_DC value
+                  0x12) #-1v
 
-        self.send_command(0xe3)#Set POWER SAVING
-        self.send_data(0x33)
+        self.send(0xe3, 0x33) #Set POWER SAVING
         self.SetFulltReg()	
         self.send_command(0x04)     		#power on
         self.ReadBusy()
@@ -197,8 +185,7 @@ class EPD:
     def Partial_Init(self):
         self.reset()
         
-        self.send_command(0xD2)
-        self.send_data(0x3F)
+        self.send(0xD2, 0x3F)
 
         self.send_command(0x00)
         self.send_data (0x6F)  #from outside
@@ -209,27 +196,20 @@ class EPD:
         self.send_data (0x2b)
         self.send_data (0x2b)
 
-        self.send_command(0x06)  #Configuring the charge pump
-        self.send_data(0x3f)
+        self.send(0x06, 0x3f) #Configuring the charge pump
 
-        self.send_command(0x2A)  #Setting XON and the options of LUT
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x2A, 0x00, 0x00) #Setting XON and the options of LUT
 
-        self.send_command(0x30)  #Set the clock frequency
-        self.send_data(0x17)
+        self.send(0x30, 0x17) #Set the clock frequency
 
-        self.send_command(0x50)  #Set VCOM and data output interval
-        self.send_data(0xf2)
+        self.send(0x50, 0xf2) #Set VCOM and data output interval
 
-        self.send_command(0x60)  #Set The non-overlapping period of Gate and Source.
-        self.send_data(0x22)
+        self.send(0x60, 0x22) #Set The non-overlapping period of Gate and Source.
 
-        self.send_command(0x82)  #Set VCOM_DC value
-        self.send_data(0x12)#-1v
+        self.send(0x82, #Set VCOM_DC value
+                  0x12) #-1v
 
-        self.send_command(0xe3)#Set POWER SAVING
-        self.send_data(0x33)
+        self.send(0xe3, 0x33) #Set POWER SAVING
 
         self.SetPartReg()	
 
@@ -239,26 +219,7 @@ class EPD:
         return 0
     
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -304,9 +265,9 @@ class EPD:
 
         # Set partial Windows */
         self.send_command(0x91)		#This command makes the display enter partial mode
-        self.send_command(0x90)		#resolution setting
-        self.send_data(0)           #x-start
-        self.send_data(79)       #x-end
+        self.send(0x90, #resolution setting
+                  0, #x-start
+                  79) #x-end
 
         self.send_data(0)
         self.send_data(127)  #y-end
@@ -334,16 +295,14 @@ class EPD:
         self.TurnOnDisplay()
 
     def Sleep(self):
-        self.send_command(0x50)
-        self.send_data(0xf7)
+        self.send(0x50, 0xf7)
         self.send_command(0x02)
         self.ReadBusy()
-        self.send_command(0x07)
-        self.send_data(0xA5)
-        epdconfig.delay_ms(200)
+        self.send(0x07, 0xA5)
+        self.backend.delay_ms(200)
 
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
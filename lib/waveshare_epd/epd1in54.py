@@ -81,6 +81,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
@@ -89,11 +90,13 @@ EPD_HEIGHT      = 200
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
@@ -113,34 +116,30 @@ class EPD:
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)         # module reset
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)         # module reset
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        self.backend.wait_busy(1)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xC4)
+        self.send(0x22, 0xC4) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.send_command(0xFF) # TERMINATE_FRAME_READ_WRITE
         
@@ -151,49 +150,40 @@ class EPD:
         # x point must be the multiple of 8 or the last 3 bits will be ignored
         self.send_data((x_start >> 3) & 0xFF)
         self.send_data((x_end >> 3) & 0xFF)
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        self.send(0x45, y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_START_END_POSITION
 
     def SetCursor(self, x, y):
         self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
         # x point must be the multiple of 8 or the last 3 bits will be ignored
         self.send_data((x >> 3) & 0xFF)
         
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        self.send(0x4F, y & 0xFF, (y >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_COUNTER
         # self.ReadBusy()
         
     def init(self, lut):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01) # DRIVER_OUTPUT_CONTROL
-        self.send_data((EPD_HEIGHT - 1) & 0xFF)
-        self.send_data(((EPD_HEIGHT - 1) >> 8) & 0xFF)
-        self.send_data(0x00) # GD = 0 SM = 0 TB = 0
+        self.send(0x01, # DRIVER_OUTPUT_CONTROL
+                  (EPD_HEIGHT - 1) & 0xFF,
+                  ((EPD_HEIGHT - 1) >> 8) & 0xFF,
+                  0x00) # GD = 0 SM = 0 TB = 0
         
-        self.send_command(0x0C) # BOOSTER_SOFT_START_CONTROL
-        self.send_data(0xD7)
-        self.send_data(0xD6)
-        self.send_data(0x9D)
+        self.send(0x0C, 0xD7, 0xD6, 0x9D) # BOOSTER_SOFT_START_CONTROL
         
-        self.send_command(0x2C) # WRITE_VCOM_REGISTER
-        self.send_data(0xA8) # VCOM 7C
+        self.send(0x2C, # WRITE_VCOM_REGISTER
+                  0xA8) # VCOM 7C
         
-        self.send_command(0x3A) # SET_DUMMY_LINE_PERIOD
-        self.send_data(0x1A) # 4 dummy lines per gate
+        self.send(0x3A, # SET_DUMMY_LINE_PERIOD
+                  0x1A) # 4 dummy lines per gate
         
-        self.send_command(0x3B) # SET_GATE_TIME
-        self.send_data(0x08) # 2us per line
+        self.send(0x3B, # SET_GATE_TIME
+                  0x08) # 2us per line
         
-        self.send_command(0x11) # DATA_ENTRY_MODE_SETTING
-        self.send_data(0x03) # X increment Y increment
+        self.send(0x11, # DATA_ENTRY_MODE_SETTING
+                  0x03) # X increment Y increment
         
         # set the look-up table register
         self.send_command(0x32)
@@ -203,26 +193,7 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -240,21 +211,20 @@ class EPD:
         # self.SetWindow(0, 0, self.width - 1, self.height - 1)
         # send the color data
         self.SetWindow(0, 0, self.width, self.height)
-        # epdconfig.digital_write(self.dc_pin, 1)
-        # epdconfig.digital_write(self.cs_pin, 0)
+        # self.backend.digital_write(self.dc_pin, 1)
+        # self.backend.digital_write(self.cs_pin, 0)
         for j in range(0, self.height):
             self.SetCursor(0, j)
             self.send_command(0x24)
             for i in range(0, int(self.width / 8)):
                 self.send_data(color)
-        # epdconfig.digital_write(self.cs_pin, 1)
+        # self.backend.digital_write(self.cs_pin, 1)
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send(0x10, 0x01) # DEEP_SLEEP_MODE
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
@@ -37,11 +38,13 @@ EPD_HEIGHT      = 200
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         
@@ -93,47 +96,39 @@ class EPD:
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
     
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):
-            epdconfig.delay_ms(20)
+        self.backend.wait_busy(1)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xc7)
+        self.send(0x22, 0xc7) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
     
     def TurnOnDisplayPart(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xcF)
+        self.send(0x22, 0xcF) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
 
@@ -144,42 +139,27 @@ class EPD:
     def set_lut(self, lut):
         self.lut(lut)
         
-        self.send_command(0x3f)
-        self.send_data(lut[153])
+        self.send(0x3f, lut[153])
         
-        self.send_command(0x03)
-        self.send_data(lut[154])
+        self.send(0x03, lut[154])
         
-        self.send_command(0x04)
-        self.send_data(lut[155])
-        self.send_data(lut[156])
-        self.send_data(lut[157])
+        self.send(0x04, lut[155], lut[156], lut[157])
         
-        self.send_command(0x2c)
-        self.send_data(lut[158])
+        self.send(0x2c, lut[158])
       
     def SetWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((Xstart>>3) & 0xFF)
-        self.send_data((Xend>>3) & 0xFF)
+        self.send(0x44, (Xstart>>3) & 0xFF, (Xend>>3) & 0xFF) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0xFF)
-        self.send_data(Yend & 0xFF)
-        self.send_data((Yend >> 8) & 0xFF)
+        self.send(0x45, Ystart & 0xFF, (Ystart >> 8) & 0xFF, Yend & 0xFF, (Yend >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_START_END_POSITION
     
 
     def SetCursor(self, Xstart, Ystart):
-        self.send_command(0x4E); # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(Xstart & 0xFF);
+        self.send(0x4E, Xstart & 0xFF) # SET_RAM_X_ADDRESS_COUNTER
 
-        self.send_command(0x4F); # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(Ystart & 0xFF);
-        self.send_data((Ystart >> 8) & 0xFF);
+        self.send(0x4F, Ystart & 0xFF, (Ystart >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_COUNTER
 
     def init(self, isPartial):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         if(isPartial):
@@ -189,23 +169,11 @@ class EPD:
             
             self.set_lut(self.WF_PARTIAL_1IN54_0)
             
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
+            self.send(0x37, 0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00)
             
-            self.send_command(0x3c)  # BorderWavefrom
-            self.send_data(0x80)
+            self.send(0x3c, 0x80) # BorderWavefrom
             
-            self.send_command(0x22)
-            self.send_data(0xc0)
+            self.send(0x22, 0xc0)
             self.send_command(0x20)
             self.ReadBusy()
         
@@ -218,24 +186,20 @@ class EPD:
             self.send_command(0x12) # SWRESET (software reset)
             self.ReadBusy()
             
-            self.send_command(0x01) # DRIVER_OUTPUT_CONTROL
-            self.send_data(0xC7) # (EPD_HEIGHT - 1) & 0xFF
-            self.send_data(0x00) # ((EPD_HEIGHT - 1) >> 8) & 0xFF
-            self.send_data(0x01) # GD = 0 SM = 0 TB = 0
+            self.send(0x01, # DRIVER_OUTPUT_CONTROL
+                      0xC7, # (EPD_HEIGHT - 1) & 0xFF
+                      0x00, # ((EPD_HEIGHT - 1) >> 8) & 0xFF
+                      0x01) # GD = 0 SM = 0 TB = 0
             
-            self.send_command(0x11) # data entry mode
-            self.send_data(0x01)
+            self.send(0x11, 0x01) # data entry mode
                       
             self.SetWindows(0, self.height-1, self.width-1, 0) # Set Windows
     
-            self.send_command(0x3C) # BorderWavefrom
-            self.send_data(0x01)
+            self.send(0x3C, 0x01) # BorderWavefrom
 
-            self.send_command(0x18)
-            self.send_data(0x80)
+            self.send(0x18, 0x80)
 
-            self.send_command(0x22) # #Load Temperature and waveform setting.
-            self.send_data(0XB1)
+            self.send(0x22, 0XB1) # #Load Temperature and waveform setting.
             self.send_command(0x20)
 
             self.SetCursor(0, self.height-1) # Set Cursor
@@ -251,31 +215,12 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24)
-        self.send_data2([color] * self.height * linewidth)
+        self.send_data2(bytes([color]) * self.height * linewidth)
                 
         self.TurnOnDisplay()
         
     def getbuffer(self, image):
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -307,11 +252,10 @@ class EPD:
         self.TurnOnDisplayPart()
         
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send(0x10, 0x01) # DEEP_SLEEP_MODE
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
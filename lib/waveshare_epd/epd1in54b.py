@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
@@ -37,11 +38,13 @@ EPD_HEIGHT      = 200
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
@@ -56,29 +59,26 @@ class EPD:
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0) # module reset
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0) # module reset
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):
-            epdconfig.delay_ms(100)    
+        self.backend.wait_busy(0)
         logger.debug("e-Paper busy release")
       
     def set_lut_bw(self):
@@ -110,58 +110,35 @@ class EPD:
             self.send_data(self.lut_red1[count])
             
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01) # POWER_SETTING
-        self.send_data(0x07)
-        self.send_data(0x00)
-        self.send_data(0x08)
-        self.send_data(0x00)
-        self.send_command(0x06) # BOOSTER_SOFT_START
-        self.send_data(0x07)
-        self.send_data(0x07)
-        self.send_data(0x07)
+        self.send(0x01, 0x07, 0x00, 0x08, 0x00) # POWER_SETTING
+        self.send(0x06, 0x07, 0x07, 0x07) # BOOSTER_SOFT_START
         self.send_command(0x04) # POWER_ON
 
         self.ReadBusy()
 
-        self.send_command(0X00) # PANEL_SETTING
-        self.send_data(0xCF)
-        self.send_command(0X50) # VCOM_AND_DATA_INTERVAL_SETTING
-        self.send_data(0x17)
-        self.send_command(0x30) # PLL_CONTROL
-        self.send_data(0x39)
-        self.send_command(0x61) # TCON_RESOLUTION set x and y
-        self.send_data(0xC8)
-        self.send_data(0x00)
-        self.send_data(0xC8)
-        self.send_command(0x82) # VCM_DC_SETTING_REGISTER
-        self.send_data(0x0E)
+        self.send(0X00, 0xCF) # PANEL_SETTING
+        self.send(0X50, 0x17) # VCOM_AND_DATA_INTERVAL_SETTING
+        self.send(0x30, 0x39) # PLL_CONTROL
+        self.send(0x61, 0xC8, 0x00, 0xC8) # TCON_RESOLUTION set x and y
+        self.send(0x82, 0x0E) # VCM_DC_SETTING_REGISTER
         
         self.set_lut_bw()
         self.set_lut_red()
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * int(self.width * self.height / 8)
-        # Set buffer to value of Python Imaging Library image.
-        # Image must be in mode 1.
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
+        # Image must be same dimensions as display, it is not rotated.
+        imwidth, imheight = image.size
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).' .format(self.width, self.height))
 
-        pixels = image_monocolor.load()
-        for y in range(self.height):
-            for x in range(self.width):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[x, y] == 0:
-                    buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, blackimage, redimage):
         # send black data
@@ -202,21 +179,19 @@ class EPD:
         self.ReadBusy()
 
     def sleep(self):
-        self.send_command(0x50) # VCOM_AND_DATA_INTERVAL_SETTING
-        self.send_data(0x17)
-        self.send_command(0x82) # to solve Vcom drop 
-        self.send_data(0x00)        
-        self.send_command(0x01) # power setting      
-        self.send_data(0x02) # gate switch to external
-        self.send_data(0x00)
-        self.send_data(0x00) 
-        self.send_data(0x00) 
+        self.send(0x50, 0x17) # VCOM_AND_DATA_INTERVAL_SETTING
+        self.send(0x82, 0x00) # to solve Vcom drop 
+        self.send(0x01, # power setting      
+                  0x02, # gate switch to external
+                  0x00,
+                  0x00,
+                  0x00)
         self.ReadBusy()
         
         self.send_command(0x02) # power off
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 200
@@ -37,51 +38,47 @@ EPD_HEIGHT      = 200
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0) # module reset
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0) # module reset
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):
-            epdconfig.delay_ms(100)    
+        self.backend.wait_busy(1)
         logger.debug("e-Paper busy release")
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -90,55 +87,37 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy()   
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xC7)
-        self.send_data(0x00)
-        self.send_data(0x01)
+        self.send(0x01, 0xC7, 0x00, 0x01) #Driver output control      
 
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x01)
+        self.send(0x11, 0x01) #data entry mode       
 
-        self.send_command(0x44) #set Ram-X address start/end position   
-        self.send_data(0x00)
-        self.send_data(0x18)    #0x18-->(24+1)*8=200
+        self.send(0x44, #set Ram-X address start/end position   
+                  0x00,
+                  0x18) #0x18-->(24+1)*8=200
 
-        self.send_command(0x45) #set Ram-Y address start/end position          
-        self.send_data(0xC7)    #0xC7-->(199+1)=200
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00) 
+        self.send(0x45, #set Ram-Y address start/end position          
+                  0xC7, #0xC7-->(199+1)=200
+                  0x00,
+                  0x00,
+                  0x00)
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x05)
+        self.send(0x3C, 0x05) #BorderWavefrom
 
-        self.send_command(0x18) #Read built-in temperature sensor
-        self.send_data(0x80)
+        self.send(0x18, 0x80) #Read built-in temperature sensor
 
-        self.send_command(0x4E)   # set RAM x address count to 0
-        self.send_data(0x00)
-        self.send_command(0x4F)   # set RAM y address count to 0X199    
-        self.send_data(0xC7)
-        self.send_data(0x00)
+        self.send(0x4E, 0x00) # set RAM x address count to 0
+        self.send(0x4F, 0xC7, 0x00) # set RAM y address count to 0X199    
         self.ReadBusy()
         return 0
 
     def getbuffer(self, image):
-        buf = [0xFF] * int(self.width * self.height / 8)
-        # Set buffer to value of Python Imaging Library image.
-        # Image must be in mode 1.
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
+        # Image must be same dimensions as display, it is not rotated.
+        imwidth, imheight = image.size
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).' .format(self.width, self.height))
 
-        pixels = image_monocolor.load()
-        for y in range(self.height):
-            for x in range(self.width):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[x, y] == 0:
-                    buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, blackimage, redimage):
 
@@ -161,8 +140,7 @@ class EPD:
                 buf[i] = ~redimage[i]
             self.send_data2(buf)
 
-        self.send_command(0x22) # DISPLAY_REFRESH
-        self.send_data(0xF7)
+        self.send(0x22, 0xF7) # DISPLAY_REFRESH
         self.send_command(0x20) # DISPLAY_REFRESH
         self.ReadBusy()
 
@@ -173,23 +151,21 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24) # DATA_START_TRANSMISSION_1
-        self.send_data2([0xff] * int(self.height * linewidth))
+        self.send_data2(bytes([0xff]) * int(self.height * linewidth))
             
         self.send_command(0x26) # DATA_START_TRANSMISSION_2
-        self.send_data2([0x00] * int(self.height * linewidth))
+        self.send_data2(bytes([0x00]) * int(self.height * linewidth))
 
-        self.send_command(0x22) # DISPLAY_REFRESH
-        self.send_data(0xF7)
+        self.send(0x22, 0xF7) # DISPLAY_REFRESH
         self.send_command(0x20) # DISPLAY_REFRESH
         self.ReadBusy()
 
 
     def sleep(self):
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x01) 
+        self.send(0x10, 0x01) #enter deep sleep
 
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from PIL import Image
 
 # Display resolution
 EPD_WIDTH       = 122
@@ -38,11 +39,13 @@ EPD_HEIGHT      = 250
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         
@@ -86,50 +89,42 @@ class EPD:
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)    
+        self.backend.wait_busy(1)      # 0: idle, 1: busy
 
     def TurnOnDisplay(self):
-        self.send_command(0x22)
-        self.send_data(0xC7)
+        self.send(0x22, 0xC7)
         self.send_command(0x20)        
         self.ReadBusy()
         
     def TurnOnDisplayPart(self):
-        self.send_command(0x22)
-        self.send_data(0x0c)
+        self.send(0x22, 0x0c)
         self.send_command(0x20)        
         self.ReadBusy()
         
     def init(self, update):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -138,61 +133,45 @@ class EPD:
             self.send_command(0x12) # soft reset
             self.ReadBusy()
 
-            self.send_command(0x74) #set analog block control
-            self.send_data(0x54)
-            self.send_command(0x7E) #set digital block control
-            self.send_data(0x3B)
+            self.send(0x74, 0x54) #set analog block control
+            self.send(0x7E, 0x3B) #set digital block control
 
-            self.send_command(0x01) #Driver output control
-            self.send_data(0xF9)
-            self.send_data(0x00)
-            self.send_data(0x00)
+            self.send(0x01, 0xF9, 0x00, 0x00) #Driver output control
 
-            self.send_command(0x11) #data entry mode
-            self.send_data(0x01)
+            self.send(0x11, 0x01) #data entry mode
 
-            self.send_command(0x44) #set Ram-X address start/end position
-            self.send_data(0x00)
-            self.send_data(0x0F)    #0x0C-->(15+1)*8=128
+            self.send(0x44, #set Ram-X address start/end position
+                      0x00,
+                      0x0F) #0x0C-->(15+1)*8=128
 
-            self.send_command(0x45) #set Ram-Y address start/end position
-            self.send_data(0xF9)   #0xF9-->(249+1)=250
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
+            self.send(0x45, #set Ram-Y address start/end position
+                      0xF9, #0xF9-->(249+1)=250
+                      0x00,
+                      0x00,
+                      0x00)
             
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x03)
+            self.send(0x3C, 0x03) #BorderWavefrom
 
-            self.send_command(0x2C)     #VCOM Voltage
-            self.send_data(0x55)    #
+            self.send(0x2C, #VCOM Voltage
+                      0x55) #
 
-            self.send_command(0x03)
-            self.send_data(self.lut_full_update[70])
+            self.send(0x03, self.lut_full_update[70])
 
-            self.send_command(0x04) #
-            self.send_data(self.lut_full_update[71])
-            self.send_data(self.lut_full_update[72])
-            self.send_data(self.lut_full_update[73])
+            self.send(0x04, self.lut_full_update[71], self.lut_full_update[72], #
+                      self.lut_full_update[73])
 
-            self.send_command(0x3A)     #Dummy Line
-            self.send_data(self.lut_full_update[74])
-            self.send_command(0x3B)     #Gate time
-            self.send_data(self.lut_full_update[75])
+            self.send(0x3A, self.lut_full_update[74]) #Dummy Line
+            self.send(0x3B, self.lut_full_update[75]) #Gate time
 
             self.send_command(0x32)
             for count in range(70):
                 self.send_data(self.lut_full_update[count])
 
-            self.send_command(0x4E)   # set RAM x address count to 0
-            self.send_data(0x00)
-            self.send_command(0x4F)   # set RAM y address count to 0X127
-            self.send_data(0xF9)
-            self.send_data(0x00)
+            self.send(0x4E, 0x00) # set RAM x address count to 0
+            self.send(0x4F, 0xF9, 0x00) # set RAM y address count to 0X127
             self.ReadBusy()
         else:
-            self.send_command(0x2C)     #VCOM Voltage
-            self.send_data(0x26)
+            self.send(0x2C, 0x26) #VCOM Voltage
 
             self.ReadBusy()
 
@@ -200,22 +179,13 @@ class EPD:
             for count in range(70):
                 self.send_data(self.lut_partial_update[count])
 
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-
-            self.send_command(0x22)
-            self.send_data(0xC0)
+            self.send(0x37, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00)
+
+            self.send(0x22, 0xC0)
             self.send_command(0x20)
             self.ReadBusy()
 
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x01)
+            self.send(0x3C, 0x01) #BorderWavefrom
         return 0
 
     def getbuffer(self, image):
@@ -223,29 +193,19 @@ class EPD:
             linewidth = int(self.width/8)
         else:
             linewidth = int(self.width/8) + 1
-         
-        buf = [0xFF] * (linewidth * self.height)
+
         image_monocolor = image.convert('1')
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        
+        buf = Image.new('1', (linewidth * 8, self.height), 1)
+
         if(imwidth == self.width and imheight == self.height):
             logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):                    
-                    if pixels[x, y] == 0:
-                        x = imwidth - x
-                        buf[int(x / 8) + y * linewidth] &= ~(0x80 >> (x % 8))
+            # rows go out mirrored, one pixel to the right
+            buf.paste(image_monocolor.transpose(Image.Transpose.FLIP_LEFT_RIGHT), (1, 0))
         elif(imwidth == self.height and imheight == self.width):
             logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        newy = imwidth - newy - 1
-                        buf[int(newx / 8) + newy*linewidth] &= ~(0x80 >> (y % 8))
-        return buf   
+            buf.paste(image_monocolor.transpose(Image.Transpose.TRANSPOSE), (0, 0))
+        return bytearray(buf.tobytes('raw'))
         
         
     def display(self, image):
@@ -307,10 +267,9 @@ class EPD:
         # self.send_data(0xC3)
         # self.send_command(0x20)
 
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x03)
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.send(0x10, 0x03) #enter deep sleep
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
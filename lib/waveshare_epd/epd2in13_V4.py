@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 122
@@ -38,11 +39,13 @@ EPD_HEIGHT      = 250
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         
@@ -51,12 +54,12 @@ class EPD:
     parameter:
     '''
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)   
 
     '''
     function :send command
@@ -64,10 +67,7 @@ class EPD:
      command : Command register
     '''
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     '''
     function :send data
@@ -75,17 +75,15 @@ class EPD:
      data : Write data
     '''
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
     
     '''
     function :Wait until the busy_pin goes LOW
@@ -93,8 +91,7 @@ class EPD:
     '''
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)  
+        self.backend.wait_busy(1)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     '''
@@ -102,8 +99,7 @@ class EPD:
     parameter:
     '''
     def TurnOnDisplay(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xf7)
+        self.send(0x22, 0xf7) # Display Update Control
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
 
@@ -112,8 +108,8 @@ class EPD:
     parameter:
     '''
     def TurnOnDisplay_Fast(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xC7)    # fast:0x0c, quality:0x0f, 0xcf
+        self.send(0x22, # Display Update Control
+                  0xC7) # fast:0x0c, quality:0x0f, 0xcf
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
     
@@ -122,8 +118,8 @@ class EPD:
     parameter:
     '''
     def TurnOnDisplayPart(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xff)    # fast:0x0c, quality:0x0f, 0xcf
+        self.send(0x22, # Display Update Control
+                  0xff) # fast:0x0c, quality:0x0f, 0xcf
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
 
@@ -142,11 +138,7 @@ class EPD:
         self.send_data((x_start>>3) & 0xFF)
         self.send_data((x_end>>3) & 0xFF)
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        self.send(0x45, y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_START_END_POSITION
 
     '''
     function : Set Cursor
@@ -159,16 +151,14 @@ class EPD:
         # x point must be the multiple of 8 or the last 3 bits will be ignored
         self.send_data(x & 0xFF)
         
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        self.send(0x4F, y & 0xFF, (y >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_COUNTER
     
     '''
     function : Initialize the e-Paper register
     parameter:
     '''
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -177,26 +167,18 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy() 
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x01, 0xf9, 0x00, 0x00) #Driver output control      
     
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        self.send(0x11, 0x03) #data entry mode       
 
         self.SetWindow(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         
-        self.send_command(0x3c)
-        self.send_data(0x05)
+        self.send(0x3c, 0x05)
 
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
+        self.send(0x21, 0x00, 0x80) #  Display update control
     
-        self.send_command(0x18)
-        self.send_data(0x80)
+        self.send(0x18, 0x80)
         
         self.ReadBusy()
         
@@ -207,7 +189,7 @@ class EPD:
     parameter:
     '''
     def init_fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -218,23 +200,18 @@ class EPD:
         self.send_command(0x18) # Read built-in temperature sensor
         self.send_command(0x80)
 
-        self.send_command(0x11) # data entry mode       
-        self.send_data(0x03)    
+        self.send(0x11, 0x03) # data entry mode       
 
         self.SetWindow(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         
-        self.send_command(0x22) # Load temperature value
-        self.send_data(0xB1)	
+        self.send(0x22, 0xB1) # Load temperature value
         self.send_command(0x20)
         self.ReadBusy()
 
-        self.send_command(0x1A) # Write to temperature register
-        self.send_data(0x64)
-        self.send_data(0x00)
+        self.send(0x1A, 0x64, 0x00) # Write to temperature register
                         
-        self.send_command(0x22) # Load temperature value
-        self.send_data(0x91)	
+        self.send(0x22, 0x91) # Load temperature value
         self.send_command(0x20)
         self.ReadBusy()
         
@@ -245,20 +222,7 @@ class EPD:
         image : Image data
     '''
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height, blank=0x00, rotate_first=True)
         
     '''
     function : Sends the image buffer in RAM to e-Paper and displays
@@ -285,20 +249,15 @@ class EPD:
         image : Image data
     '''
     def displayPartial(self, image):
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)  
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(1)
+        self.backend.digital_write(self.reset_pin, 1)  
 
-        self.send_command(0x3C) # BorderWavefrom
-        self.send_data(0x80)
+        self.send(0x3C, 0x80) # BorderWavefrom
 
-        self.send_command(0x01) # Driver output control      
-        self.send_data(0xF9) 
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x01, 0xF9, 0x00, 0x00) # Driver output control      
 
-        self.send_command(0x11) # data entry mode       
-        self.send_data(0x03)
+        self.send(0x11, 0x03) # data entry mode       
 
         self.SetWindow(0, 0, self.width - 1, self.height - 1)
         self.SetCursor(0, 0)
@@ -332,7 +291,7 @@ class EPD:
         # logger.debug(linewidth)
         
         self.send_command(0x24)
-        self.send_data2([color] * int(self.height * linewidth))  
+        self.send_data2(bytes([color]) * int(self.height * linewidth))  
         self.TurnOnDisplay()
 
     '''
@@ -340,11 +299,10 @@ class EPD:
     parameter:
     '''
     def sleep(self):
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x01)
+        self.send(0x10, 0x01) #enter deep sleep
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 104
@@ -37,89 +38,65 @@ EPD_HEIGHT      = 212
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71);
-        while(epdconfig.digital_read(self.busy_pin) == 0): 
-            self.send_command(0x71);
-            epdconfig.delay_ms(100)
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0x71), poll_ms=100)
         logger.debug("e-Paper busy release")
 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
         self.send_command(0x04);  
         self.ReadBusy();#waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x00);    #panel setting
-        self.send_data(0x0f);   #LUT from OTP,128x296
-        self.send_data(0x89);    #Temperature sensor, boost and other related timing settings
+        self.send(0x00,    #panel setting
+                  0x0f,   #LUT from OTP,128x296
+                  0x89)    #Temperature sensor, boost and other related timing settings
 
         self.send_command(0x61);    #resolution setting
         self.send_data (0x68);  
         self.send_data (0x00);  
         self.send_data (0xD4);
 
-        self.send_command(0X50);    #VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x77);   #WBmode:VBDF 17|D7 VBDW 97 VBDB 57
+        self.send(0X50,    #VCOM AND DATA INTERVAL SETTING
+                  0x77)   #WBmode:VBDF 17|D7 VBDW 97 VBDB 57
                             # WBRmode:VBDF F7 VBDW 77 VBDB 37  VBDR B7
         
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, imageblack, imagered):
         self.send_command(0x10)
@@ -131,7 +108,7 @@ class EPD:
             self.send_data(imagered[i])
         
         self.send_command(0x12) # REFRESH
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
         
     def Clear(self):
@@ -144,18 +121,17 @@ class EPD:
             self.send_data(0xFF)
         
         self.send_command(0x12) # REFRESH
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def sleep(self):
-        self.send_command(0X50) 
-        self.send_data(0xf7)
+        self.send(0X50, 0xf7)
         self.send_command(0X02) 
         self.ReadBusy()
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0xA5) # check code
+        self.send(0x07, # DEEP_SLEEP
+                  0xA5) # check code
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 122
@@ -37,75 +38,62 @@ EPD_HEIGHT      = 250
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
     # hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)   
 
     # send 1 byte command
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
     
     # send 1 byte data
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     # judge e-Paper whether is busy
     def busy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) != 0): 
-            epdconfig.delay_ms(10)
+        self.backend.wait_busy(1)
         logger.debug("e-Paper busy release")
 
     # set the display window
     def set_windows(self, xstart, ystart, xend, yend):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((xstart>>3) & 0xff)
-        self.send_data((xend>>3) & 0xff)
+        self.send(0x44, (xstart>>3) & 0xff, (xend>>3) & 0xff) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(ystart & 0xff)
-        self.send_data((ystart >> 8) & 0xff)
-        self.send_data(yend & 0xff)
-        self.send_data((yend >> 8) & 0xff)
+        self.send(0x45, ystart & 0xff, (ystart >> 8) & 0xff, yend & 0xff, (yend >> 8) & 0xff) # SET_RAM_Y_ADDRESS_START_END_POSITION
         
     # set the display cursor(origin)
     def set_cursor(self, xstart, ystart):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(xstart & 0xff)
+        self.send(0x4E, xstart & 0xff) # SET_RAM_X_ADDRESS_COUNTER
 
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(ystart & 0xff)
-        self.send_data((ystart >> 8) & 0xff)
+        self.send(0x4F, ystart & 0xff, (ystart >> 8) & 0xff) # SET_RAM_Y_ADDRESS_COUNTER
 
     # initialize 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -114,26 +102,18 @@ class EPD:
         self.send_command(0x12)  # SWRESET
         self.busy()   
 
-        self.send_command(0x01) # Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x01, 0xf9, 0x00, 0x00) # Driver output control      
 
-        self.send_command(0x11) # data entry mode       
-        self.send_data(0x03)
+        self.send(0x11, 0x03) # data entry mode       
 
         self.set_windows(0, 0, self.width - 1, self.height - 1)
         self.set_cursor(0, 0)
 
-        self.send_command(0x3C) # BorderWavefrom
-        self.send_data(0x05)	
+        self.send(0x3C, 0x05) # BorderWavefrom
 
-        self.send_command(0x18) # Read built-in temperature sensor
-        self.send_data(0x80)	
+        self.send(0x18, 0x80) # Read built-in temperature sensor
 
-        self.send_command(0x21) # Display update control
-        self.send_data(0x80)	
-        self.send_data(0x80)
+        self.send(0x21, 0x80, 0x80) # Display update control
 
         self.busy()
         
@@ -146,20 +126,7 @@ class EPD:
 
     # image converted to bytearray
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height, blank=0x00, rotate_first=True)
 
     # display image
     def display(self, imageblack, imagered):
@@ -178,7 +145,7 @@ class EPD:
         else:
             linewidth = int(self.width/8) + 1
             
-        buf = [0xff] * (int(linewidth * self.height))
+        buf = bytes([0xff]) * (int(linewidth * self.height))
             
         self.send_command(0x24)
         self.send_data2(buf)
@@ -194,10 +161,10 @@ class EPD:
 
     # sleep
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP
-        self.send_data(0x01) # check code
+        self.send(0x10, # DEEP_SLEEP
+                  0x01) # check code
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 152
@@ -37,11 +38,13 @@ EPD_HEIGHT      = 296
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
@@ -67,86 +70,60 @@ class EPD:
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200) 
+        self.backend.wait_busy(1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release") 
 
 
     def init(self, mode):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         
         self.send_command(0x12)
-        epdconfig.delay_ms(300)
+        self.backend.delay_ms(300)
         self.ReadBusy()
 
-        self.send_command(0x11) # setting gaet number
-        self.send_data(0x03)
-        self.send_command(0x44) # set gate voltage
-        self.send_data(0x01)
-        self.send_data(0x13)
-        self.send_command(0x45) # set source voltage
-        self.send_data(0x0)
-        self.send_data(0x0)
-        self.send_data(0x28)
-        self.send_data(0x01)
+        self.send(0x11, 0x03) # setting gaet number
+        self.send(0x44, 0x01, 0x13) # set gate voltage
+        self.send(0x45, 0x0, 0x0, 0x28, 0x01) # set source voltage
     
         if(mode == 0):      #full
-            self.send_command(0x3C)
-            self.send_data(0x01)
+            self.send(0x3C, 0x01)
             
         elif(mode == 1):        #partial
             self.load_lut(self.WF_PARTIAL)
-            self.send_command(0x37) # set display option, these setting turn on previous function
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-
-            self.send_command(0x3C)
-            self.send_data(0x80)
-
-            self.send_command(0x22)
-            self.send_data(0xcf)
+            self.send(0x37, 0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00) # set display option, these setting turn on previous function
+
+            self.send(0x3C, 0x80)
+
+            self.send(0x22, 0xcf)
             
             self.send_command(0x20)
             self.ReadBusy()
@@ -168,39 +145,15 @@ class EPD:
         self.ReadBusy()
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
 
     def display(self, image):
         if (image == None):
             return            
 
-        self.send_command(0x4E)
-        self.send_data(0x01)
-        self.send_command(0x4F)
-        self.send_data(0x27)
-        self.send_data(0x01)
+        self.send(0x4E, 0x01)
+        self.send(0x4F, 0x27, 0x01)
 
         self.send_command(0x24)
         self.send_data2(image)
@@ -208,18 +161,15 @@ class EPD:
         
 
     def Clear(self):
-        self.send_command(0x4E)
-        self.send_data(0x01)
-        self.send_command(0x4F)
-        self.send_data(0x27)
-        self.send_data(0x01)
+        self.send(0x4E, 0x01)
+        self.send(0x4F, 0x27, 0x01)
 
         if self.width%8 == 0:
             linewidth = int(self.width/8)
         else:
             linewidth = int(self.width/8) + 1
 
-        buf = [0xff] * int(self.height * linewidth)
+        buf = bytes([0xff]) * int(self.height * linewidth)
 
         self.send_command(0x24)
         self.send_data2(buf)   
@@ -231,11 +181,10 @@ class EPD:
 
 
     def sleep(self):
-        self.send_command(0X10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send(0X10, 0x01) # DEEP_SLEEP_MODE
 
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 152
@@ -37,70 +38,63 @@ EPD_HEIGHT      = 296
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(20) 
+        self.backend.wait_busy(1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release") 
 
 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         
         self.send_command(0x12)
-        epdconfig.delay_ms(30)
+        self.backend.delay_ms(30)
         self.ReadBusy()
 
-        self.send_command(0x11) # setting gaet number
-        self.send_data(0x03)
+        self.send(0x11, 0x03) # setting gaet number
         
         self.setWindows(0, 0, self.width-1, self.height-1)
         
-        self.send_command(0x21)
-        self.send_data(0x00)
-        self.send_data(0x80)
+        self.send(0x21, 0x00, 0x80)
         
         self.setCursor(0, 0)
         self.ReadBusy()
@@ -108,51 +102,21 @@ class EPD:
         return 0
 
     def setWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data((Xstart>>3) & 0x1F)
-        self.send_data((Xend>>3) & 0x1F)
+        self.send(0x44, (Xstart>>3) & 0x1F, (Xend>>3) & 0x1F) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0x01)
-        self.send_data(Yend & 0xFF)
-        self.send_data((Yend >> 8) & 0x01)
+        self.send(0x45, Ystart & 0xFF, (Ystart >> 8) & 0x01, Yend & 0xFF, (Yend >> 8) & 0x01) # SET_RAM_Y_ADDRESS_START_END_POSITION
 
     def setCursor(self, Xstart, Ystart):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
-        self.send_data(Xstart & 0x1F)
+        self.send(0x4E, Xstart & 0x1F) # SET_RAM_X_ADDRESS_COUNTER
 
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(Ystart & 0xFF)
-        self.send_data((Ystart >> 8) & 0x01)
+        self.send(0x4F, Ystart & 0xFF, (Ystart >> 8) & 0x01) # SET_RAM_Y_ADDRESS_COUNTER
         
     def turnon_display(self):
         self.send_command(0x20)
         self.ReadBusy()
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, Blackimage, Redimage):
         if (Blackimage == None or Redimage == None):
@@ -176,20 +140,19 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24)
-        self.send_data2([0xff] * int(self.height * linewidth)) 
+        self.send_data2(bytes([0xff]) * int(self.height * linewidth)) 
 
         self.send_command(0x26)
-        self.send_data2([0x00] * int(self.height * linewidth))
+        self.send_data2(bytes([0x00]) * int(self.height * linewidth))
 
         self.turnon_display()
 
 
     def sleep(self):
-        self.send_command(0X10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send(0X10, 0x01) # DEEP_SLEEP_MODE
 
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
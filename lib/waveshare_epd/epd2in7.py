@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 176
@@ -42,11 +43,13 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.GRAY1  = GRAY1 #white
@@ -154,29 +157,29 @@ class EPD:
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    def send_data2(self, data):
+        self.backend.send_data2(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def ReadBusy(self):        
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)                
+        self.backend.wait_busy(0)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def set_lut(self):
@@ -222,80 +225,60 @@ class EPD:
             self.send_data(self.gray_lut_ww[count])
     
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x01) # POWER_SETTING
-        self.send_data(0x03) # VDS_EN, VDG_EN
-        self.send_data(0x00) # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
-        self.send_data(0x2b) # VDH
-        self.send_data(0x2b) # VDL
-        self.send_data(0x09) # VDHR
+        self.send(0x01, # POWER_SETTING
+                  0x03, # VDS_EN, VDG_EN
+                  0x00, # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
+                  0x2b, # VDH
+                  0x2b, # VDL
+                  0x09) # VDHR
         
-        self.send_command(0x06) # BOOSTER_SOFT_START
-        self.send_data(0x07)
-        self.send_data(0x07)
-        self.send_data(0x17)
+        self.send(0x06, 0x07, 0x07, 0x17) # BOOSTER_SOFT_START
         
         # Power optimization
-        self.send_command(0xF8)
-        self.send_data(0x60)
-        self.send_data(0xA5)
+        self.send(0xF8, 0x60, 0xA5)
         
         # Power optimization
-        self.send_command(0xF8)
-        self.send_data(0x89)
-        self.send_data(0xA5)
+        self.send(0xF8, 0x89, 0xA5)
         
         # Power optimization
-        self.send_command(0xF8)
-        self.send_data(0x90)
-        self.send_data(0x00)
+        self.send(0xF8, 0x90, 0x00)
         
         # Power optimization
-        self.send_command(0xF8)
-        self.send_data(0x93)
-        self.send_data(0x2A)
+        self.send(0xF8, 0x93, 0x2A)
         
         # Power optimization
-        self.send_command(0xF8)
-        self.send_data(0xA0)
-        self.send_data(0xA5)
+        self.send(0xF8, 0xA0, 0xA5)
         
         # Power optimization
-        self.send_command(0xF8)
-        self.send_data(0xA1)
-        self.send_data(0x00)
+        self.send(0xF8, 0xA1, 0x00)
         
         # Power optimization
-        self.send_command(0xF8)
-        self.send_data(0x73)
-        self.send_data(0x41)
+        self.send(0xF8, 0x73, 0x41)
         
-        self.send_command(0x16) # PARTIAL_DISPLAY_REFRESH
-        self.send_data(0x00)
+        self.send(0x16, 0x00) # PARTIAL_DISPLAY_REFRESH
         self.send_command(0x04) # POWER_ON
         self.ReadBusy()
 
-        self.send_command(0x00) # PANEL_SETTING
-        self.send_data(0xAF) # KW-BF   KWR-AF    BWROTP 0f
+        self.send(0x00, # PANEL_SETTING
+                  0xAF) # KW-BF   KWR-AF    BWROTP 0f
         
-        self.send_command(0x30) # PLL_CONTROL
-        self.send_data(0x3A) # 3A 100HZ   29 150Hz 39 200HZ    31 171HZ
+        self.send(0x30, # PLL_CONTROL
+                  0x3A) # 3A 100HZ   29 150Hz 39 200HZ    31 171HZ
     
-        self.send_command(0X50)			#VCOM AND DATA INTERVAL SETTING			
-        self.send_data(0x57)
+        self.send(0X50, 0x57) #VCOM AND DATA INTERVAL SETTING			
         
-        self.send_command(0x82) # VCM_DC_SETTING_REGISTER
-        self.send_data(0x12)
+        self.send(0x82, 0x12) # VCM_DC_SETTING_REGISTER
         self.set_lut()
         return 0
 
     def Init_4Gray(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         self.reset()
         
@@ -339,14 +322,13 @@ class EPD:
         self.send_data (0x73)
         self.send_data (0x41)
 
-        self.send_command(0x16)
-        self.send_data(0x00)	
+        self.send(0x16, 0x00)
 
         self.send_command(0x04)
         self.ReadBusy()
 
-        self.send_command(0x00)			#panel setting
-        self.send_data(0xbf)		#KW-BF   KWR-AF	BWROTP 0f
+        self.send(0x00, #panel setting
+                  0xbf) #KW-BF   KWR-AF	BWROTP 0f
 
         self.send_command(0x30)			#PLL setting
         self.send_data (0x90)      	#100hz 
@@ -360,69 +342,14 @@ class EPD:
         self.send_command(0x82)			#vcom_DC setting
         self.send_data (0x12)
 
-        self.send_command(0X50)			#VCOM AND DATA INTERVAL SETTING			
-        self.send_data(0x57)
+        self.send(0X50, 0x57) #VCOM AND DATA INTERVAL SETTING			
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
     
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
-    
+        return epdbuffer.getbuffer_4gray(image, self.width, self.height)
+
     def display(self, image):
         self.send_command(0x10)
         for i in range(0, int(self.width * self.height / 8)):
@@ -434,73 +361,15 @@ class EPD:
         self.ReadBusy()
 
     def display_4Gray(self, image):
+        plane1, plane2 = epdbuffer.split_4gray(image, (0, 0, 1, 1), (0, 1, 0, 1))
+
         self.send_command(0x10)
-        for i in range(0, 5808):                     #5808*4  46464
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x01#white
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x00  #black
-                    elif(temp2 == 0x80): 
-                        temp3 |= 0x01  #gray1
-                    else: #0x40
-                        temp3 |= 0x00 #gray2
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):  #white
-                        temp3 |= 0x01
-                    elif(temp2 == 0x00): #black
-                        temp3 |= 0x00
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01 #gray1
-                    else :   #0x40
-                            temp3 |= 0x00	#gray2	
-                    if(j!=1 or k!=1):				
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-            
+        self.send_data2(plane1)
         self.send_command(0x13)	       
-        for i in range(0, 5808):                #5808*4  46464
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x01#white
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x00  #black
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00  #gray1
-                    else: #0x40
-                        temp3 |= 0x01 #gray2
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):  #white
-                        temp3 |= 0x01
-                    elif(temp2 == 0x00): #black
-                        temp3 |= 0x00
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00 #gray1
-                    else:    #0x40
-                            temp3 |= 0x01	#gray2
-                    if(j!=1 or k!=1):					
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-        
+        self.send_data2(plane2)
         self.gray_SetLut()
         self.send_command(0x12)
-        epdconfig.delay_ms(200)
+        self.backend.delay_ms(200)
         self.ReadBusy()
         # pass
         
@@ -515,13 +384,11 @@ class EPD:
         self.ReadBusy()
 
     def sleep(self):
-        self.send_command(0X50)
-        self.send_data(0xf7)
+        self.send(0X50, 0xf7)
         self.send_command(0X02)
-        self.send_command(0X07)
-        self.send_data(0xA5)
+        self.send(0X07, 0xA5)
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
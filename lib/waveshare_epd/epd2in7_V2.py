@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 176
@@ -42,11 +43,13 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.GRAY1  = GRAY1 #white
@@ -78,52 +81,48 @@ class EPD:
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    def send_data2(self, data):
+        self.backend.send_data2(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def ReadBusy(self):        
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  1: idle, 0: busy
-            epdconfig.delay_ms(20)                
+        self.backend.wait_busy(1)      #  1: idle, 0: busy
         logger.debug("e-Paper busy release")
     
     def TurnOnDisplay(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xF7)
+        self.send(0x22, 0xF7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
         
     def TurnOnDisplay_Fast(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xC7)
+        self.send(0x22, 0xC7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
         
     def TurnOnDisplay_Partial(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xFF)
+        self.send(0x22, 0xFF) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
         
     def TurnOnDisplay_4GRAY(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xC7)
+        self.send(0x22, 0xC7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
         
@@ -133,7 +132,7 @@ class EPD:
             self.send_data(self.LUT_DATA_4Gray[i])
     
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         # EPD hardware init start
@@ -143,22 +142,19 @@ class EPD:
         self.send_command(0x12) #SWRESET
         self.ReadBusy()
 
-        self.send_command(0x45) #set Ram-Y address start/end position          
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x07) #0x0107-->(263+1)=264
-        self.send_data(0x01)
+        self.send(0x45, #set Ram-Y address start/end position          
+                  0x00,
+                  0x00,
+                  0x07, #0x0107-->(263+1)=264
+                  0x01)
 
-        self.send_command(0x4F)   # set RAM y address count to 0;    
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x4F, 0x00, 0x00) # set RAM y address count to 0;    
 
-        self.send_command(0x11)  # data entry mode
-        self.send_data(0x03)
+        self.send(0x11, 0x03) # data entry mode
         return 0
         
     def init_Fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         # EPD hardware init start
@@ -171,159 +167,85 @@ class EPD:
         self.send_command(0x12) #SWRESET
         self.ReadBusy()
 
-        self.send_command(0x18) #Read built-in temperature sensor
-        self.send_data(0x80)	
+        self.send(0x18, 0x80) #Read built-in temperature sensor
 
-        self.send_command(0x22) # Load temperature value
-        self.send_data(0xB1)	
+        self.send(0x22, 0xB1) # Load temperature value
         self.send_command(0x20)	
         self.ReadBusy()
 
-        self.send_command(0x1A) # Write to temperature register
-        self.send_data(0x64)	
-        self.send_data(0x00)	
+        self.send(0x1A, 0x64, 0x00) # Write to temperature register
 
-        self.send_command(0x45) #set Ram-Y address start/end position          
-        self.send_data(0x00)   
-        self.send_data(0x00)
-        self.send_data(0x07) #0x0107-->(263+1)=264
-        self.send_data(0x01)
+        self.send(0x45, #set Ram-Y address start/end position          
+                  0x00,
+                  0x00,
+                  0x07, #0x0107-->(263+1)=264
+                  0x01)
 
-        self.send_command(0x4F)   # set RAM y address count to 0;    
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x4F, 0x00, 0x00) # set RAM y address count to 0;    
 
-        self.send_command(0x11)   # data entry mode      
-        self.send_data(0x03)
+        self.send(0x11, 0x03) # data entry mode      
 
-        self.send_command(0x22) # Load temperature value
-        self.send_data(0x91)	
+        self.send(0x22, 0x91) # Load temperature value
         self.send_command(0x20)	
         self.ReadBusy()
         return 0
 
     def Init_4Gray(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         self.reset()
         
         self.send_command(0x12) # soft reset
         self.ReadBusy();
 
-        self.send_command(0x74) #set analog block control       
-        self.send_data(0x54)
-        self.send_command(0x7E) #set digital block control          
-        self.send_data(0x3B)
+        self.send(0x74, 0x54) #set analog block control       
+        self.send(0x7E, 0x3B) #set digital block control          
         
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x07)
-        self.send_data(0x01)
-        self.send_data(0x00) 
+        self.send(0x01, 0x07, 0x01, 0x00) #Driver output control      
         
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        self.send(0x11, 0x03) #data entry mode       
 
-        self.send_command(0x44) #set Ram-X address start/end position   
-        self.send_data(0x00)
-        self.send_data(0x15)   #0x15-->(21+1)*8=176
+        self.send(0x44, #set Ram-X address start/end position   
+                  0x00,
+                  0x15) #0x15-->(21+1)*8=176
 
-        self.send_command(0x45) #set Ram-Y address start/end position          
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x07) #0x0107-->(263+1)=264
-        self.send_data(0x01)
+        self.send(0x45, #set Ram-Y address start/end position          
+                  0x00,
+                  0x00,
+                  0x07, #0x0107-->(263+1)=264
+                  0x01)
 
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x00)	
+        self.send(0x3C, 0x00) #BorderWavefrom
 
 
-        self.send_command(0x2C)     #VCOM Voltage
-        self.send_data(self.LUT_DATA_4Gray[158])    #0x1C
+        self.send(0x2C, #VCOM Voltage
+                  self.LUT_DATA_4Gray[158]) #0x1C
 
 
-        self.send_command(0x3F) #EOPQ    
-        self.send_data(self.LUT_DATA_4Gray[153])
+        self.send(0x3F, self.LUT_DATA_4Gray[153]) #EOPQ    
 
-        self.send_command(0x03) #VGH      
-        self.send_data(self.LUT_DATA_4Gray[154])
+        self.send(0x03, self.LUT_DATA_4Gray[154]) #VGH      
 
-        self.send_command(0x04) #      
-        self.send_data(self.LUT_DATA_4Gray[155]) #VSH1   
-        self.send_data(self.LUT_DATA_4Gray[156]) #VSH2   
-        self.send_data(self.LUT_DATA_4Gray[157]) #VSL   
+        self.send(0x04, #      
+                  self.LUT_DATA_4Gray[155], #VSH1   
+                  self.LUT_DATA_4Gray[156], #VSH2   
+                  self.LUT_DATA_4Gray[157]) #VSL   
 
         self.Lut() #LUT
 
 
-        self.send_command(0x4E)   # set RAM x address count to 0;
-        self.send_data(0x00)
-        self.send_command(0x4F)  # set RAM y address count to 0X199;    
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x4E, 0x00) # set RAM x address count to 0;
+        self.send(0x4F, 0x00, 0x00) # set RAM y address count to 0X199;    
         self.ReadBusy()
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
     
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
-    
+        return epdbuffer.getbuffer_4gray(image, self.width, self.height)
+
     def Clear(self):
         if(self.width % 8 == 0):
             Width = self.width // 8
@@ -417,23 +339,19 @@ class EPD:
         # Reset
         self.reset()
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
+        self.send(0x3C, 0x80) #BorderWavefrom
 	
-        self.send_command(0x44)       # set RAM x address start/end, in page 35
-        self.send_data(Xstart & 0xff)    # RAM x address start at 00h;
-        self.send_data(Xend & 0xff)    # RAM x address end at 0fh(15+1)*8->128 
-        self.send_command(0x45)       # set RAM y address start/end, in page 35
-        self.send_data(Ystart & 0xff)    # RAM y address start at 0127h;
-        self.send_data((Ystart>>8) & 0x01)    # RAM y address start at 0127h;
-        self.send_data(Yend & 0xff)    # RAM y address end at 00h;
-        self.send_data((Yend>>8) & 0x01)   
-
-        self.send_command(0x4E)   # set RAM x address count to 0;
-        self.send_data(Xstart & 0xff)
-        self.send_command(0x4F)   # set RAM y address count to 0X127;    
-        self.send_data(Ystart & 0xff)
-        self.send_data((Ystart>>8) & 0x01)
+        self.send(0x44, # set RAM x address start/end, in page 35
+                  Xstart & 0xff, # RAM x address start at 00h;
+                  Xend & 0xff) # RAM x address end at 0fh(15+1)*8->128 
+        self.send(0x45, # set RAM y address start/end, in page 35
+                  Ystart & 0xff, # RAM y address start at 0127h;
+                  (Ystart>>8) & 0x01, # RAM y address start at 0127h;
+                  Yend & 0xff, # RAM y address end at 00h;
+                  (Yend>>8) & 0x01)
+
+        self.send(0x4E, Xstart & 0xff) # set RAM x address count to 0;
+        self.send(0x4F, Ystart & 0xff, (Ystart>>8) & 0x01) # set RAM y address count to 0X127;    
 
         self.send_command(0x24)   #Write Black and White image to RAM
         for j in range(Height):
@@ -443,77 +361,18 @@ class EPD:
         self.TurnOnDisplay_Partial()
   
     def display_4Gray(self, image):
+        plane1, plane2 = epdbuffer.split_4gray(image, (1, 0, 1, 0), (1, 1, 0, 0))
+
         self.send_command(0x24)
-        for i in range(0, 5808):                     #5808*4  46464
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01  
-                    elif(temp2 == 0x80): 
-                        temp3 |= 0x01 
-                    else: #0x40
-                        temp3 |= 0x00 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01
-                    else :   #0x40
-                        temp3 |= 0x00	
-                    if(j!=1 or k!=1):				
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-            
+        self.send_data2(plane1)
         self.send_command(0x26)	       
-        for i in range(0, 5808):                #5808*4  46464
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00
-                    else: #0x40
-                        temp3 |= 0x01 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00 
-                    else:    #0x40
-                            temp3 |= 0x01	
-                    if(j!=1 or k!=1):					
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-        
+        self.send_data2(plane2)
         self.TurnOnDisplay_4GRAY()
 
     def sleep(self):
-        self.send_command(0X10)
-        self.send_data(0x01)
+        self.send(0X10, 0x01)
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
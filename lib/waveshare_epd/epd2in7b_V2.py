@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 176
@@ -38,74 +39,61 @@ EPD_HEIGHT      = 264
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     # Send Command
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     # Send Data
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     # Read Busy
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)
+        self.backend.wait_busy(1)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
             
     # Setting the display window
     def SetWindows(self, Xstart, Ystart, Xend, Yend):
-        self.send_command(0x44)
-        self.send_data((Xstart >> 3) & 0xff)
-        self.send_data((Xend >> 3) & 0xff)
+        self.send(0x44, (Xstart >> 3) & 0xff, (Xend >> 3) & 0xff)
         
-        self.send_command(0x45)
-        self.send_data(Ystart & 0xff)
-        self.send_data((Ystart >> 8) & 0xff)
-        self.send_data(Yend & 0xff)
-        self.send_data((Yend >> 8) & 0xff)
+        self.send(0x45, Ystart & 0xff, (Ystart >> 8) & 0xff, Yend & 0xff, (Yend >> 8) & 0xff)
     
     # Set Cursor
     def SetCursor(self, Xstart, Ystart):
-        self.send_command(0x4E)
-        self.send_data(Xstart & 0xff)
-        self.send_command(0x4F)
-        self.send_data(Ystart & 0xff)
-        self.send_data((Ystart >> 8) & 0xff)
+        self.send(0x4E, Xstart & 0xff)
+        self.send(0x4F, Ystart & 0xff, (Ystart >> 8) & 0xff)
         
     # Initialize the e-Paper register
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -114,41 +102,16 @@ class EPD:
         self.send_command(0x12)      
         self.ReadBusy() 
         
-        self.send_command(0x00)     
-        self.send_data(0x27) 
-        self.send_data(0x01) 
-        self.send_data(0x00) 
+        self.send(0x00, 0x27, 0x01, 0x00)
         
-        self.send_command(0x11)     
-        self.send_data(0x03) 
+        self.send(0x11, 0x03)
         
         self.SetWindows(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
     
     # Sends the image buffer in RAM to e-Paper and displays
     def display(self, imageblack, imagered):
@@ -170,10 +133,10 @@ class EPD:
     # Clear the screen
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xff] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0xff]) * int(self.width * self.height / 8))
 
         self.send_command(0x26)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0x00]) * int(self.width * self.height / 8))
             
         self.TurnOnDisplay()
         
@@ -184,10 +147,9 @@ class EPD:
 
     # Enter sleep mode
     def sleep(self):
-        self.send_command(0x10)
-        self.send_data(0x01)
+        self.send(0x10, 0x01)
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 128
@@ -41,11 +42,13 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.GRAY1  = GRAY1 #white
@@ -142,47 +145,39 @@ class EPD:
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(50) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(50)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(50) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(50)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(10) 
+        self.backend.wait_busy(1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")  
 
     def TurnOnDisplay(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xc7)
+        self.send(0x22, 0xc7) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
 
     def TurnOnDisplay_Partial(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0x0F)
+        self.send(0x22, 0x0F) # DISPLAY_UPDATE_CONTROL_2
         self.send_command(0x20) # MASTER_ACTIVATION
         self.ReadBusy()
 
@@ -194,39 +189,30 @@ class EPD:
 
     def SetLut(self, lut):
         self.lut(lut)
-        self.send_command(0x3f)
-        self.send_data(lut[153])
-        self.send_command(0x03);	# gate voltage
-        self.send_data(lut[154])
-        self.send_command(0x04);	# source voltage
-        self.send_data(lut[155])	# VSH
-        self.send_data(lut[156])	# VSH2
-        self.send_data(lut[157])	# VSL
-        self.send_command(0x2c);		# VCOM
-        self.send_data(lut[158])
+        self.send(0x3f, lut[153])
+        self.send(0x03, lut[154])	# gate voltage
+        self.send(0x04,	# source voltage
+                  lut[155], # VSH
+                  lut[156], # VSH2
+                  lut[157]) # VSL
+        self.send(0x2c, lut[158])		# VCOM
 
     def SetWindow(self, x_start, y_start, x_end, y_end):
         self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
         # x point must be the multiple of 8 or the last 3 bits will be ignored
         self.send_data((x_start>>3) & 0xFF)
         self.send_data((x_end>>3) & 0xFF)
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        self.send(0x45, y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_START_END_POSITION
 
     def SetCursor(self, x, y):
         self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
         # x point must be the multiple of 8 or the last 3 bits will be ignored
         self.send_data(x & 0xFF)
         
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        self.send(0x4F, y & 0xFF, (y >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_COUNTER
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start     
         self.reset()
@@ -235,19 +221,13 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy() 
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
+        self.send(0x01, 0x27, 0x01, 0x00) #Driver output control      
     
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        self.send(0x11, 0x03) #data entry mode       
 
         self.SetWindow(0, 0, self.width-1, self.height-1)
 
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
+        self.send(0x21, 0x00, 0x80) #  Display update control
     
         self.SetCursor(0, 0)
         self.ReadBusy()
@@ -257,7 +237,7 @@ class EPD:
         return 0
     
     def init_Fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start     
         self.reset()
@@ -266,22 +246,15 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy() 
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
+        self.send(0x01, 0x27, 0x01, 0x00) #Driver output control      
     
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        self.send(0x11, 0x03) #data entry mode       
 
         self.SetWindow(0, 0, self.width-1, self.height-1)
 
-        self.send_command(0x3C)   
-        self.send_data(0x05)
+        self.send(0x3C, 0x05)
 
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
+        self.send(0x21, 0x00, 0x80) #  Display update control
     
         self.SetCursor(0, 0)
         self.ReadBusy()
@@ -291,27 +264,22 @@ class EPD:
         return 0
     
     def Init_4Gray(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         self.reset()
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
 
         self.ReadBusy()
         self.send_command(0x12)  #SWRESET
         self.ReadBusy() 
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
+        self.send(0x01, 0x27, 0x01, 0x00) #Driver output control      
     
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        self.send(0x11, 0x03) #data entry mode       
 
         self.SetWindow(8, 0, self.width, self.height-1)
 
-        self.send_command(0x3C)
-        self.send_data(0x04)
+        self.send(0x3C, 0x04)
     
         self.SetCursor(1, 0)
         self.ReadBusy()
@@ -321,64 +289,10 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
     
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
+        return epdbuffer.getbuffer_4gray(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -400,99 +314,29 @@ class EPD:
         self.TurnOnDisplay()
 
     def display_4Gray(self, image):
+        plane1, plane2 = epdbuffer.split_4gray(image, (1, 0, 1, 0), (1, 1, 0, 0))
+
         self.send_command(0x24)
-        for i in range(0, 4736):
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01  
-                    elif(temp2 == 0x80): 
-                        temp3 |= 0x01 
-                    else: #0x40
-                        temp3 |= 0x00 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01
-                    else :   #0x40
-                        temp3 |= 0x00	
-                    if(j!=1 or k!=1):				
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-            
+        self.send_data2(plane1)
         self.send_command(0x26)	       
-        for i in range(0, 4736):
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00
-                    else: #0x40
-                        temp3 |= 0x01 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00 
-                    else:    #0x40
-                        temp3 |= 0x01	
-                    if(j!=1 or k!=1):					
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-
+        self.send_data2(plane2)
         self.TurnOnDisplay()
         
     def display_Partial(self, image):
         if (image == None):
             return
             
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(2)   
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(2)   
         
         self.SetLut(self.WF_PARTIAL_2IN9)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)  
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
-
-        self.send_command(0x22) 
-        self.send_data(0xC0)
+        self.send(0x37, 0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00)
+
+        self.send(0x3C, 0x80) #BorderWavefrom
+
+        self.send(0x22, 0xC0)
         self.send_command(0x20)
         self.ReadBusy()
 
@@ -511,17 +355,16 @@ class EPD:
             linewidth = int(self.width/8) + 1
 
         self.send_command(0x24) # WRITE_RAM
-        self.send_data2([color] * int(self.height * linewidth)) 
+        self.send_data2(bytes([color]) * int(self.height * linewidth)) 
         self.TurnOnDisplay()
         self.send_command(0x26) # WRITE_RAM
-        self.send_data2([color] * int(self.height * linewidth)) 
+        self.send_data2(bytes([color]) * int(self.height * linewidth)) 
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send(0x10, 0x01) # DEEP_SLEEP_MODE
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
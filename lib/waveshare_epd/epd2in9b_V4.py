@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 128
@@ -38,77 +39,69 @@ EPD_HEIGHT      = 296
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
         self.send_command(0X71)
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)                
+        self.backend.wait_busy(1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
 
     def TurnOnDisplay(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xF7)
+        self.send(0x22, 0xF7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
 
     def TurnOnDisplay_Base(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xF4)
+        self.send(0x22, 0xF4) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
         
     def TurnOnDisplay_Fast(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xC7)
+        self.send(0x22, 0xC7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
         
     def TurnOnDisplay_Partial(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0x1C)
+        self.send(0x22, 0x1C) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
 
 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         
         # EPD hardware init start
@@ -118,45 +111,28 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy()   
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data((self.height-1)%256)    
-        self.send_data((self.height-1)//256)
-        self.send_data(0x00)
+        self.send(0x01, (self.height-1)%256, (self.height-1)//256, 0x00) #Driver output control      
 
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        self.send(0x11, 0x03) #data entry mode       
 
-        self.send_command(0x44) #set Ram-X address start/end position   
-        self.send_data(0x00)
-        self.send_data(self.width//8-1)   
+        self.send(0x44, 0x00, self.width//8-1) #set Ram-X address start/end position   
 
-        self.send_command(0x45) #set Ram-Y address start/end position          
-        self.send_data(0x00)
-        self.send_data(0x00) 
-        self.send_data((self.height-1)%256)    
-        self.send_data((self.height-1)//256)
+        self.send(0x45, 0x00, 0x00, (self.height-1)%256, (self.height-1)//256) #set Ram-Y address start/end position          
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x05)	
+        self.send(0x3C, 0x05) #BorderWavefrom
 
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)		
-        self.send_data(0x80)	
+        self.send(0x21, 0x00, 0x80) #  Display update control
 
-        self.send_command(0x18) #Read built-in temperature sensor
-        self.send_data(0x80)	
+        self.send(0x18, 0x80) #Read built-in temperature sensor
 
-        self.send_command(0x4E)   # set RAM x address count to 0
-        self.send_data(0x00)
-        self.send_command(0x4F)   # set RAM y address count to 0X199    
-        self.send_data(0x00)    
-        self.send_data(0x00)
+        self.send(0x4E, 0x00) # set RAM x address count to 0
+        self.send(0x4F, 0x00, 0x00) # set RAM y address count to 0X199    
         self.ReadBusy()
         
         return 0
     
     def init_Fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         
         # EPD hardware init start
@@ -166,73 +142,36 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy()   	
 
-        self.send_command(0x18) #Read built-in temperature sensor
-        self.send_data(0x80)
+        self.send(0x18, 0x80) #Read built-in temperature sensor
 
-        self.send_command(0x22) # Load temperature value
-        self.send_data(0xB1)		
+        self.send(0x22, 0xB1) # Load temperature value
         self.send_command(0x20)	
         self.ReadBusy()   
 
-        self.send_command(0x1A) # Write to temperature register
-        self.send_data(0x5a)		# 90		
-        self.send_data(0x00)	
+        self.send(0x1A, # Write to temperature register
+                  0x5a, # 90		
+                  0x00)
                     
-        self.send_command(0x22) # Load temperature value
-        self.send_data(0x91)		
+        self.send(0x22, 0x91) # Load temperature value
         self.send_command(0x20)	
         self.ReadBusy()  
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data((self.height-1)%256)    
-        self.send_data((self.height-1)//256)
-        self.send_data(0x00)
-
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
-
-        self.send_command(0x44) #set Ram-X address start/end position   
-        self.send_data(0x00)
-        self.send_data(self.width//8-1)   
-
-        self.send_command(0x45) #set Ram-Y address start/end position          
-        self.send_data(0x00)
-        self.send_data(0x00) 
-        self.send_data((self.height-1)%256)    
-        self.send_data((self.height-1)//256)	
-
-        self.send_command(0x4E)   # set RAM x address count to 0
-        self.send_data(0x00)
-        self.send_command(0x4F)   # set RAM y address count to 0X199    
-        self.send_data(0x00)    
-        self.send_data(0x00)
+        self.send(0x01, (self.height-1)%256, (self.height-1)//256, 0x00) #Driver output control      
+
+        self.send(0x11, 0x03) #data entry mode       
+
+        self.send(0x44, 0x00, self.width//8-1) #set Ram-X address start/end position   
+
+        self.send(0x45, 0x00, 0x00, (self.height-1)%256, (self.height-1)//256) #set Ram-Y address start/end position          
+
+        self.send(0x4E, 0x00) # set RAM x address count to 0
+        self.send(0x4F, 0x00, 0x00) # set RAM y address count to 0X199    
         self.ReadBusy()	
         
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, blackimage, ryimage): # ryimage: red or yellow image
         if(self.width % 8 == 0):
@@ -246,7 +185,7 @@ class EPD:
         if (ryimage != None):
             for j in range(Height):
                 for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
+                    ryimage[i + j * Width] = ~ryimage[i + j * Width] & 0xFF
             self.send_command(0x26)
             self.send_data2(ryimage)
 
@@ -264,7 +203,7 @@ class EPD:
         if (ryimage != None):
             for j in range(Height):
                 for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
+                    ryimage[i + j * Width] = ~ryimage[i + j * Width] & 0xFF
             self.send_command(0x26)
             self.send_data2(ryimage)
 
@@ -272,17 +211,17 @@ class EPD:
         
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xff] * int(self.width * self.height // 8))
+        self.send_data2(bytes([0xff]) * int(self.width * self.height // 8))
         self.send_command(0x26)
-        self.send_data2([0x00] * int(self.width * self.height // 8))
+        self.send_data2(bytes([0x00]) * int(self.width * self.height // 8))
 
         self.TurnOnDisplay()
 
     def Clear_Fast(self):
         self.send_command(0x24)
-        self.send_data2([0xff] * int(self.width * self.height // 8))
+        self.send_data2(bytes([0xff]) * int(self.width * self.height // 8))
         self.send_command(0x26)
-        self.send_data2([0x00] * int(self.width * self.height // 8))
+        self.send_data2(bytes([0x00]) * int(self.width * self.height // 8))
 
         self.TurnOnDisplay_Fast()
 
@@ -298,7 +237,7 @@ class EPD:
         if (ryimage != None):
             for j in range(Height):
                 for i in range(Width):
-                    ryimage[i + j * Width] = ~ryimage[i + j * Width]
+                    ryimage[i + j * Width] = ~ryimage[i + j * Width] & 0xFF
             self.send_command(0x26)
             self.send_data2(ryimage)
 
@@ -307,7 +246,7 @@ class EPD:
         if (blackimage != None):
             for j in range(Height):
                 for i in range(Width):
-                    blackimage[i + j * Width] = ~blackimage[i + j * Width]
+                    blackimage[i + j * Width] = ~blackimage[i + j * Width] & 0xFF
             self.send_command(0x26)
             self.send_data2(blackimage)
         else:
@@ -356,20 +295,17 @@ class EPD:
         Xend -= 1
         Yend -= 1
 	
-        self.send_command(0x44)       # set RAM x address start/end, in page 35
-        self.send_data(Xstart & 0xff)    # RAM x address start at 00h
-        self.send_data(Xend & 0xff)    # RAM x address end at 0fh(15+1)*8->128 
-        self.send_command(0x45)       # set RAM y address start/end, in page 35
-        self.send_data(Ystart & 0xff)    # RAM y address start at 0127h
-        self.send_data((Ystart>>8) & 0x01)    # RAM y address start at 0127h
-        self.send_data(Yend & 0xff)    # RAM y address end at 00h
-        self.send_data((Yend>>8) & 0x01)   
-
-        self.send_command(0x4E)   # set RAM x address count to 0
-        self.send_data(Xstart & 0xff)
-        self.send_command(0x4F)   # set RAM y address count to 0X127    
-        self.send_data(Ystart & 0xff)
-        self.send_data((Ystart>>8) & 0x01)
+        self.send(0x44, # set RAM x address start/end, in page 35
+                  Xstart & 0xff, # RAM x address start at 00h
+                  Xend & 0xff) # RAM x address end at 0fh(15+1)*8->128 
+        self.send(0x45, # set RAM y address start/end, in page 35
+                  Ystart & 0xff, # RAM y address start at 0127h
+                  (Ystart>>8) & 0x01, # RAM y address start at 0127h
+                  Yend & 0xff, # RAM y address end at 00h
+                  (Yend>>8) & 0x01)
+
+        self.send(0x4E, Xstart & 0xff) # set RAM x address count to 0
+        self.send(0x4F, Ystart & 0xff, (Ystart>>8) & 0x01) # set RAM y address count to 0X127    
 
         self.send_command(0x24)   #Write Black and White image to RAM
         for j in range(Height):
@@ -379,10 +315,9 @@ class EPD:
         self.TurnOnDisplay_Partial()
         
     def sleep(self):
-        self.send_command(0x10) # deep sleep
-        self.send_data(0x01)
+        self.send(0x10, 0x01) # deep sleep
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -30,11 +30,10 @@
 # THE SOFTWARE.
 #
 
-from distutils.command.build_scripts import build_scripts
 import logging
 from . import epdconfig
+from . import epdbuffer
 from PIL import Image
-import RPi.GPIO as GPIO
 
 # Display resolution
 EPD_WIDTH       = 128
@@ -43,11 +42,13 @@ EPD_HEIGHT      = 296
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
     
@@ -104,54 +105,47 @@ class EPD:
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)  
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)  
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)   
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)  
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)  
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            self.send_command(0x71)
-            epdconfig.delay_ms(10)  
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0x71), poll_ms=10)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
     def TurnOnDisplay(self):
         self.send_command(0x12)
-        epdconfig.delay_ms(10)
+        self.backend.delay_ms(10)
         self.ReadBusy()
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -159,52 +153,42 @@ class EPD:
         self.send_command(0x04)
         self.ReadBusy() #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x00)     #panel setting
-        self.send_data(0x1f)        # LUT from OTP，KW-BF   KWR-AF    BWROTP 0f   BWOTP 1f
+        self.send(0x00, #panel setting
+                  0x1f) # LUT from OTP，KW-BF   KWR-AF    BWROTP 0f   BWOTP 1f
 
         self.send_command(0x61)     #resolution setting
         self.send_data (0x80)       
         self.send_data (0x01)   
         self.send_data (0x28)   
 
-        self.send_command(0X50) #VCOM AND DATA INTERVAL SETTING     
-        self.send_data(0x97)        #WBmode:VBDF 17|D7 VBDW 97 VBDB 57  WBRmode:VBDF F7 VBDW 77 VBDB 37  VBDR B7
+        self.send(0X50, #VCOM AND DATA INTERVAL SETTING     
+                  0x97) #WBmode:VBDF 17|D7 VBDW 97 VBDB 57  WBRmode:VBDF F7 VBDW 77 VBDB 37  VBDR B7
 
         return 0
     
     def SetPartReg(self):
 
-        self.send_command(0x01) #POWER SETTING
-        self.send_data(0x03)
-        self.send_data(0x00)
-        self.send_data(0x2b)
-        self.send_data(0x2b)
-        self.send_data(0x03)
+        self.send(0x01, 0x03, 0x00, 0x2b, 0x2b, 0x03) #POWER SETTING
 
-        self.send_command(0x06) #boost soft start
-        self.send_data(0x17)     #A
-        self.send_data(0x17)     #B
-        self.send_data(0x17)     #C
+        self.send(0x06, #boost soft start
+                  0x17, #A
+                  0x17, #B
+                  0x17) #C
 
         self.send_command(0x04)
         self.ReadBusy()
 
-        self.send_command(0x00) #panel setting
-        self.send_data(0xbf)     #LUT from OTP，128x296
+        self.send(0x00, #panel setting
+                  0xbf) #LUT from OTP，128x296
 
-        self.send_command(0x30) #PLL setting
-        self.send_data(0x3a)     # 3a 100HZ   29 150Hz 39 200HZ 31 171HZ
+        self.send(0x30, #PLL setting
+                  0x3a) # 3a 100HZ   29 150Hz 39 200HZ 31 171HZ
 
-        self.send_command(0x61) #resolution setting
-        self.send_data(self.width)
-        self.send_data((self.height >> 8) & 0xff)
-        self.send_data(self.height & 0xff)
+        self.send(0x61, self.width, (self.height >> 8) & 0xff, self.height & 0xff) #resolution setting
 
-        self.send_command(0x82) #vcom_DC setting
-        self.send_data(0x12)
+        self.send(0x82, 0x12) #vcom_DC setting
 
-        self.send_command(0X50)
-        self.send_data(0x97)
+        self.send(0X50, 0x97)
         
         self.send_command(0x20)         # vcom
         self.send_data2(self.lut_vcom1)
@@ -218,46 +202,23 @@ class EPD:
         self.send_data2(self.lut_bb1)
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, image):
         self.send_command(0x10)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
-        epdconfig.delay_ms(10)
+        self.send_data2(bytes([0x00]) * int(self.width * self.height / 8))
+        self.backend.delay_ms(10)
         
         self.send_command(0x13)
         self.send_data2(image)
-        epdconfig.delay_ms(10)
+        self.backend.delay_ms(10)
         
         self.TurnOnDisplay()
         
     def DisplayPartial(self, image):
         self.SetPartReg()
         self.send_command(0x91)
-        self.send_command(0x90)
-        self.send_data(0)
-        self.send_data(self.width - 1)
+        self.send(0x90, 0, self.width - 1)
 
         self.send_data(0)
         self.send_data(0)
@@ -271,34 +232,32 @@ class EPD:
             buf[i] = ~image[i]
         self.send_command(0x10)
         self.send_data2(image)
-        epdconfig.delay_ms(10)
+        self.backend.delay_ms(10)
         
         self.send_command(0x13)
         self.send_data2(buf)
-        epdconfig.delay_ms(10)
+        self.backend.delay_ms(10)
           
         self.TurnOnDisplay()
         
     def Clear(self):
         self.send_command(0x10)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
-        epdconfig.delay_ms(10)
+        self.send_data2(bytes([0x00]) * int(self.width * self.height / 8))
+        self.backend.delay_ms(10)
         
         self.send_command(0x13)
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
-        epdconfig.delay_ms(10)
+        self.send_data2(bytes([0xFF]) * int(self.width * self.height / 8))
+        self.backend.delay_ms(10)
         
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0X50)
-        self.send_data(0xf7)
+        self.send(0X50, 0xf7)
         self.send_command(0X02)         #power off
-        self.send_command(0X07)         #deep sleep  
-        self.send_data(0xA5)
+        self.send(0X07, 0xA5) #deep sleep  
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
 
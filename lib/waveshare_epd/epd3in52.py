@@ -28,8 +28,8 @@
 #
 
 import logging
-from multiprocessing.reduction import recv_handle
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 240
@@ -38,11 +38,13 @@ EPD_HEIGHT      = 360
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.Flag = 0
@@ -196,36 +198,30 @@ class EPD:
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: busy, 1: idle
-            epdconfig.delay_ms(5) 
+        self.backend.wait_busy(0)      #  0: busy, 1: idle
         logger.debug("e-Paper busy release")
 
     def lut(self) :
@@ -245,10 +241,9 @@ class EPD:
         self.send_data2(self.lut_wb[:42])
 
     def refresh(self):
-        self.send_command(0x17)
-        self.send_data(0xA5)
+        self.send(0x17, 0xA5)
         self.ReadBusy()
-        epdconfig.delay_ms(200)
+        self.backend.delay_ms(200)
 
     # LUT download
     def lut_GC(self):
@@ -308,72 +303,49 @@ class EPD:
         
                 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.Flag = 0
         self.reset()
 
-        self.send_command(0x00)     # panel setting   PSR
-        self.send_data(0xFF)        # RES1 RES0 REG KW/R     UD    SHL   SHD_N  RST_N    
-        self.send_data(0x01)        # x x x VCMZ TS_AUTO TIGE NORG VC_LUTZ
+        self.send(0x00, # panel setting   PSR
+                  0xFF, # RES1 RES0 REG KW/R     UD    SHL   SHD_N  RST_N    
+                  0x01) # x x x VCMZ TS_AUTO TIGE NORG VC_LUTZ
 
-        self.send_command(0x01)     # POWER SETTING   PWR
-        self.send_data(0x03)        #  x x x x x x VDS_EN VDG_EN    
-        self.send_data(0x10)        #  x x x VCOM_SLWE VGH[3:0]   VGH=20V, VGL=-20V    
-        self.send_data(0x3F)        #  x x VSH[5:0]    VSH = 15V
-        self.send_data(0x3F)        #  x x VSL[5:0]    VSL=-15V
-        self.send_data(0x03)        #  OPTEN VDHR[6:0]  VHDR=6.4V
+        self.send(0x01, # POWER SETTING   PWR
+                  0x03, #  x x x x x x VDS_EN VDG_EN    
+                  0x10, #  x x x VCOM_SLWE VGH[3:0]   VGH=20V, VGL=-20V    
+                  0x3F, #  x x VSH[5:0]    VSH = 15V
+                  0x3F, #  x x VSL[5:0]    VSL=-15V
+                  0x03) #  OPTEN VDHR[6:0]  VHDR=6.4V
                                     # T_VDS_OFF[1:0] 00=1 frame; 01=2 frame; 10=3 frame; 11=4 frame
-        self.send_command(0x06)     # booster soft start   BTST 
-        self.send_data(0x37)        #  BT_PHA[7:0]      
-        self.send_data(0x3D)        #  BT_PHB[7:0]    
-        self.send_data(0x3D)        #  x x BT_PHC[5:0]    
+        self.send(0x06, # booster soft start   BTST 
+                  0x37, #  BT_PHA[7:0]      
+                  0x3D, #  BT_PHB[7:0]    
+                  0x3D) #  x x BT_PHC[5:0]    
 
-        self.send_command(0x60)     # TCON setting            TCON 
-        self.send_data(0x22)        # S2G[3:0] G2S[3:0]   non-overlap = 12        
+        self.send(0x60, # TCON setting            TCON 
+                  0x22) # S2G[3:0] G2S[3:0]   non-overlap = 12        
 
-        self.send_command(0x82)     # VCOM_DC setting        VDCS 
-        self.send_data(0x07)        # x  VDCS[6:0]    VCOM_DC value= -1.9v    00~3f,0x12=-1.9v
+        self.send(0x82, # VCOM_DC setting        VDCS 
+                  0x07) # x  VDCS[6:0]    VCOM_DC value= -1.9v    00~3f,0x12=-1.9v
 
-        self.send_command(0x30)             
-        self.send_data(0x09)        
+        self.send(0x30, 0x09)
 
-        self.send_command(0xe3)     # power saving            PWS 
-        self.send_data(0x88)        # VCOM_W[3:0] SD_W[3:0]
+        self.send(0xe3, # power saving            PWS 
+                  0x88) # VCOM_W[3:0] SD_W[3:0]
 
-        self.send_command(0x61)     # resoultion setting 
-        self.send_data(0xf0)        #  HRES[7:3] 0 0 0    
-        self.send_data(0x01)        #  x x x x x x x VRES[8]    
-        self.send_data(0x68)        #  VRES[7:0]
+        self.send(0x61, # resoultion setting 
+                  0xf0, #  HRES[7:3] 0 0 0    
+                  0x01, #  x x x x x x x VRES[8]    
+                  0x68) #  VRES[7:0]
 
-        self.send_command(0x50);            
-        self.send_data(0xB7);    
+        self.send(0x50, 0xB7)
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, image):
         if (image == None):
@@ -439,21 +411,20 @@ class EPD:
                         self.send_data(0xFF)				
                             
                 elif NUM == self.Image:
-                    epdconfig.delay_ms(1)
+                    self.backend.delay_ms(1)
                     # self.send_data(gImage_1[pcnt++])
  
         
     def Clear(self):
         self.send_command(0x13);		     # Transfer new data
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0xFF]) * int(self.width * self.height / 8))
         self.lut_GC()
         self.refresh()
 
     def sleep(self):
-        self.send_command(0X07) # DEEP_SLEEP_MODE
-        self.send_data(0xA5)
+        self.send(0X07, 0xA5) # DEEP_SLEEP_MODE
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
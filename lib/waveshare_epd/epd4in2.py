@@ -30,8 +30,8 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 from PIL import Image
-import RPi.GPIO as GPIO
 
 # Display resolution
 EPD_WIDTH  = 400
@@ -46,11 +46,13 @@ logger = logging.getLogger(__name__)
 
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.GRAY1 = GRAY1  # white
@@ -216,45 +218,37 @@ class EPD:
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(10)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(10)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(10)
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(10)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(10)
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(10)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(10)
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(10)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(10)
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
     def ReadBusy(self):
-        self.send_command(0x71)
-        while epdconfig.digital_read(self.busy_pin) == 0:  # 0: idle, 1: busy
-            self.send_command(0x71)
-            epdconfig.delay_ms(100)
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0x71), poll_ms=100)  # 0: idle, 1: busy
 
     def set_lut(self):
         self.send_command(0x20)  # vcom
@@ -308,39 +302,35 @@ class EPD:
         self.send_data2(self.EPD_4IN2_4Gray_lut_ww)
 
     def init(self):
-        if epdconfig.module_init() != 0:
+        if self.backend.module_init() != 0:
             return -1
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0x01)  # POWER SETTING
-        self.send_data(0x03)  # VDS_EN, VDG_EN
-        self.send_data(0x00)  # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
-        self.send_data(0x2b)  # VDH
-        self.send_data(0x2b)  # VDL
+        self.send(0x01, # POWER SETTING
+                  0x03, # VDS_EN, VDG_EN
+                  0x00, # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
+                  0x2b, # VDH
+                  0x2b) # VDL
 
-        self.send_command(0x06)  # boost soft start
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x17)
+        self.send(0x06, 0x17, 0x17, 0x17) # boost soft start
 
         self.send_command(0x04)  # POWER_ON
         self.ReadBusy()
 
-        self.send_command(0x00)  # panel setting
-        self.send_data(0xbf)  # KW-BF   KWR-AF  BWROTP 0f
+        self.send(0x00, # panel setting
+                  0xbf) # KW-BF   KWR-AF  BWROTP 0f
 
-        self.send_command(0x30)  # PLL setting
-        self.send_data(0x3c)  # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
+        self.send(0x30, # PLL setting
+                  0x3c) # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
 
-        self.send_command(0x61)  # resolution setting
-        self.send_data(0x01)
-        self.send_data(0x90)  # 128
-        self.send_data(0x01)
-        self.send_data(0x2c)
+        self.send(0x61, # resolution setting
+                  0x01,
+                  0x90, # 128
+                  0x01,
+                  0x2c)
 
-        self.send_command(0x82)  # vcom_DC setting
-        self.send_data(0x12)
+        self.send(0x82, 0x12) # vcom_DC setting
 
         self.send_command(0X50)  # VCOM AND DATA INTERVAL SETTING
         self.send_data(
@@ -351,39 +341,35 @@ class EPD:
         return 0
 
     def init_Partial(self):
-        if epdconfig.module_init() != 0:
+        if self.backend.module_init() != 0:
             return -1
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0x01)  # POWER SETTING
-        self.send_data(0x03)  # VDS_EN, VDG_EN
-        self.send_data(0x00)  # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
-        self.send_data(0x2b)  # VDH
-        self.send_data(0x2b)  # VDL
+        self.send(0x01, # POWER SETTING
+                  0x03, # VDS_EN, VDG_EN
+                  0x00, # VCOM_HV, VGHL_LV[1], VGHL_LV[0]
+                  0x2b, # VDH
+                  0x2b) # VDL
 
-        self.send_command(0x06)  # boost soft start
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x17)
+        self.send(0x06, 0x17, 0x17, 0x17) # boost soft start
 
         self.send_command(0x04)  # POWER_ON
         self.ReadBusy()
 
-        self.send_command(0x00)  # panel setting
-        self.send_data(0xbf)  # KW-BF   KWR-AF  BWROTP 0f
+        self.send(0x00, # panel setting
+                  0xbf) # KW-BF   KWR-AF  BWROTP 0f
 
-        self.send_command(0x30)  # PLL setting
-        self.send_data(0x3c)  # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
+        self.send(0x30, # PLL setting
+                  0x3c) # 3A 100HZ   29 150Hz 39 200HZ  31 171HZ
 
-        self.send_command(0x61)  # resolution setting
-        self.send_data(0x01)
-        self.send_data(0x90)  # 128
-        self.send_data(0x01)
-        self.send_data(0x2c)
+        self.send(0x61, # resolution setting
+                  0x01,
+                  0x90, # 128
+                  0x01,
+                  0x2c)
 
-        self.send_command(0x82)  # vcom_DC setting
-        self.send_data(0x12)
+        self.send(0x82, 0x12) # vcom_DC setting
 
         self.send_command(0X50)  # VCOM AND DATA INTERVAL SETTING
         self.send_data(
@@ -394,108 +380,47 @@ class EPD:
         return 0
 
     def Init_4Gray(self):
-        if epdconfig.module_init() != 0:
+        if self.backend.module_init() != 0:
             return -1
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0x01)  # POWER SETTING
-        self.send_data(0x03)
-        self.send_data(0x00)  # VGH=20V,VGL=-20V
-        self.send_data(0x2b)  # VDH=15V
-        self.send_data(0x2b)  # VDL=-15V
-        self.send_data(0x13)
+        self.send(0x01, # POWER SETTING
+                  0x03,
+                  0x00, # VGH=20V,VGL=-20V
+                  0x2b, # VDH=15V
+                  0x2b, # VDL=-15V
+                  0x13)
 
-        self.send_command(0x06)  # booster soft start
-        self.send_data(0x17)  # A
-        self.send_data(0x17)  # B
-        self.send_data(0x17)  # C
+        self.send(0x06, # booster soft start
+                  0x17, # A
+                  0x17, # B
+                  0x17) # C
 
         self.send_command(0x04)
         self.ReadBusy()
 
-        self.send_command(0x00)  # panel setting
-        self.send_data(0x3f)  # KW-3f   KWR-2F BWROTP 0f BWOTP 1f
+        self.send(0x00, # panel setting
+                  0x3f) # KW-3f   KWR-2F BWROTP 0f BWOTP 1f
 
-        self.send_command(0x30)  # PLL setting
-        self.send_data(0x3c)  # 100hz
+        self.send(0x30, # PLL setting
+                  0x3c) # 100hz
 
-        self.send_command(0x61)  # resolution setting
-        self.send_data(0x01)  # 400
-        self.send_data(0x90)
-        self.send_data(0x01)  # 300
-        self.send_data(0x2c)
+        self.send(0x61, # resolution setting
+                  0x01, # 400
+                  0x90,
+                  0x01, # 300
+                  0x2c)
 
-        self.send_command(0x82)  # vcom_DC setting
-        self.send_data(0x12)
+        self.send(0x82, 0x12) # vcom_DC setting
 
-        self.send_command(0X50)  # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x97)
+        self.send(0X50, 0x97) # VCOM AND DATA INTERVAL SETTING
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i = 0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0xC0:
-                        pixels[x, y] = 0x80
-                    elif pixels[x, y] == 0x80:
-                        pixels[x, y] = 0x40
-                    i = i + 1
-                    if i % 4 == 0:
-                        buf[int((x + (y * self.width)) / 4)] = (
-                                    (pixels[x - 3, y] & 0xc0) | (pixels[x - 2, y] & 0xc0) >> 2 | (
-                                        pixels[x - 1, y] & 0xc0) >> 4 | (pixels[x, y] & 0xc0) >> 6)
-
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = x
-                    if pixels[x, y] == 0xC0:
-                        pixels[x, y] = 0x80
-                    elif pixels[x, y] == 0x80:
-                        pixels[x, y] = 0x40
-                    i = i + 1
-                    if i % 4 == 0:
-                        buf[int((newx + (newy * self.width)) / 4)] = (
-                                    (pixels[x, y - 3] & 0xc0) | (pixels[x, y - 2] & 0xc0) >> 2 | (
-                                        pixels[x, y - 1] & 0xc0) >> 4 | (pixels[x, y] & 0xc0) >> 6)
-
-        return buf
+        return epdbuffer.getbuffer_4gray(image, self.width, self.height, rotation=Image.Transpose.TRANSPOSE)
 
     def display(self, image):
         if self.width % 8 == 0:
@@ -506,7 +431,7 @@ class EPD:
         self.send_command(0x92)
         self.set_lut()
         self.send_command(0x10)
-        self.send_data2([0xFF] * int(self.width * linewidth))
+        self.send_data2(bytes([0xFF]) * int(self.width * linewidth))
 
         self.send_command(0x13)
         self.send_data2(image)
@@ -536,9 +461,9 @@ class EPD:
         buf = [0x00] * (Y_end - Y_start) * (X_end - X_start)
 
         self.send_command(0x91)  # This command makes the display enter partial mode
-        self.send_command(0x90)  # resolution setting
-        self.send_data(int(X_start * 8 / 256))
-        self.send_data(int(X_start * 8 % 256))  # x-start
+        self.send(0x90, # resolution setting
+                  int(X_start * 8 / 256),
+                  int(X_start * 8 % 256)) # x-start
 
         self.send_data(int(X_end * 8 / 256))
         self.send_data(int(X_end * 8 % 256) - 1)  # x-end
@@ -564,90 +489,25 @@ class EPD:
         self.send_data2(buf)
 
         self.send_command(0x12)  # DISPLAY REFRESH
-        epdconfig.delay_ms(200)  # The delay here is necessary, 200uS at least!!!
+        self.backend.delay_ms(200)  # The delay here is necessary, 200uS at least!!!
         self.ReadBusy()
 
     def display_4Gray(self, image):
+        plane1, plane2 = epdbuffer.split_4gray(image, (0, 0, 1, 1), (0, 1, 0, 1))
+
         self.send_command(0x92)
         self.set_lut()
         self.send_command(0x10)
 
-        if self.width % 8 == 0:
-            linewidth = int(self.width / 8)
-        else:
-            linewidth = int(self.width / 8) + 1
-
-        buf = [0x00] * self.height * linewidth
-
-        for i in range(0, int(EPD_WIDTH * EPD_HEIGHT / 8)):  # EPD_WIDTH * EPD_HEIGHT / 4
-            temp3 = 0
-            for j in range(0, 2):
-                temp1 = image[i * 2 + j]
-                for k in range(0, 2):
-                    temp2 = temp1 & 0xC0
-                    if temp2 == 0xC0:
-                        temp3 |= 0x01  # white
-                    elif temp2 == 0x00:
-                        temp3 |= 0x00  # black
-                    elif temp2 == 0x80:
-                        temp3 |= 0x01  # gray1
-                    else:  # 0x40
-                        temp3 |= 0x00  # gray2
-                    temp3 <<= 1
-
-                    temp1 <<= 2
-                    temp2 = temp1 & 0xC0
-                    if temp2 == 0xC0:  # white
-                        temp3 |= 0x01
-                    elif temp2 == 0x00:  # black
-                        temp3 |= 0x00
-                    elif temp2 == 0x80:
-                        temp3 |= 0x01  # gray1
-                    else:  # 0x40
-                        temp3 |= 0x00  # gray2
-                    if j != 1 or k != 1:
-                        temp3 <<= 1
-                    temp1 <<= 2
-            buf[i] = temp3
-        self.send_data2(buf)
+        self.send_data2(plane1)
 
         self.send_command(0x13)
 
-        for i in range(0, int(EPD_WIDTH * EPD_HEIGHT / 8)):  # 5808*4  46464
-            temp3 = 0
-            for j in range(0, 2):
-                temp1 = image[i * 2 + j]
-                for k in range(0, 2):
-                    temp2 = temp1 & 0xC0
-                    if temp2 == 0xC0:
-                        temp3 |= 0x01  # white
-                    elif temp2 == 0x00:
-                        temp3 |= 0x00  # black
-                    elif temp2 == 0x80:
-                        temp3 |= 0x00  # gray1
-                    else:  # 0x40
-                        temp3 |= 0x01  # gray2
-                    temp3 <<= 1
-
-                    temp1 <<= 2
-                    temp2 = temp1 & 0xC0
-                    if temp2 == 0xC0:  # white
-                        temp3 |= 0x01
-                    elif temp2 == 0x00:  # black
-                        temp3 |= 0x00
-                    elif temp2 == 0x80:
-                        temp3 |= 0x00  # gray1
-                    else:  # 0x40
-                        temp3 |= 0x01  # gray2
-                    if j != 1 or k != 1:
-                        temp3 <<= 1
-                    temp1 <<= 2
-            buf[i] = temp3
-        self.send_data2(buf)
+        self.send_data2(plane2)
 
         self.Gray_SetLut()
         self.send_command(0x12)
-        epdconfig.delay_ms(200)
+        self.backend.delay_ms(200)
         self.ReadBusy()
         # pass
 
@@ -658,10 +518,10 @@ class EPD:
             linewidth = int(self.width / 8) + 1
 
         self.send_command(0x10)
-        self.send_data2([0xff] * int(self.height * linewidth))
+        self.send_data2(bytes([0xff]) * int(self.height * linewidth))
 
         self.send_command(0x13)
-        self.send_data2([0xff] * int(self.height * linewidth))
+        self.send_data2(bytes([0xff]) * int(self.height * linewidth))
 
         self.send_command(0x12)
         self.ReadBusy()
@@ -669,10 +529,9 @@ class EPD:
     def sleep(self):
         self.send_command(0x02)  # POWER_OFF
         self.ReadBusy()
-        self.send_command(0x07)  # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
 
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 
 ### END OF FILE ###
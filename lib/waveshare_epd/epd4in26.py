@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -43,11 +44,13 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.GRAY1  = GRAY1 #white
@@ -77,61 +80,49 @@ class EPD:
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.SPI.writebytes2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
-            epdconfig.delay_ms(20)
-        epdconfig.delay_ms(20)
+        self.backend.wait_busy(1)
+        self.backend.delay_ms(20)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xF7)
+        self.send(0x22, 0xF7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
 
     def TurnOnDisplay_Fast(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xC7)
+        self.send(0x22, 0xC7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
 
     def TurnOnDisplay_Part(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xFF)
+        self.send(0x22, 0xFF) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
 
     def TurnOnDisplay_4GRAY(self):
-        self.send_command(0x22) #Display Update Control
-        self.send_data(0xC7)
+        self.send(0x22, 0xC7) #Display Update Control
         self.send_command(0x20) #Activate Display Update Sequence
         self.ReadBusy()
 
@@ -144,17 +135,9 @@ class EPD:
         yend : End position of Y-axis
     '''
     def SetWindow(self, x_start, y_start, x_end, y_end):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        self.send_data(x_start & 0xFF)
-        self.send_data((x_start>>8) & 0x03)
-        self.send_data(x_end & 0xFF)
-        self.send_data((x_end>>8) & 0x03)
+        self.send(0x44, x_start & 0xFF, (x_start>>8) & 0x03, x_end & 0xFF, (x_end>>8) & 0x03) # SET_RAM_X_ADDRESS_START_END_POSITION
         
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        self.send(0x45, y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_START_END_POSITION
 
     '''
     function : Set Cursor
@@ -168,12 +151,10 @@ class EPD:
         self.send_data(x & 0xFF)
         self.send_data((x>>8) & 0x03)
         
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        self.send(0x4F, y & 0xFF, (y >> 8) & 0xFF) # SET_RAM_Y_ADDRESS_COUNTER
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -182,26 +163,19 @@ class EPD:
         self.send_command(0x12) #SWRESET
         self.ReadBusy()
 
-        self.send_command(0x18) # use the internal temperature sensor
-        self.send_data(0x80)
+        self.send(0x18, 0x80) # use the internal temperature sensor
 
-        self.send_command(0x0C) #set soft start     
-        self.send_data(0xAE)
-        self.send_data(0xC7)
-        self.send_data(0xC3)
-        self.send_data(0xC0)
-        self.send_data(0x80)
+        self.send(0x0C, 0xAE, 0xC7, 0xC3, 0xC0, 0x80) #set soft start     
 
-        self.send_command(0x01)   #      drive output control    
-        self.send_data((self.height-1)%256) #  Y  
-        self.send_data((self.height-1)//256) #  Y 
-        self.send_data(0x02)
+        self.send(0x01, #      drive output control    
+                  (self.height-1)%256, #  Y  
+                  (self.height-1)//256, #  Y 
+                  0x02)
 
-        self.send_command(0x3C)        # Border       Border setting 
-        self.send_data(0x01)
+        self.send(0x3C, 0x01) # Border       Border setting 
 
-        self.send_command(0x11)        #    data  entry  mode
-        self.send_data(0x01)           #       X-mode  x+ y-    
+        self.send(0x11, #    data  entry  mode
+                  0x01) #       X-mode  x+ y-    
 
         self.SetWindow(0, self.height-1, self.width-1, 0)
 
@@ -212,7 +186,7 @@ class EPD:
         return 0
     
     def init_Fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -221,26 +195,19 @@ class EPD:
         self.send_command(0x12) #SWRESET
         self.ReadBusy()
         
-        self.send_command(0x18) # use the internal temperature sensor
-        self.send_data(0x80)
+        self.send(0x18, 0x80) # use the internal temperature sensor
 
-        self.send_command(0x0C) #set soft start     
-        self.send_data(0xAE)
-        self.send_data(0xC7)
-        self.send_data(0xC3)
-        self.send_data(0xC0)
-        self.send_data(0x80)
+        self.send(0x0C, 0xAE, 0xC7, 0xC3, 0xC0, 0x80) #set soft start     
 
-        self.send_command(0x01)   #      drive output control    
-        self.send_data((self.height-1)%256) #  Y  
-        self.send_data((self.height-1)//256) #  Y 
-        self.send_data(0x02)
+        self.send(0x01, #      drive output control    
+                  (self.height-1)%256, #  Y  
+                  (self.height-1)//256, #  Y 
+                  0x02)
 
-        self.send_command(0x3C)        # Border       Border setting 
-        self.send_data(0x01)
+        self.send(0x3C, 0x01) # Border       Border setting 
 
-        self.send_command(0x11)        #    data  entry  mode
-        self.send_data(0x01)           #       X-mode  x+ y-    
+        self.send(0x11, #    data  entry  mode
+                  0x01) #       X-mode  x+ y-    
 
         self.SetWindow(0, self.height-1, self.width-1, 0)
 
@@ -248,11 +215,9 @@ class EPD:
         self.ReadBusy()
 
         #TEMP (1.5s)
-        self.send_command(0x1A)  
-        self.send_data(0x5A) 
+        self.send(0x1A, 0x5A)
 
-        self.send_command(0x22)  
-        self.send_data(0x91) 
+        self.send(0x22, 0x91)
         self.send_command(0x20) 
         
         self.ReadBusy()
@@ -265,19 +230,18 @@ class EPD:
         for count in range(0, 105):
             self.send_data(self.LUT_DATA_4Gray[count])
 
-        self.send_command(0x03) #VGH      
-        self.send_data(self.LUT_DATA_4Gray[105])
+        self.send(0x03, self.LUT_DATA_4Gray[105]) #VGH      
 
-        self.send_command(0x04) #      
-        self.send_data(self.LUT_DATA_4Gray[106]) #VSH1   
-        self.send_data(self.LUT_DATA_4Gray[107]) #VSH2   
-        self.send_data(self.LUT_DATA_4Gray[108]) #VSL   
+        self.send(0x04, #      
+                  self.LUT_DATA_4Gray[106], #VSH1   
+                  self.LUT_DATA_4Gray[107], #VSH2   
+                  self.LUT_DATA_4Gray[108]) #VSL   
 
-        self.send_command(0x2C)     #VCOM Voltage
-        self.send_data(self.LUT_DATA_4Gray[109])    #0x1C
+        self.send(0x2C, #VCOM Voltage
+                  self.LUT_DATA_4Gray[109]) #0x1C
 
     def init_4GRAY(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -286,26 +250,19 @@ class EPD:
         self.send_command(0x12) #SWRESET
         self.ReadBusy()
         
-        self.send_command(0x18) # use the internal temperature sensor
-        self.send_data(0x80)
+        self.send(0x18, 0x80) # use the internal temperature sensor
 
-        self.send_command(0x0C) #set soft start     
-        self.send_data(0xAE)
-        self.send_data(0xC7)
-        self.send_data(0xC3)
-        self.send_data(0xC0)
-        self.send_data(0x80)
+        self.send(0x0C, 0xAE, 0xC7, 0xC3, 0xC0, 0x80) #set soft start     
 
-        self.send_command(0x01)   #      drive output control    
-        self.send_data((self.height-1)%256) #  Y  
-        self.send_data((self.height-1)//256) #  Y 
-        self.send_data(0x02)
+        self.send(0x01, #      drive output control    
+                  (self.height-1)%256, #  Y  
+                  (self.height-1)//256, #  Y 
+                  0x02)
 
-        self.send_command(0x3C)        # Border       Border setting 
-        self.send_data(0x01)
+        self.send(0x3C, 0x01) # Border       Border setting 
 
-        self.send_command(0x11)        #    data  entry  mode
-        self.send_data(0x01)           #       X-mode  x+ y-    
+        self.send(0x11, #    data  entry  mode
+                  0x01) #       X-mode  x+ y-    
 
         self.SetWindow(0, self.height-1, self.width-1, 0)
 
@@ -318,64 +275,10 @@ class EPD:
 
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
     
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
+        return epdbuffer.getbuffer_4gray(image, self.width, self.height)
 
     def display(self, image):
         self.send_command(0x24)
@@ -403,18 +306,16 @@ class EPD:
         # Reset
         self.reset()
 
-        self.send_command(0x18) #BorderWavefrom
-        self.send_data(0x80)
+        self.send(0x18, 0x80) #BorderWavefrom
 
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
+        self.send(0x3C, 0x80) #BorderWavefrom
 
-        self.send_command(0x01)   #      drive output control    
-        self.send_data((self.height-1)%256) #  Y  
-        self.send_data((self.height-1)//256) #  Y 
+        self.send(0x01, #      drive output control    
+                  (self.height-1)%256, #  Y  
+                  (self.height-1)//256) #  Y 
 
-        self.send_command(0x11)        #    data  entry  mode
-        self.send_data(0x01)           #       X-mode  x+ y-    
+        self.send(0x11, #    data  entry  mode
+                  0x01) #       X-mode  x+ y-    
 
         self.SetWindow(0, self.height-1, self.width-1, 0)
 
@@ -426,85 +327,26 @@ class EPD:
         self.TurnOnDisplay_Part()
 
     def display_4Gray(self, image):
+        plane1, plane2 = epdbuffer.split_4gray(image, (1, 0, 1, 0), (1, 1, 0, 0))
+
         self.send_command(0x24)
-        for i in range(0, 48000):                     #5808*4  46464
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01  
-                    elif(temp2 == 0x80): 
-                        temp3 |= 0x01 
-                    else: #0x40
-                        temp3 |= 0x00 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01
-                    else :   #0x40
-                        temp3 |= 0x00	
-                    if(j!=1 or k!=1):				
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-            
+        self.send_data2(plane1)
         self.send_command(0x26)	       
-        for i in range(0, 48000):                #5808*4  46464
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00
-                    else: #0x40
-                        temp3 |= 0x01 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00 
-                    else:    #0x40
-                            temp3 |= 0x01	
-                    if(j!=1 or k!=1):					
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-        
+        self.send_data2(plane2)
         self.TurnOnDisplay_4GRAY()
 
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_data2(bytes([0xFF]) * (int(self.width/8) * self.height))
 
         self.send_command(0x26)
-        self.send_data2([0xFF] * (int(self.width/8) * self.height))
+        self.send_data2(bytes([0xFF]) * (int(self.width/8) * self.height))
 
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP
-        self.send_data(0x01)
+        self.send(0x10, 0x01) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
@@ -29,6 +29,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 400
@@ -37,56 +38,53 @@ EPD_HEIGHT      = 300
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.flag = 0
-        
-        if (epdconfig.module_init(cleanup=True) != 0):
-            return -1
+        # DEV_Config opens its GPIO chip and SPI handles on every module_init
+        # and never closes them, so it is set up once per instance
+        self.module_ready = False
         
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.DEV_SPI_write(command)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.digital_write(self.dc_pin, 0)
+        self.backend.digital_write(self.cs_pin, 0)
+        self.backend.DEV_SPI_write(command)
+        self.backend.digital_write(self.cs_pin, 1)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.DEV_SPI_write(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.digital_write(self.dc_pin, 1)
+        self.backend.digital_write(self.cs_pin, 0)
+        self.backend.DEV_SPI_write(data)
+        self.backend.digital_write(self.cs_pin, 1)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
         if(self.flag == 1):
-            while(epdconfig.digital_read(self.busy_pin) == 1): 
-                epdconfig.delay_ms(100) 
+            self.backend.wait_busy(1)
         
         else:
-            while(epdconfig.digital_read(self.busy_pin) == 0): 
-                epdconfig.delay_ms(100) 
+            self.backend.wait_busy(0)
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
@@ -98,18 +96,22 @@ class EPD:
         
         else:
             self.send_command(0x12)
-            epdconfig.delay_ms(100) 
+            self.backend.delay_ms(100) 
             self.ReadBusy()
             
     def init(self):
+        if (not self.module_ready):
+            if (self.backend.module_init(cleanup=True) != 0):
+                return -1
+            self.module_ready = True
         i = 0x00
         self.reset()
         self.send_command(0x2F)
-        epdconfig.delay_ms(100)
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0) 
-        i = epdconfig.DEV_SPI_read()
-        epdconfig.digital_write(self.cs_pin, 1) 
+        self.backend.delay_ms(100)
+        self.backend.digital_write(self.dc_pin, 1)
+        self.backend.digital_write(self.cs_pin, 0) 
+        i = self.backend.DEV_SPI_read()
+        self.backend.digital_write(self.cs_pin, 1) 
         # print(i)
 
         if(i == 0x01):
@@ -155,28 +157,7 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, imageblack, imagered):
         high = self.height
@@ -253,7 +234,7 @@ class EPD:
             self.send_command(0X07) 
             self.send_data(0xA5)
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
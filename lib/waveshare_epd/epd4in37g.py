@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 import PIL
 from PIL import Image
@@ -42,175 +43,112 @@ EPD_HEIGHT      = 368
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.BLACK  = 0x000000   #   00  BGR
         self.WHITE  = 0xffffff   #   01
         self.YELLOW = 0x00ffff   #   10
         self.RED    = 0x0000ff   #   11
+
+        # Palette quantized to, the index is the color code sent to the panel
+        self.pal_image = epdbuffer.palette_image((0,0,0,  255,255,255,  255,255,0,   255,0,0))
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)         # module reset
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)         # module reset
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
+
+    # send a lot of data
+    def send_data2(self, data):
+        self.backend.send_data2(data)
         
     def ReadBusyH(self):
         logger.debug("e-Paper busy H")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(5)
+        self.backend.wait_busy(0)      # 0: idle, 1: busy
         logger.debug("e-Paper busy H release")
 
     def ReadBusyL(self):
         logger.debug("e-Paper busy L")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: busy, 1: idle
-            epdconfig.delay_ms(5)
+        self.backend.wait_busy(1)      # 0: busy, 1: idle
         logger.debug("e-Paper busy L release")
 
     def TurnOnDisplay(self):
-        self.send_command(0x12) # DISPLAY_REFRESH
-        self.send_data(0x00)
+        self.send(0x12, 0x00) # DISPLAY_REFRESH
         self.ReadBusyH()
 
-        self.send_command(0x02) # POWER_OFF
-        self.send_data(0X00)
+        self.send(0x02, 0X00) # POWER_OFF
         self.ReadBusyH()
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         self.ReadBusyH()
-        epdconfig.delay_ms(30)
+        self.backend.delay_ms(30)
 
-        self.send_command(0xAA)
-        self.send_data(0x49)
-        self.send_data(0x55)
-        self.send_data(0x20)
-        self.send_data(0x08)
-        self.send_data(0x09)
-        self.send_data(0x18)
+        self.send(0xAA, 0x49, 0x55, 0x20, 0x08, 0x09, 0x18)
 
-        self.send_command(0x01)
-        self.send_data(0x3F)
+        self.send(0x01, 0x3F)
 
-        self.send_command(0x00)
-        self.send_data(0x4F)
-        self.send_data(0x69)
+        self.send(0x00, 0x4F, 0x69)
 
 
-        self.send_command(0x05)
-        self.send_data(0x40)
-        self.send_data(0x1F)
-        self.send_data(0x1F)
-        self.send_data(0x2C)
+        self.send(0x05, 0x40, 0x1F, 0x1F, 0x2C)
 
-        self.send_command(0x08)
-        self.send_data(0x6F)
-        self.send_data(0x1F)
-        self.send_data(0x1F)
-        self.send_data(0x22)
+        self.send(0x08, 0x6F, 0x1F, 0x1F, 0x22)
 
         # ===================
         # 20211212
         # First setting
-        self.send_command(0x06)
-        self.send_data(0x6F)
-        self.send_data(0x1F)
-        self.send_data(0x17)
-        self.send_data(0x17)
+        self.send(0x06, 0x6F, 0x1F, 0x17, 0x17)
         # ===================
 
-        self.send_command(0x03)
-        self.send_data(0x00)
-        self.send_data(0x54)
-        self.send_data(0x00)
-        self.send_data(0x44)
+        self.send(0x03, 0x00, 0x54, 0x00, 0x44)
 
-        self.send_command(0x60)
-        self.send_data(0x02)
-        self.send_data(0x00)
+        self.send(0x60, 0x02, 0x00)
         # Please notice that PLL must be set for version 2 IC
-        self.send_command(0x30)
-        self.send_data(0x08)
+        self.send(0x30, 0x08)
 
-        self.send_command(0x50)
-        self.send_data(0x3F)
+        self.send(0x50, 0x3F)
 
-        self.send_command(0x61)
-        self.send_data(0x02)
-        self.send_data(0x00)
-        self.send_data(0x01)
-        self.send_data(0x70)
+        self.send(0x61, 0x02, 0x00, 0x01, 0x70)
 
-        self.send_command(0xE3)
-        self.send_data(0x2F)
+        self.send(0xE3, 0x2F)
 
-        self.send_command(0x84)
-        self.send_data(0x01)
+        self.send(0x84, 0x01)
         return 0
 
     def getbuffer(self, image):
-        # Create a pallette with the 4 colors supported by the panel
-        pal_image = Image.new("P", (1,1))
-        pal_image.putpalette( (0,0,0,  255,255,255,  255,255,0,   255,0,0) + (0,0,0)*252)
-
-        # Check if we need to rotate the image
-        imwidth, imheight = image.size
-        if(imwidth == self.width and imheight == self.height):
-            image_temp = image
-        elif(imwidth == self.height and imheight == self.width):
-            image_temp = image.rotate(90, expand=True)
-        else:
-            logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
-
-        # Convert the soruce image to the 4 colors, dithering if needed
-        image_4color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_4color = bytearray(image_4color.tobytes('raw'))
-
-        # into a single byte to transfer to the panel
-        buf = [0x00] * int(self.width * self.height / 4)
-        idx = 0
-        for i in range(0, len(buf_4color), 4):
-            buf[idx] = (buf_4color[i] << 6) + (buf_4color[i+1] << 4) + (buf_4color[i+2] << 2) + buf_4color[i+3]
-            idx += 1
-        return buf
+        return epdbuffer.getbuffer_2bpp(image, self.width, self.height, self.pal_image)
 
     def display(self, image):
-        if self.width % 4 == 0 :
-            Width = self.width // 4
-        else :
-            Width = self.width // 4 + 1
-        Height = self.height
-
         self.send_command(0x04)
         self.ReadBusyH()
 
         self.send_command(0x10)
-        for j in range(0, Height):
-            for i in range(0, Width):
-                self.send_data(image[i + j * Width])
+        self.send_data2(image)
         self.TurnOnDisplay()
         
     def Clear(self, color=0x55):
@@ -230,13 +168,11 @@ class EPD:
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0x02) # POWER_OFF
-        self.send_data(0x00)
+        self.send(0x02, 0x00) # POWER_OFF
 
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -31,6 +31,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 import PIL
 from PIL import Image
@@ -43,11 +44,13 @@ EPD_HEIGHT      = 448
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.BLACK  = 0x000000   #   0000  BGR
@@ -58,124 +61,71 @@ class EPD:
         self.YELLOW = 0x00ffff   #   0101
         self.ORANGE = 0x0080ff   #   0110
 
+        # Palette quantized to, the index is the color code sent to the panel
+        self.pal_image = epdbuffer.palette_image((0,0,0,  255,255,255,  0,255,0,   0,0,255,  255,0,0,  255,255,0, 255,128,0))
+
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(600)
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(600)
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
     def ReadBusyHigh(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        self.backend.wait_busy(0)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def ReadBusyLow(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        self.backend.wait_busy(1)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
 
         self.ReadBusyHigh()
-        self.send_command(0x00)
-        self.send_data(0xEF)
-        self.send_data(0x08)
-        self.send_command(0x01)
-        self.send_data(0x37)
-        self.send_data(0x00)
-        self.send_data(0x23)
-        self.send_data(0x23)
-        self.send_command(0x03)
-        self.send_data(0x00)
-        self.send_command(0x06)
-        self.send_data(0xC7)
-        self.send_data(0xC7)
-        self.send_data(0x1D)
-        self.send_command(0x30)
-        self.send_data(0x3c)
-        self.send_command(0x41)
-        self.send_data(0x00)
-        self.send_command(0x50)
-        self.send_data(0x37)
-        self.send_command(0x60)
-        self.send_data(0x22)
-        self.send_command(0x61)
-        self.send_data(0x02)
-        self.send_data(0x58)
-        self.send_data(0x01)
-        self.send_data(0xC0)
-        self.send_command(0xE3)
-        self.send_data(0xAA)
-
-        epdconfig.delay_ms(100)
-        self.send_command(0x50)
-        self.send_data(0x37)
+        self.send(0x00, 0xEF, 0x08)
+        self.send(0x01, 0x37, 0x00, 0x23, 0x23)
+        self.send(0x03, 0x00)
+        self.send(0x06, 0xC7, 0xC7, 0x1D)
+        self.send(0x30, 0x3c)
+        self.send(0x41, 0x00)
+        self.send(0x50, 0x37)
+        self.send(0x60, 0x22)
+        self.send(0x61, 0x02, 0x58, 0x01, 0xC0)
+        self.send(0xE3, 0xAA)
+
+        self.backend.delay_ms(100)
+        self.send(0x50, 0x37)
         # EPD hardware init end
         return 0
 
     def getbuffer(self, image):
-        # Create a pallette with the 7 colors supported by the panel
-        pal_image = Image.new("P", (1,1))
-        pal_image.putpalette( (0,0,0,  255,255,255,  0,255,0,   0,0,255,  255,0,0,  255,255,0, 255,128,0) + (0,0,0)*249)
-
-        # Check if we need to rotate the image
-        imwidth, imheight = image.size
-        if(imwidth == self.width and imheight == self.height):
-            image_temp = image
-        elif(imwidth == self.height and imheight == self.width):
-            image_temp = image.rotate(90, expand=True)
-        else:
-            logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
-
-        # Convert the soruce image to the 7 colors, dithering if needed
-        image_7color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_7color = bytearray(image_7color.tobytes('raw'))
-
-        # PIL does not support 4 bit color, so pack the 4 bits of color
-        # into a single byte to transfer to the panel
-        buf = [0x00] * int(self.width * self.height / 2)
-        idx = 0
-        for i in range(0, len(buf_7color), 2):
-            buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
-            idx += 1
-
-        return buf
+        return epdbuffer.getbuffer_4bpp(image, self.width, self.height, self.pal_image)
 
     def display(self,image):
-        self.send_command(0x61) #Set Resolution setting
-        self.send_data(0x02)
-        self.send_data(0x58)
-        self.send_data(0x01)
-        self.send_data(0xC0)
+        self.send(0x61, 0x02, 0x58, 0x01, 0xC0) #Set Resolution setting
         self.send_command(0x10)
 
         self.send_data2(image)
@@ -185,18 +135,14 @@ class EPD:
         self.ReadBusyHigh()
         self.send_command(0x02) #0x02
         self.ReadBusyLow()
-        epdconfig.delay_ms(500)
+        self.backend.delay_ms(500)
 
     def Clear(self):
-        self.send_command(0x61) #Set Resolution setting
-        self.send_data(0x02)
-        self.send_data(0x58)
-        self.send_data(0x01)
-        self.send_data(0xC0)
+        self.send(0x61, 0x02, 0x58, 0x01, 0xC0) #Set Resolution setting
         self.send_command(0x10)
 
         # Set all pixels to white
-        buf = [0x11] * int(self.width * self.height / 2)
+        buf = bytes([0x11]) * int(self.width * self.height / 2)
         self.send_data2(buf)
 
         self.send_command(0x04) #0x04
@@ -205,13 +151,12 @@ class EPD:
         self.ReadBusyHigh()
         self.send_command(0x02) #0x02
         self.ReadBusyLow()
-        epdconfig.delay_ms(500)
+        self.backend.delay_ms(500)
 
     def sleep(self):
-        epdconfig.delay_ms(500)
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
-        epdconfig.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(500)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
+        self.backend.digital_write(self.reset_pin, 0)
 
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 792
@@ -43,11 +44,13 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.GRAY1  = GRAY1 #white
@@ -99,85 +102,70 @@ class EPD:
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(1)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)
+        self.backend.wait_busy(1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
-        self.send_command(0x22)
-        self.send_data(0xF7)          
+        self.send(0x22, 0xF7)
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.backend.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_Fast(self):
-        self.send_command(0x22)
-        self.send_data(0xC7)          
+        self.send(0x22, 0xC7)
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.backend.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_Partial(self):
-        self.send_command(0x22)
-        self.send_data(0xFF)          
+        self.send(0x22, 0xFF)
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.backend.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
     def TurnOnDisplay_4GRAY(self):
-        self.send_command(0x22)
-        self.send_data(0xCF)          
+        self.send(0x22, 0xCF)
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.backend.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
     def EPD_5in79_Lut(self):
         self.send_command(0x32)
         self.send_data2(self.LUT_DATA_4Gray[:227])
-        self.send_command(0x3f) 
-        self.send_data(self.LUT_DATA_4Gray[227])
+        self.send(0x3f, self.LUT_DATA_4Gray[227])
 
-        self.send_command(0x03)     
-        self.send_data(self.LUT_DATA_4Gray[228])
+        self.send(0x03, self.LUT_DATA_4Gray[228])
 
-        self.send_command(0x04)   
-        self.send_data(self.LUT_DATA_4Gray[229]) 
-        self.send_data(self.LUT_DATA_4Gray[230]) 
-        self.send_data(self.LUT_DATA_4Gray[231])   
+        self.send(0x04, self.LUT_DATA_4Gray[229], self.LUT_DATA_4Gray[230],
+                  self.LUT_DATA_4Gray[231])
 
-        self.send_command(0x2C) 
-        self.send_data(self.LUT_DATA_4Gray[232]) 
+        self.send(0x2C, self.LUT_DATA_4Gray[232])
 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -185,50 +173,42 @@ class EPD:
         self.send_command(0x12)     # POWER ON
         self.ReadBusy()             # waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x11)
-        self.send_data(0x01)
+        self.send(0x11, 0x01)
 
-        self.send_command(0x44)	    #  Set Ram X- address Start / End position
-        self.send_data(0x00)        #  XStart, POR = 00h
-        self.send_data(0x31)        # 400/8-1
-        self.send_command(0x45)     #  Set Ram Y- address  Start / End position 
-        self.send_data(0x0f)  
-        self.send_data(0x01)        # 300-1	
-        self.send_data(0x00)        #  YEnd L
-        self.send_data(0x00)        #  YEnd H 
+        self.send(0x44, #  Set Ram X- address Start / End position
+                  0x00, #  XStart, POR = 00h
+                  0x31) # 400/8-1
+        self.send(0x45, #  Set Ram Y- address  Start / End position 
+                  0x0f,
+                  0x01, # 300-1	
+                  0x00, #  YEnd L
+                  0x00) #  YEnd H 
 
-        self.send_command(0x4e)	 						 
-        self.send_data(0x00)	
-        self.send_command(0x4f)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01) 	
+        self.send(0x4e, 0x00)
+        self.send(0x4f, 0x0f, 0x01)
 
         self.ReadBusy()   
 
-        self.send_command(0x91)
-        self.send_data(0x00)
+        self.send(0x91, 0x00)
 
-        self.send_command(0xC4)     #  Set Ram X- address Start / End position
-        self.send_data(0x31)        #  XStart, POR = 00h
-        self.send_data(0x00)        # 400/8-1
-        self.send_command(0xC5)     #  Set Ram Y- address  Start / End position 
-        self.send_data(0x0f)  
-        self.send_data(0x01)        # 300-1	
-        self.send_data(0x00)        # YEnd L
-        self.send_data(0x00)        # YEnd H 
+        self.send(0xC4, #  Set Ram X- address Start / End position
+                  0x31, #  XStart, POR = 00h
+                  0x00) # 400/8-1
+        self.send(0xC5, #  Set Ram Y- address  Start / End position 
+                  0x0f,
+                  0x01, # 300-1	
+                  0x00, # YEnd L
+                  0x00) # YEnd H 
 
-        self.send_command(0xCE)	 						 
-        self.send_data(0x31)	
-        self.send_command(0xCF)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01)
+        self.send(0xCE, 0x31)
+        self.send(0xCF, 0x0f, 0x01)
 
         self.ReadBusy()   
 
         return 0
 
     def init_Fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -236,67 +216,42 @@ class EPD:
         self.send_command(0x12)
         self.ReadBusy()
 
-        self.send_command(0x18)
-        self.send_data(0x80)	
+        self.send(0x18, 0x80)
 
-        self.send_command(0x22)
-        self.send_data(0xB1)		
+        self.send(0x22, 0xB1)
         self.send_command(0x20)	
         self.ReadBusy()   
 
-        self.send_command(0x1A)
-        self.send_data(0x64)		
-        self.send_data(0x00)	
+        self.send(0x1A, 0x64, 0x00)
                 
-        self.send_command(0x22)
-        self.send_data(0x91)		
+        self.send(0x22, 0x91)
         self.send_command(0x20)	
         self.ReadBusy()   
 
-        self.send_command(0x11)
-        self.send_data(0x01)
+        self.send(0x11, 0x01)
 
-        self.send_command(0x44)
-        self.send_data(0x00)
-        self.send_data(0x31)
-        self.send_command(0x45)
-        self.send_data(0x0f)  
-        self.send_data(0x01)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x44, 0x00, 0x31)
+        self.send(0x45, 0x0f, 0x01, 0x00, 0x00)
 
-        self.send_command(0x4e)	 						 
-        self.send_data(0x00)	
-        self.send_command(0x4f)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01) 	
+        self.send(0x4e, 0x00)
+        self.send(0x4f, 0x0f, 0x01)
 
         self.ReadBusy()   
 
-        self.send_command(0x91)
-        self.send_data(0x00)
+        self.send(0x91, 0x00)
 
-        self.send_command(0xC4)
-        self.send_data(0x31)
-        self.send_data(0x00)
-        self.send_command(0xC5)
-        self.send_data(0x0f)  
-        self.send_data(0x01)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0xC4, 0x31, 0x00)
+        self.send(0xC5, 0x0f, 0x01, 0x00, 0x00)
 
-        self.send_command(0xCe)	 						 
-        self.send_data(0x31)	
-        self.send_command(0xCf)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01)
+        self.send(0xCe, 0x31)
+        self.send(0xCf, 0x0f, 0x01)
 
         self.ReadBusy()   
 
         return 0
     
     def init_Partial(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -304,13 +259,12 @@ class EPD:
         self.send_command(0x12)
         self.ReadBusy() 
 
-        self.send_command(0x3C)
-        self.send_data(0x80)
+        self.send(0x3C, 0x80)
 
         return 0
     
     def init_4Gray(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -318,117 +272,38 @@ class EPD:
         self.send_command(0x12) 
         self.ReadBusy() 
 
-        self.send_command(0x0C)     
-        self.send_data(0x8B)    
-        self.send_data(0x9C)    
-        self.send_data(0xA6)    
-        self.send_data(0x0F)
+        self.send(0x0C, 0x8B, 0x9C, 0xA6, 0x0F)
 
-        self.send_command(0x3C)
-        self.send_data(0x81)
+        self.send(0x3C, 0x81)
 
         self.ReadBusy()	
 
-        self.send_command(0x11)
-        self.send_data(0x01)
+        self.send(0x11, 0x01)
 
-        self.send_command(0x44)
-        self.send_data(0x00)
-        self.send_data(0x31)
-        self.send_command(0x45)
-        self.send_data(0x0f)  
-        self.send_data(0x01)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x44, 0x00, 0x31)
+        self.send(0x45, 0x0f, 0x01, 0x00, 0x00)
 
-        self.send_command(0x4e)	 						 
-        self.send_data(0x00)	
-        self.send_command(0x4f)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01) 	
+        self.send(0x4e, 0x00)
+        self.send(0x4f, 0x0f, 0x01)
 
         self.ReadBusy()   
 
-        self.send_command(0x91)
-        self.send_data(0x00)
+        self.send(0x91, 0x00)
 
-        self.send_command(0xC4)
-        self.send_data(0x31)
-        self.send_data(0x00)
-        self.send_command(0xC5)
-        self.send_data(0x0f)  
-        self.send_data(0x01)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0xC4, 0x31, 0x00)
+        self.send(0xC5, 0x0f, 0x01, 0x00, 0x00)
 
-        self.send_command(0xCe)	 						 
-        self.send_data(0x31)	
-        self.send_command(0xCf)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01)
+        self.send(0xCe, 0x31)
+        self.send(0xCf, 0x0f, 0x01)
 
         self.EPD_5in79_Lut()
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if imwidth == self.width and imheight == self.height:
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif imwidth == self.height and imheight == self.width:
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy * self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
     
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
+        return epdbuffer.getbuffer_4gray(image, self.width, self.height)
 
     def display(self, imageblack):
         Width =int(self.width / 16)+1
@@ -438,13 +313,13 @@ class EPD:
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 : i * Width1+Width])
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.send_command(0xA4)
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.TurnOnDisplay()
 
@@ -456,13 +331,13 @@ class EPD:
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 : i * Width1+Width])
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.send_command(0xA4)
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.TurnOnDisplay()
 
@@ -479,22 +354,22 @@ class EPD:
         Width1 =int(self.width / 8)
         
         self.send_command(0x24)
-        self.send_data2([color] * 13600)
+        self.send_data2(bytes([color]) * 13600)
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.send_command(0xA4)
-        self.send_data2([color] * 13600)
+        self.send_data2(bytes([color]) * 13600)
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.TurnOnDisplay()
 
         self.send_command(0x26)
-        self.send_data2([color] * 13600)
+        self.send_data2(bytes([color]) * 13600)
 
         self.send_command(0xA6)
-        self.send_data2([color] * 13600)
+        self.send_data2(bytes([color]) * 13600)
 
     def display_Fast(self, imageblack):
         Width =int(self.width / 16)+1
@@ -504,13 +379,13 @@ class EPD:
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 : i * Width1+Width])
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.send_command(0xA4)
         for i in range(self.height):
             self.send_data2(imageblack[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.TurnOnDisplay_Fast()
     
@@ -518,39 +393,31 @@ class EPD:
         Width =int(self.width / 16)+1
         Width1 =int(self.width / 8)
         Height = self.height
-        self.send_command(0x44)	 
-        self.send_data(0x00)     						
-        self.send_data(0x31) 
-        self.send_command(0x45)	
-        self.send_data(0x0f)  
-        self.send_data(0x01)            # 300-1	
-        self.send_data(0x00)     		# YEnd L
-        self.send_data(0x00)			# YEnd H 									
-
-        self.send_command(0x4e)	 						 
-        self.send_data(0x00)	
-        self.send_command(0x4f)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01) 	
+        self.send(0x44, 0x00, 0x31)
+        self.send(0x45,
+                  0x0f,
+                  0x01, # 300-1	
+                  0x00, # YEnd L
+                  0x00) # YEnd H 									
+
+        self.send(0x4e, 0x00)
+        self.send(0x4f, 0x0f, 0x01)
 
         self.send_command(0x24)
         for i in range(Height):
             self.send_data2(Image[i * Width1 : i * Width1+Width])
 
-        self.send_command(0xC4)		    # Set Ram X- address Start / End position
-        self.send_data(0x31)     		# XStart, POR = 00h
-        self.send_data(0x00)            # 400/8-1
-        self.send_command(0xC5)	 	    # Set Ram Y- address  Start / End position 
-        self.send_data(0x0f)  
-        self.send_data(0x01)            # 300-1	
-        self.send_data(0x00)     		# YEnd L
-        self.send_data(0x00)			# YEnd H 
-
-        self.send_command(0xCe)	 						 
-        self.send_data(0x31)	
-        self.send_command(0xCf)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01)
+        self.send(0xC4, # Set Ram X- address Start / End position
+                  0x31, # XStart, POR = 00h
+                  0x00) # 400/8-1
+        self.send(0xC5, # Set Ram Y- address  Start / End position 
+                  0x0f,
+                  0x01, # 300-1	
+                  0x00, # YEnd L
+                  0x00) # YEnd H 
+
+        self.send(0xCe, 0x31)
+        self.send(0xCf, 0x0f, 0x01)
 
         self.send_command(0xA4)
         for i in range(Height):
@@ -562,111 +429,41 @@ class EPD:
     def display_4Gray(self, image):
         Width =int(self.width / 16)+1
         Width1 =int(self.width / 8)
+        plane1, plane2 = epdbuffer.split_4gray(image, (0, 1, 0, 1), (0, 0, 1, 1))
 
         self.send_command(0x24)
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x00 
-                        else: #0x40
-                            temp3 |= 0x01 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
-            
-        self.send_command(0x26)	       
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x01 
-                        else: #0x40
-                            temp3 |= 0x00 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
+        for i in range(self.height):
+            self.send_data2(plane1[i * Width1 : i * Width1+Width])
+        self.send_command(0x26)
+        for i in range(self.height):
+            self.send_data2(plane2[i * Width1 : i * Width1+Width])
 
         self.send_command(0xA4)
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i + Width - 1)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x00 
-                        else: #0x40
-                            temp3 |= 0x01 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
-            
-        self.send_command(0xA6)	       
-        for j in range(self.height):   
-            for i in range(Width):
-                temp3=0
-                for o in range(0, 2):
-                    temp1 = image[(j * Width1 + i + Width - 1)*2+o]
-                    for k in range(0, 4):
-                        temp2 = temp1&0xC0 
-                        if(temp2 == 0xC0):
-                            temp3 |= 0x01
-                        elif(temp2 == 0x00):
-                            temp3 |= 0x00  
-                        elif(temp2 == 0x80): 
-                            temp3 |= 0x01 
-                        else: #0x40
-                            temp3 |= 0x00 
-                        if(o!=1 or k!=3):
-                            temp3 <<= 1
-                        temp1 <<= 2
-                self.send_data(temp3)
+        for i in range(self.height):
+            self.send_data2(plane1[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
+        self.send_command(0xA6)
+        for i in range(self.height):
+            self.send_data2(plane2[i * Width1 + Width - 1 : i * Width1 + Width * 2 - 1])
         
         self.TurnOnDisplay_4GRAY()
 
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * 13600)
+        self.send_data2(bytes([0xFF]) * 13600)
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.send_command(0xA4)
-        self.send_data2([0xFF] * 13600)
+        self.send_data2(bytes([0xFF]) * 13600)
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0X10) # deep sleep
-        self.send_data(0x03)
+        self.send(0X10, 0x03) # deep sleep
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 792
@@ -38,57 +39,52 @@ EPD_HEIGHT      = 272
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(1)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(200)
+        self.backend.wait_busy(1)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")
 
     def TurnOnDisplay(self):
-        self.send_command(0x22)
-        self.send_data(0xF7)            #  24s  #  0xD7  16s  Probability refresh bad, probability damage ink screen
+        self.send(0x22, 0xF7) #  24s  #  0xD7  16s  Probability refresh bad, probability damage ink screen
         self.send_command(0x20)			# DISPLAY REFRESH 	
-        epdconfig.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
+        self.backend.delay_ms(100)	        # The delay here is necessary, 200uS at least!!!     
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
             
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -97,66 +93,37 @@ class EPD:
         self.send_command(0x12)         # POWER ON
         self.ReadBusy()                 # waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0x11)
-        self.send_data(0x01)
-        self.send_command(0x44)	 		# Set Ram X- address Start / End position
-        self.send_data(0x00)     		# XStart, POR = 00h
-        self.send_data(0x31)            # 400/8-1
-        self.send_command(0x45)	 		# Set Ram Y- address  Start / End position 
-        self.send_data(0x0f)  
-        self.send_data(0x01)            # 300-1	
-        self.send_data(0x00)     		# YEnd L
-        self.send_data(0x00)			# YEnd H 
-
-        self.send_command(0x4e)	 						 
-        self.send_data(0x00)	
-        self.send_command(0x4f)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01) 	
-
-
-        self.send_command(0x91)
-        self.send_data(0x00)
-
-        self.send_command(0xC4)		    # Set Ram X- address Start / End position
-        self.send_data(0x31)     		# XStart, POR = 00h
-        self.send_data(0x00)            # 400/8-1
-        self.send_command(0xC5)	 	    # Set Ram Y- address  Start / End position 
-        self.send_data(0x0f)  
-        self.send_data(0x01)            # 300-1	
-        self.send_data(0x00)     		# YEnd L
-        self.send_data(0x00)			# YEnd H 
-
-        self.send_command(0xCe)	 						 
-        self.send_data(0x31)	
-        self.send_command(0xCf)	 
-        self.send_data(0x0f)  
-        self.send_data(0x01)
+        self.send(0x11, 0x01)
+        self.send(0x44, # Set Ram X- address Start / End position
+                  0x00, # XStart, POR = 00h
+                  0x31) # 400/8-1
+        self.send(0x45, # Set Ram Y- address  Start / End position 
+                  0x0f,
+                  0x01, # 300-1	
+                  0x00, # YEnd L
+                  0x00) # YEnd H 
+
+        self.send(0x4e, 0x00)
+        self.send(0x4f, 0x0f, 0x01)
+
+
+        self.send(0x91, 0x00)
+
+        self.send(0xC4, # Set Ram X- address Start / End position
+                  0x31, # XStart, POR = 00h
+                  0x00) # 400/8-1
+        self.send(0xC5, # Set Ram Y- address  Start / End position 
+                  0x0f,
+                  0x01, # 300-1	
+                  0x00, # YEnd L
+                  0x00) # YEnd H 
+
+        self.send(0xCe, 0x31)
+        self.send(0xCf, 0x0f, 0x01)
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, imageblack, imagered):
         buf = [0x00] * int(self.width * self.height / 8)
@@ -185,22 +152,21 @@ class EPD:
 
     def Clear(self):
         self.send_command(0x24)
-        self.send_data2([0xFF] * 13600)
+        self.send_data2(bytes([0xFF]) * 13600)
         self.send_command(0X26)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.send_command(0xA4)
-        self.send_data2([0xFF] * 13600)
+        self.send_data2(bytes([0xFF]) * 13600)
         self.send_command(0xA6)
-        self.send_data2([0x00] * 13600)
+        self.send_data2(bytes([0x00]) * 13600)
 
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0X10) # deep sleep
-        self.send_data(0x03)
+        self.send(0X10, 0x03) # deep sleep
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 648
@@ -38,52 +39,46 @@ EPD_HEIGHT      = 480
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(1)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0X71)
-        while(epdconfig.digital_read(self.busy_pin) == 0):      #  0: idle, 1: busy
-            self.send_command(0X71)
-            epdconfig.delay_ms(200)
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0X71), poll_ms=200)      #  0: idle, 1: busy
         logger.debug("e-Paper busy release")
             
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -95,11 +90,11 @@ class EPD:
         self.send_data (0x3f)       #VDL=-15V
 
         self.send_command(0x04) #POWER ON
-        epdconfig.delay_ms(100)  
+        self.backend.delay_ms(100)  
         self.ReadBusy()   #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0X00)     #PANNEL SETTING
-        self.send_data(0x0F)        #KW-3f   KWR-2F    BWROTP 0f   BWOTP 1f
+        self.send(0X00, #PANNEL SETTING
+                  0x0F) #KW-3f   KWR-2F    BWROTP 0f   BWOTP 1f
 
         self.send_command(0x61)     #tres
         self.send_data (0x02)       #source 648
@@ -107,41 +102,16 @@ class EPD:
         self.send_data (0x01)       #gate 480
         self.send_data (0xe0)
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        self.send(0X15, 0x00)
 
-        self.send_command(0X50)     #VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x11)
-        self.send_data(0x07)
+        self.send(0X50, 0x11, 0x07) #VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60)     #TCON SETTING
-        self.send_data(0x22)
+        self.send(0X60, 0x22) #TCON SETTING
         
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, imageblack, imagered):
         buf = [0x00] * int(self.width * self.height / 8)
@@ -156,26 +126,25 @@ class EPD:
             self.send_data2(buf)
 
         self.send_command(0x12)
-        epdconfig.delay_ms(200) 
+        self.backend.delay_ms(200) 
         self.ReadBusy()
 
     def Clear(self):
         self.send_command(0X10)
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0xFF]) * int(self.width * self.height / 8))
         self.send_command(0X13)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0x00]) * int(self.width * self.height / 8))
 
         self.send_command(0x12)
-        epdconfig.delay_ms(200) 
+        self.backend.delay_ms(200) 
         self.ReadBusy()
 
     def sleep(self):
         self.send_command(0X02) # power off
         self.ReadBusy()
-        self.send_command(0X07) # deep sleep
-        self.send_data(0xA5)
+        self.send(0X07, 0xA5) # deep sleep
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
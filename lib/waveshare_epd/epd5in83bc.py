@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 600
@@ -38,109 +39,75 @@ EPD_HEIGHT      = 448
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)
+        self.backend.wait_busy(0)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
             
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
 
-        self.send_command(0x01) # POWER_SETTING
-        self.send_data(0x37)
-        self.send_data(0x00)
+        self.send(0x01, 0x37, 0x00) # POWER_SETTING
         
-        self.send_command(0x00) # PANEL_SETTING
-        self.send_data(0xCF)
-        self.send_data(0x08)
+        self.send(0x00, 0xCF, 0x08) # PANEL_SETTING
         
-        self.send_command(0x30) # PLL_CONTROL
-        self.send_data(0x3A) # PLL:  0-15:0x3C, 15+:0x3A
-        self.send_command(0X82) # VCOM VOLTAGE SETTING
-        self.send_data(0x28) # all temperature  range
-
-        self.send_command(0x06) # boost
-        self.send_data(0xc7) 	   	
-        self.send_data(0xcc) 
-        self.send_data(0x15) 
-
-        self.send_command(0X50) # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x77) 
-
-        self.send_command(0X60) # TCON SETTING
-        self.send_data(0x22) 
-
-        self.send_command(0X65) # FLASH CONTROL
-        self.send_data(0x00)
-
-        self.send_command(0x61) # tres			
-        self.send_data(0x02) # source 600
-        self.send_data(0x58) 
-        self.send_data(0x01) # gate 448
-        self.send_data(0xc0)
-
-        self.send_command(0xe5) # FLASH MODE		   	
-        self.send_data(0x03) 
-        self.send_data(0x03)
+        self.send(0x30, # PLL_CONTROL
+                  0x3A) # PLL:  0-15:0x3C, 15+:0x3A
+        self.send(0X82, # VCOM VOLTAGE SETTING
+                  0x28) # all temperature  range
+
+        self.send(0x06, 0xc7, 0xcc, 0x15) # boost
+
+        self.send(0X50, 0x77) # VCOM AND DATA INTERVAL SETTING
+
+        self.send(0X60, 0x22) # TCON SETTING
+
+        self.send(0X65, 0x00) # FLASH CONTROL
+
+        self.send(0x61, # tres			
+                  0x02, # source 600
+                  0x58,
+                  0x01, # gate 448
+                  0xc0)
+
+        self.send(0xe5, 0x03, 0x03) # FLASH MODE		   	
         
         return 0
 
     def getbuffer(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
-        image_monocolor = image.convert('1')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        logger.debug('imwidth = %d  imheight =  %d ',imwidth, imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height)
 
     def display(self, imageblack, imagered):
         self.send_command(0x10)
@@ -174,7 +141,7 @@ class EPD:
         self.send_command(0x04) # POWER ON
         self.ReadBusy()
         self.send_command(0x12) # display refresh
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
         
     def Clear(self):
@@ -188,16 +155,16 @@ class EPD:
         self.send_command(0x04) # POWER ON
         self.ReadBusy()
         self.send_command(0x12) # display refresh
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0xA5) # check code
+        self.send(0x07, # DEEP_SLEEP
+                  0xA5) # check code
     
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
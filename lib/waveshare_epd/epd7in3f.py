@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 import PIL
 from PIL import Image
@@ -42,11 +43,13 @@ EPD_HEIGHT      = 480
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.BLACK  = 0x000000   #   0000  BGR
@@ -56,174 +59,97 @@ class EPD:
         self.RED    = 0x0000ff   #   0100
         self.YELLOW = 0x00ffff   #   0101
         self.ORANGE = 0x0080ff   #   0110
+
+        # Palette quantized to, the index is the color code sent to the panel
+        self.pal_image = epdbuffer.palette_image((0,0,0,  255,255,255,  0,255,0,   0,0,255,  255,0,0,  255,255,0, 255,128,0))
         
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)         # module reset
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20) 
+        self.backend.digital_write(self.reset_pin, 0)         # module reset
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     # send a lot of data   
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusyH(self):
         logger.debug("e-Paper busy H")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: busy, 1: idle
-            epdconfig.delay_ms(5)
+        self.backend.wait_busy(0)      # 0: busy, 1: idle
         logger.debug("e-Paper busy H release")
 
     def TurnOnDisplay(self):
         self.send_command(0x04) # POWER_ON
         self.ReadBusyH()
 
-        self.send_command(0x12) # DISPLAY_REFRESH
-        self.send_data(0X00)
+        self.send(0x12, 0X00) # DISPLAY_REFRESH
         self.ReadBusyH()
         
-        self.send_command(0x02) # POWER_OFF
-        self.send_data(0X00)
+        self.send(0x02, 0X00) # POWER_OFF
         self.ReadBusyH()
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         self.ReadBusyH()
-        epdconfig.delay_ms(30)
-
-        self.send_command(0xAA)    # CMDH
-        self.send_data(0x49)
-        self.send_data(0x55)
-        self.send_data(0x20)
-        self.send_data(0x08)
-        self.send_data(0x09)
-        self.send_data(0x18)
-
-        self.send_command(0x01)
-        self.send_data(0x3F)
-        self.send_data(0x00)
-        self.send_data(0x32)
-        self.send_data(0x2A)
-        self.send_data(0x0E)
-        self.send_data(0x2A)
-
-        self.send_command(0x00)
-        self.send_data(0x5F)
-        self.send_data(0x69)
-
-        self.send_command(0x03)
-        self.send_data(0x00)
-        self.send_data(0x54)
-        self.send_data(0x00)
-        self.send_data(0x44) 
-
-        self.send_command(0x05)
-        self.send_data(0x40)
-        self.send_data(0x1F)
-        self.send_data(0x1F)
-        self.send_data(0x2C)
-
-        self.send_command(0x06)
-        self.send_data(0x6F)
-        self.send_data(0x1F)
-        self.send_data(0x1F)
-        self.send_data(0x22)
-
-        self.send_command(0x08)
-        self.send_data(0x6F)
-        self.send_data(0x1F)
-        self.send_data(0x1F)
-        self.send_data(0x22)
-
-        self.send_command(0x13)    # IPC
-        self.send_data(0x00)
-        self.send_data(0x04)
-
-        self.send_command(0x30)
-        self.send_data(0x3C)
-
-        self.send_command(0x41)     # TSE
-        self.send_data(0x00)
-
-        self.send_command(0x50)
-        self.send_data(0x3F)
-
-        self.send_command(0x60)
-        self.send_data(0x02)
-        self.send_data(0x00)
-
-        self.send_command(0x61)
-        self.send_data(0x03)
-        self.send_data(0x20)
-        self.send_data(0x01) 
-        self.send_data(0xE0)
-
-        self.send_command(0x82)
-        self.send_data(0x1E) 
-
-        self.send_command(0x84)
-        self.send_data(0x00)
-
-        self.send_command(0x86)    # AGID
-        self.send_data(0x00)
-
-        self.send_command(0xE3)
-        self.send_data(0x2F)
-
-        self.send_command(0xE0)   # CCSET
-        self.send_data(0x00) 
-
-        self.send_command(0xE6)   # TSSET
-        self.send_data(0x00)
+        self.backend.delay_ms(30)
+
+        self.send(0xAA, 0x49, 0x55, 0x20, 0x08, 0x09, 0x18) # CMDH
+
+        self.send(0x01, 0x3F, 0x00, 0x32, 0x2A, 0x0E, 0x2A)
+
+        self.send(0x00, 0x5F, 0x69)
+
+        self.send(0x03, 0x00, 0x54, 0x00, 0x44)
+
+        self.send(0x05, 0x40, 0x1F, 0x1F, 0x2C)
+
+        self.send(0x06, 0x6F, 0x1F, 0x1F, 0x22)
+
+        self.send(0x08, 0x6F, 0x1F, 0x1F, 0x22)
+
+        self.send(0x13, 0x00, 0x04) # IPC
+
+        self.send(0x30, 0x3C)
+
+        self.send(0x41, 0x00) # TSE
+
+        self.send(0x50, 0x3F)
+
+        self.send(0x60, 0x02, 0x00)
+
+        self.send(0x61, 0x03, 0x20, 0x01, 0xE0)
+
+        self.send(0x82, 0x1E)
+
+        self.send(0x84, 0x00)
+
+        self.send(0x86, 0x00) # AGID
+
+        self.send(0xE3, 0x2F)
+
+        self.send(0xE0, 0x00) # CCSET
+
+        self.send(0xE6, 0x00) # TSSET
         return 0
 
     def getbuffer(self, image):
-        # Create a pallette with the 7 colors supported by the panel
-        pal_image = Image.new("P", (1,1))
-        pal_image.putpalette( (0,0,0,  255,255,255,  0,255,0,   0,0,255,  255,0,0,  255,255,0, 255,128,0) + (0,0,0)*249)
-
-        # Check if we need to rotate the image
-        imwidth, imheight = image.size
-        if(imwidth == self.width and imheight == self.height):
-            image_temp = image
-        elif(imwidth == self.height and imheight == self.width):
-            image_temp = image.rotate(90, expand=True)
-        else:
-            logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, self.width, self.height))
-
-        # Convert the soruce image to the 7 colors, dithering if needed
-        image_7color = image_temp.convert("RGB").quantize(palette=pal_image)
-        buf_7color = bytearray(image_7color.tobytes('raw'))
-
-        # PIL does not support 4 bit color, so pack the 4 bits of color
-        # into a single byte to transfer to the panel
-        buf = [0x00] * int(self.width * self.height / 2)
-        idx = 0
-        for i in range(0, len(buf_7color), 2):
-            buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
-            idx += 1
-            
-        return buf
+        return epdbuffer.getbuffer_4bpp(image, self.width, self.height, self.pal_image)
 
     def display(self, image):
         self.send_command(0x10)
@@ -233,15 +159,14 @@ class EPD:
         
     def Clear(self, color=0x11):
         self.send_command(0x10)
-        self.send_data2([color] * int(self.height) * int(self.width/2))
+        self.send_data2(bytes([color]) * int(self.height) * int(self.width/2))
 
         self.TurnOnDisplay()
 
     def sleep(self):
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -38,49 +38,45 @@ EPD_HEIGHT      = 384
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(5)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 0):      # 0: idle, 1: busy
-            epdconfig.delay_ms(100)    
+        self.backend.wait_busy(0)      # 0: idle, 1: busy
         logger.debug("e-Paper busy release")
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -97,29 +93,24 @@ class EPD:
         self.send_command(0x04) # POWER_ON
         self.ReadBusy()
         
-        self.send_command(0x30) # PLL_CONTROL
-        self.send_data(0x3c)
+        self.send(0x30, 0x3c) # PLL_CONTROL
         
-        self.send_command(0x41) # TEMPERATURE_CALIBRATION
-        self.send_data(0x00)
+        self.send(0x41, 0x00) # TEMPERATURE_CALIBRATION
         
-        self.send_command(0x50) # VCOM_AND_DATA_INTERVAL_SETTING
-        self.send_data(0x77)
+        self.send(0x50, 0x77) # VCOM_AND_DATA_INTERVAL_SETTING
         
-        self.send_command(0x60) # TCON_SETTING
-        self.send_data(0x22)
+        self.send(0x60, 0x22) # TCON_SETTING
         
-        self.send_command(0x61) # TCON_RESOLUTION
-        self.send_data(EPD_WIDTH >> 8)     #source 640
-        self.send_data(EPD_WIDTH & 0xff)
-        self.send_data(EPD_HEIGHT >> 8)     #gate 384
-        self.send_data(EPD_HEIGHT & 0xff)
+        self.send(0x61, # TCON_RESOLUTION
+                  EPD_WIDTH >> 8, #source 640
+                  EPD_WIDTH & 0xff,
+                  EPD_HEIGHT >> 8, #gate 384
+                  EPD_HEIGHT & 0xff)
         
-        self.send_command(0x82) # VCM_DC_SETTING
-        self.send_data(0x1E) # decide by LUT file
+        self.send(0x82, # VCM_DC_SETTING
+                  0x1E) # decide by LUT file
         
-        self.send_command(0xe5) # FLASH MODE
-        self.send_data(0x03)
+        self.send(0xe5, 0x03) # FLASH MODE
         
         # EPD hardware init end
         return 0
@@ -162,11 +153,11 @@ class EPD:
         self.send_command(0x10)
         self.send_data2(image)
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
         
     def Clear(self):
-        buf = [0x33] * int(self.width * self.height / 2)
+        buf = bytes([0x33]) * int(self.width * self.height / 2)
         self.send_command(0x10)
         self.send_data2(buf)
         self.send_command(0x12)
@@ -176,10 +167,9 @@ class EPD:
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
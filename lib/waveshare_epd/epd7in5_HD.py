@@ -30,58 +30,58 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 880
 EPD_HEIGHT      = 528
 
+# Frame upload is bus bound on this panel, clock it above the 4 MHz default.
+# EPD_SPI_SPEED_HZ in .env overrides it.
+SPI_SPEED_HZ    = 10000000
+
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
         
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
         
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 1):
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(200)
+        self.backend.wait_busy(1)
+        self.backend.delay_ms(200)
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init(speed_hz=SPI_SPEED_HZ) != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -90,11 +90,9 @@ class EPD:
         self.send_command(0x12)  #SWRESET
         self.ReadBusy()
 
-        self.send_command(0x46)  # Auto Write Red RAM
-        self.send_data(0xf7)
+        self.send(0x46, 0xf7) # Auto Write Red RAM
         self.ReadBusy()
-        self.send_command(0x47)  # Auto Write  B/W RAM
-        self.send_data(0xf7)
+        self.send(0x47, 0xf7) # Auto Write  B/W RAM
         self.ReadBusy()
 
         self.send_command(0x0C)  # Soft start setting
@@ -103,23 +101,20 @@ class EPD:
         self.send_command(0x01)  # Set MUX as 527
         self.send_data2([0xAF, 0x02, 0x01])
 
-        self.send_command(0x11)  # Data entry mode      
-        self.send_data(0x01)
+        self.send(0x11, 0x01) # Data entry mode      
 
         self.send_command(0x44) 
         self.send_data2([0x00, 0x00, 0x6F, 0x03]) # RAM x address start at 0
         self.send_command(0x45) 
         self.send_data2([0xAF, 0x02, 0x00, 0x00])
 
-        self.send_command(0x3C) # VBD
-        self.send_data(0x05) # LUT1, for white
+        self.send(0x3C, # VBD
+                  0x05) # LUT1, for white
 
-        self.send_command(0x18)
-        self.send_data(0X80)
+        self.send(0x18, 0X80)
 
 
-        self.send_command(0x22)
-        self.send_data(0XB1) #Load Temperature and waveform setting.
+        self.send(0x22, 0XB1) #Load Temperature and waveform setting.
         self.send_command(0x20)
         self.ReadBusy()
 
@@ -131,33 +126,20 @@ class EPD:
         return 0
 
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0xff] * int(self.width * self.height / 8)
-
-        buf = bytearray(img.tobytes('raw'))
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height, rotate_first=True)
         
     def display(self, image):
         self.send_command(0x4F) 
         self.send_data2([0x00, 0x00])
         self.send_command(0x24)
         self.send_data2(image)
-        self.send_command(0x22)
-        self.send_data(0xF7)#Load LUT from MCU(0x32)
+        self.send(0x22, 0xF7) #Load LUT from MCU(0x32)
         self.send_command(0x20)
-        epdconfig.delay_ms(10)
+        self.backend.delay_ms(10)
         self.ReadBusy()
         
     def Clear(self):
-        buf = [0xff] * int(self.width * self.height / 8)
+        buf = bytes([0xff]) * int(self.width * self.height / 8)
         self.send_command(0x4F) 
         self.send_data2([0x00, 0x00])
         self.send_command(0x24)
@@ -166,17 +148,15 @@ class EPD:
         self.send_command(0x26)
         self.send_data2(buf)
                 
-        self.send_command(0x22)
-        self.send_data(0xF7)#Load LUT from MCU(0x32)
+        self.send(0x22, 0xF7) #Load LUT from MCU(0x32)
         self.send_command(0x20)
-        epdconfig.delay_ms(10)
+        self.backend.delay_ms(10)
         self.ReadBusy()
 
     def sleep(self):
-        self.send_command(0x10)
-        self.send_data(0x01)
+        self.send(0x10, 0x01)
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
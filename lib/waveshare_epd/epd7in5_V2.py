@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -43,11 +44,13 @@ GRAY4  = 0x00 #Blackest
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.GRAY1  = GRAY1 #white
@@ -57,104 +60,89 @@ class EPD:
     
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.SPI.writebytes2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(20)
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0x71), poll_ms=0)
+        self.backend.delay_ms(20)
         logger.debug("e-Paper busy release")
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x06)     # btst
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x28)        # If an exception is displayed, try using 0x38
-        self.send_data(0x17)
+        self.send(0x06, # btst
+                  0x17,
+                  0x17,
+                  0x28, # If an exception is displayed, try using 0x38
+                  0x17)
         
-        self.send_command(0x01)			#POWER SETTING
-        self.send_data(0x07)
-        self.send_data(0x07)    #VGH=20V,VGL=-20V
-        self.send_data(0x28)		#VDH=15V
-        self.send_data(0x17)		#VDL=-15V
+        self.send(0x01, #POWER SETTING
+                  0x07,
+                  0x07, #VGH=20V,VGL=-20V
+                  0x28, #VDH=15V
+                  0x17) #VDL=-15V
 
         self.send_command(0x04) #POWER ON
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send(0X00, #PANNEL SETTING
+                  0x1F) #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
 
-        self.send_command(0x61)        	#tres
-        self.send_data(0x03)		#source 800
-        self.send_data(0x20)
-        self.send_data(0x01)		#gate 480
-        self.send_data(0xE0)
+        self.send(0x61, #tres
+                  0x03, #source 800
+                  0x20,
+                  0x01, #gate 480
+                  0xE0)
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        self.send(0X15, 0x00)
 
         # If the screen appears gray, use the annotated initialization command
-        self.send_command(0X50)
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send(0X50, 0x10, 0x07)
         # self.send_command(0X50)
         # self.send_data(0x10)
         # self.send_data(0x17)
         # self.send_command(0X52)		
         # self.send_data(0x03)
 
-        self.send_command(0X60)			#TCON SETTING
-        self.send_data(0x22)
+        self.send(0X60, 0x22) #TCON SETTING
 
         # EPD hardware init end
         return 0
     
     def init_fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send(0X00, #PANNEL SETTING
+                  0x1F) #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
 
         # If the screen appears gray, use the annotated initialization command
-        self.send_command(0X50)
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send(0X50, 0x10, 0x07)
         # self.send_command(0X50)
         # self.send_data(0x10)
         # self.send_data(0x17)
@@ -162,7 +150,7 @@ class EPD:
         # self.send_data(0x03)
 
         self.send_command(0x04) #POWER ON
-        epdconfig.delay_ms(100) 
+        self.backend.delay_ms(100) 
         self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
 
         #Enhanced display drive(Add 0x06 command)
@@ -172,51 +160,45 @@ class EPD:
         self.send_data (0x18)		
         self.send_data (0x17)		
 
-        self.send_command(0xE0)
-        self.send_data(0x02)
-        self.send_command(0xE5)
-        self.send_data(0x5A)
+        self.send(0xE0, 0x02)
+        self.send(0xE5, 0x5A)
 
         # EPD hardware init end
         return 0
     
     def init_part(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send(0X00, #PANNEL SETTING
+                  0x1F) #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
 
         self.send_command(0x04) #POWER ON
-        epdconfig.delay_ms(100) 
+        self.backend.delay_ms(100) 
         self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0xE0)
-        self.send_data(0x02)
-        self.send_command(0xE5)
-        self.send_data(0x6E)
+        self.send(0xE0, 0x02)
+        self.send(0xE5, 0x6E)
 
         # EPD hardware init end
         return 0
     
     # The feature will only be available on screens sold after 24/10/23
     def init_4Gray(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send(0X00, #PANNEL SETTING
+                  0x1F) #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
         
-        self.send_command(0X50)
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send(0X50, 0x10, 0x07)
 
         self.send_command(0x04) #POWER ON
-        epdconfig.delay_ms(100) 
+        self.backend.delay_ms(100) 
         self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
 
         #Enhanced display drive(Add 0x06 command)
@@ -226,69 +208,19 @@ class EPD:
         self.send_data (0x18)		
         self.send_data (0x17)	
 
-        self.send_command(0xE0)
-        self.send_data(0x02)
-        self.send_command(0xE5)
-        self.send_data(0x5F)
+        self.send(0xE0, 0x02)
+        self.send(0xE5, 0x5F)
 
         # EPD hardware init end
         return 0
 
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height, blank=0x00, invert=True, rotate_first=True)
     
     def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
-        if(imwidth == self.width and imheight == self.height):
-            logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
-        elif(imwidth == self.height and imheight == self.width):
-            logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
+        return epdbuffer.getbuffer_4gray(image, self.width, self.height)
 
     def display(self, image):
         if(self.width % 8 == 0):
@@ -307,17 +239,17 @@ class EPD:
         self.send_data2(image)
 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def Clear(self):
         self.send_command(0x10)
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0xFF]) * int(self.width * self.height / 8))
         self.send_command(0x13)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0x00]) * int(self.width * self.height / 8))
 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def display_Partial(self, Image, Xstart, Ystart, Xend, Yend):
@@ -334,9 +266,7 @@ class EPD:
         Width = (Xend - Xstart) // 8
         Height = Yend - Ystart
 	
-        self.send_command(0x50)
-        self.send_data(0xA9)
-        self.send_data(0x07)
+        self.send(0x50, 0xA9, 0x07)
 
         self.send_command(0x91)		#This command makes the display enter partial mode
         self.send_command(0x90)		#resolution setting
@@ -362,88 +292,28 @@ class EPD:
         self.send_data2(image1)
 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def display_4Gray(self, image):
+        plane1, plane2 = epdbuffer.split_4gray(image, (1, 0, 1, 0), (1, 1, 0, 0))
+
         self.send_command(0x10)
-        for i in range(0, 48000):     
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01  
-                    elif(temp2 == 0x80): 
-                        temp3 |= 0x01 
-                    else: #0x40
-                        temp3 |= 0x00 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01
-                    else :   #0x40
-                        temp3 |= 0x00	
-                    if(j!=1 or k!=1):				
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-            
+        self.send_data2(plane1)
         self.send_command(0x13)	       
-        for i in range(0, 48000):       
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00
-                    else: #0x40
-                        temp3 |= 0x01 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00 
-                    else:    #0x40
-                            temp3 |= 0x01	
-                    if(j!=1 or k!=1):					
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-        
+        self.send_data2(plane2)
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def sleep(self):
-        self.send_command(0x50)
-        self.send_data(0XF7)
+        self.send(0x50, 0XF7)
         
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -38,11 +39,13 @@ EPD_HEIGHT      = 480
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
     
@@ -202,39 +205,30 @@ class EPD:
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(2)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(20)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
 
     def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(20)
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0x71), poll_ms=0)
+        self.backend.delay_ms(20)
         logger.debug("e-Paper busy release")
         
     def SetLut(self, lut_vcom, lut_ww, lut_bw, lut_wb, lut_bb):
@@ -259,7 +253,7 @@ class EPD:
             self.send_data(lut_bb[count])
 
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
@@ -276,53 +270,45 @@ class EPD:
         # self.send_data(0x3f)		#VDH=15V
         # self.send_data(0x3f)		#VDL=-15V
 
-        self.send_command(0x01)     # power setting
-        self.send_data(0x17)        # 1-0=11: internal power
-        self.send_data(self.Voltage_Frame_7IN5_V2[6])   # VGH&VGL
-        self.send_data(self.Voltage_Frame_7IN5_V2[1])   # VSH
-        self.send_data(self.Voltage_Frame_7IN5_V2[2])   # VSL
-        self.send_data(self.Voltage_Frame_7IN5_V2[3])   # VSHR
+        self.send(0x01, # power setting
+                  0x17, # 1-0=11: internal power
+                  self.Voltage_Frame_7IN5_V2[6], # VGH&VGL
+                  self.Voltage_Frame_7IN5_V2[1], # VSH
+                  self.Voltage_Frame_7IN5_V2[2], # VSL
+                  self.Voltage_Frame_7IN5_V2[3]) # VSHR
         
-        self.send_command(0x82)     # VCOM DC Setting
-        self.send_data(self.Voltage_Frame_7IN5_V2[4])   # VCOM
-
-        self.send_command(0x06)     # Booster Setting
-        self.send_data(0x27)
-        self.send_data(0x27)
-        self.send_data(0x2F)
-        self.send_data(0x17)
+        self.send(0x82, # VCOM DC Setting
+                  self.Voltage_Frame_7IN5_V2[4]) # VCOM
+
+        self.send(0x06, 0x27, 0x27, 0x2F, 0x17) # Booster Setting
         
-        self.send_command(0x30)     # OSC Setting
-        self.send_data(self.Voltage_Frame_7IN5_V2[0])   # 3C=50Hz, 3A=100HZ
+        self.send(0x30, # OSC Setting
+                  self.Voltage_Frame_7IN5_V2[0]) # 3C=50Hz, 3A=100HZ
 
         self.send_command(0x04)     # POWER ON
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0X00)     # PANNEL SETTING
-        self.send_data(0x3F)        # KW-3f KWR-2F BWROTP-0f BWOTP-1f
+        self.send(0X00, # PANNEL SETTING
+                  0x3F) # KW-3f KWR-2F BWROTP-0f BWOTP-1f
 
-        self.send_command(0x61)     # tres
-        self.send_data(0x03)        # source 800
-        self.send_data(0x20)
-        self.send_data(0x01)        # gate 480
-        self.send_data(0xE0)
+        self.send(0x61, # tres
+                  0x03, # source 800
+                  0x20,
+                  0x01, # gate 480
+                  0xE0)
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        self.send(0X15, 0x00)
 
-        self.send_command(0X50)     # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send(0X50, 0x10, 0x07) # VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60)     # TCON SETTING
-        self.send_data(0x22)
+        self.send(0X60, 0x22) # TCON SETTING
 
-        self.send_command(0x65)     # Resolution setting
-        self.send_data(0x00)
-        self.send_data(0x00)        # 800*480
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x65, # Resolution setting
+                  0x00,
+                  0x00, # 800*480
+                  0x00,
+                  0x00)
 
         self.SetLut(self.LUT_VCOM_7IN5_V2, self.LUT_WW_7IN5_V2, self.LUT_BW_7IN5_V2, self.LUT_WB_7IN5_V2, self.LUT_BB_7IN5_V2)
         # EPD hardware init end
@@ -336,11 +322,9 @@ class EPD:
         PLL=(wavedata[0]&0xF0)>>4
         XON=wavedata[2]&0xC0
 
-        self.send_command(0x52)	      #EVS
-        self.send_data(EVS)
+        self.send(0x52, EVS) #EVS
 
-        self.send_command(0x30)			  #PLL setting 
-        self.send_data(PLL)
+        self.send(0x30, PLL) #PLL setting 
 
         self.send_command(0x01)       #Set VGH VGL VSH VSL VSHR
         self.send_data (0x17)
@@ -349,9 +333,7 @@ class EPD:
         self.send_data (wavedata[2]&0x3F)  	#VSL for white
         self.send_data (wavedata[3]&0x3F)  	#VSHR for red
 
-        self.send_command(0x2A)	      #LUTOPT
-        self.send_data(XON)
-        self.send_data(wavedata[4])
+        self.send(0x2A, XON, wavedata[4]) #LUTOPT
 
         self.send_command(0x82)       #VCOM_DC setting
         self.send_data (wavedata[5])  #Vcom value
@@ -373,41 +355,30 @@ class EPD:
         self.send_data2(wavedata[174:216])
 
     def init2(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0x00)  # Panel setting   
-        self.send_data(0x3F)
+        self.send(0x00, 0x3F) # Panel setting   
 
-        self.send_command(0x06)  # Booster Setting
-        self.send_data(0x17)  
-        self.send_data(0x17)
-        self.send_data(0x28)
-        self.send_data(0x18)
+        self.send(0x06, 0x17, 0x17, 0x28, 0x18) # Booster Setting
 
-        self.send_command(0x50)  # VCOM and DATA interval setting    
-        self.send_data(0x22)
-        self.send_data(0x07)
+        self.send(0x50, 0x22, 0x07) # VCOM and DATA interval setting    
 
-        self.send_command(0x60)  # TCON setting
-        self.send_data(0x22)  # S-G G-S
+        self.send(0x60, # TCON setting
+                  0x22) # S-G G-S
 
-        self.send_command(0x61)  # Resolution setting
-        self.send_data(0x03)#800*480
-        self.send_data(0x20)
-        self.send_data(0x01)
-        self.send_data(0xE0) 
+        self.send(0x61, # Resolution setting
+                  0x03, #800*480
+                  0x20,
+                  0x01,
+                  0xE0)
 
-        self.send_command(0x65)  # Resolution setting
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x65, 0x00, 0x00, 0x00, 0x00) # Resolution setting
 
         self.send_command(0x04) #POWER ON
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy() 
 
         return 0
@@ -425,24 +396,9 @@ class EPD:
     
 
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height, blank=0x00, invert=True, rotate_first=True)
 
     def display(self, image):
         if(self.width % 8 == 0):
@@ -461,16 +417,16 @@ class EPD:
         self.send_data2(image)
 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def Clear(self):
         self.send_command(0x10)
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0xFF]) * int(self.width * self.height / 8))
         self.send_command(0x13)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
+        self.send_data2(bytes([0x00]) * int(self.width * self.height / 8))
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def display_Partial(self, Image, Xstart, Ystart, Xend, Yend):
@@ -487,9 +443,7 @@ class EPD:
         Width = (Xend - Xstart) // 8
         Height = Yend - Ystart
 	
-        self.send_command(0x50)
-        self.send_data(0xA9)
-        self.send_data(0x07)
+        self.send(0x50, 0xA9, 0x07)
 
         self.send_command(0x91)		#This command makes the display enter partial mode
         self.send_command(0x90)		#resolution setting
@@ -515,16 +469,15 @@ class EPD:
         self.send_data2(image1)
 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
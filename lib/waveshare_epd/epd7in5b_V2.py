@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -38,171 +39,118 @@ EPD_HEIGHT      = 480
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.partFlag=1
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(4)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(4)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
     
     def send_data2(self, data): #faster
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(200)
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0x71), poll_ms=0)
+        self.backend.delay_ms(200)
         logger.debug("e-Paper busy release")
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0x01)
-        self.send_data(0x07)
-        self.send_data(0x07)
-        self.send_data(0x3f)
-        self.send_data(0x3f)
+        self.send(0x01, 0x07, 0x07, 0x3f, 0x3f)
 
-        self.send_command(0x06)
-        self.send_data(0x17)
-        self.send_data(0x17) 
-        self.send_data(0x28)	
-        self.send_data(0x17)
+        self.send(0x06, 0x17, 0x17, 0x28, 0x17)
 
         self.send_command(0x04)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0X00)
-        self.send_data(0x0F)
+        self.send(0X00, 0x0F)
 
-        self.send_command(0x61)		
-        self.send_data(0x03)
-        self.send_data(0x20)
-        self.send_data(0x01)
-        self.send_data(0xE0)
+        self.send(0x61, 0x03, 0x20, 0x01, 0xE0)
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        self.send(0X15, 0x00)
 
-        self.send_command(0X50)
-        self.send_data(0x11)
-        self.send_data(0x07)
+        self.send(0X50, 0x11, 0x07)
 
-        self.send_command(0X60)
-        self.send_data(0x22)
+        self.send(0X60, 0x22)
             
         return 0
     
     def init_Fast(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0X00)
-        self.send_data(0x0F)
+        self.send(0X00, 0x0F)
 
         self.send_command(0x04)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0x06)
-        self.send_data(0x27)
-        self.send_data(0x27) 
-        self.send_data(0x18)		
-        self.send_data(0x17)		
+        self.send(0x06, 0x27, 0x27, 0x18, 0x17)
 
-        self.send_command(0xE0)
-        self.send_data(0x02)
-        self.send_command(0xE5)
-        self.send_data(0x5A)
+        self.send(0xE0, 0x02)
+        self.send(0xE5, 0x5A)
 
-        self.send_command(0X50)
-        self.send_data(0x11)
-        self.send_data(0x07)
+        self.send(0X50, 0x11, 0x07)
         
         return 0
     
     def init_part(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0X00)
-        self.send_data(0x1F)
+        self.send(0X00, 0x1F)
 
         self.send_command(0x04)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0xE0)
-        self.send_data(0x02)
-        self.send_command(0xE5)
-        self.send_data(0x6E)
+        self.send(0xE0, 0x02)
+        self.send(0xE5, 0x6E)
 
-        self.send_command(0X50)
-        self.send_data(0xA9)
-        self.send_data(0x07)
+        self.send(0X50, 0xA9, 0x07)
 
         # EPD hardware init end
         return 0
 
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height, blank=0x00, invert=True, rotate_first=True)
 
     def display(self, imageblack, imagered):
         self.send_command(0x10)
@@ -215,7 +163,7 @@ class EPD:
         self.send_data2(imagered)
         
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def display_Base_color(self, color):
@@ -235,7 +183,7 @@ class EPD:
                 self.send_data(~color)
 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def display_Partial(self, Image, Xstart, Ystart, Xend, Yend):
@@ -282,12 +230,12 @@ class EPD:
         self.send_data2(Image)
 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
         
     def Clear(self):
-        buf = [0x00] * (int(self.width/8) * self.height)
-        buf2 = [0xff] * (int(self.width/8) * self.height)
+        buf = bytes([0x00]) * (int(self.width/8) * self.height)
+        buf2 = bytes([0xff]) * (int(self.width/8) * self.height)
         self.send_command(0x10)
         self.send_data2(buf2)
             
@@ -295,17 +243,16 @@ class EPD:
         self.send_data2(buf)
                 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
@@ -30,6 +30,7 @@
 
 import logging
 from . import epdconfig
+from . import epdbuffer
 
 # Display resolution
 EPD_WIDTH       = 800
@@ -38,53 +39,46 @@ EPD_HEIGHT      = 480
 logger = logging.getLogger(__name__)
 
 class EPD:
-    def __init__(self):
-        self.reset_pin = epdconfig.RST_PIN
-        self.dc_pin = epdconfig.DC_PIN
-        self.busy_pin = epdconfig.BUSY_PIN
-        self.cs_pin = epdconfig.CS_PIN
+    def __init__(self, backend=None):
+        # epdconfig's default backend unless given one, see epdconfig.create_backend
+        self.backend = backend or epdconfig
+        self.reset_pin = self.backend.RST_PIN
+        self.dc_pin = self.backend.DC_PIN
+        self.busy_pin = self.backend.BUSY_PIN
+        self.cs_pin = self.backend.CS_PIN
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
 
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(4)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200) 
+        self.backend.digital_write(self.reset_pin, 0)
+        self.backend.delay_ms(4)
+        self.backend.digital_write(self.reset_pin, 1)
+        self.backend.delay_ms(200)   
 
     def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_command(command)
 
     def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data(data)
+
+    # send a command and its parameters in one transaction
+    def send(self, command, *data):
+        self.backend.send(command, *data)
     
     def send_data2(self, data): #faster
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
+        self.backend.send_data2(data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
-        self.send_command(0x71)
-        busy = epdconfig.digital_read(self.busy_pin)
-        while(busy == 0):
-            self.send_command(0x71)
-            busy = epdconfig.digital_read(self.busy_pin)
-        epdconfig.delay_ms(200)
+        self.backend.wait_busy(0, poll=lambda: self.send_command(0x71), poll_ms=0)
+        self.backend.delay_ms(200)
         logger.debug("e-Paper busy release")
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        if (self.backend.module_init() != 0):
             return -1
             
         self.reset()
@@ -95,62 +89,39 @@ class EPD:
         # self.send_data(0x38)      # If an exception is displayed, try using 0x38
         # self.send_data(0x17)
 
-        self.send_command(0x01)     # POWER SETTING
-        self.send_data(0x07)
-        self.send_data(0x07)        # VGH=20V,VGL=-20V
-        self.send_data(0x3f)        # VDH=15V
-        self.send_data(0x3f)        # VDL=-15V
+        self.send(0x01, # POWER SETTING
+                  0x07,
+                  0x07, # VGH=20V,VGL=-20V
+                  0x3f, # VDH=15V
+                  0x3f) # VDL=-15V
 
         self.send_command(0x04)     # POWER ON
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0X00)     # PANNEL SETTING
-        self.send_data(0x0F)        # KW-3f KWR-2F BWROTP-0f BWOTP-1f
+        self.send(0X00, # PANNEL SETTING
+                  0x0F) # KW-3f KWR-2F BWROTP-0f BWOTP-1f
 
-        self.send_command(0x61)     # tres
-        self.send_data(0x03)        # source 800
-        self.send_data(0x20)
-        self.send_data(0x01)        # gate 480
-        self.send_data(0xE0)
+        self.send(0x61, # tres
+                  0x03, # source 800
+                  0x20,
+                  0x01, # gate 480
+                  0xE0)
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        self.send(0X15, 0x00)
 
-        self.send_command(0X50)     # VCOM AND DATA INTERVAL SETTING
-        self.send_data(0x11)
-        self.send_data(0x07)
+        self.send(0X50, 0x11, 0x07) # VCOM AND DATA INTERVAL SETTING
 
-        self.send_command(0X60)     # TCON SETTING
-        self.send_data(0x22)
+        self.send(0X60, 0x22) # TCON SETTING
 
-        self.send_command(0x65)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
+        self.send(0x65, 0x00, 0x00, 0x00, 0x00)
     
         return 0
 
     def getbuffer(self, image):
-        img = image
-        imwidth, imheight = img.size
-        if(imwidth == self.width and imheight == self.height):
-            img = img.convert('1')
-        elif(imwidth == self.height and imheight == self.width):
-            # image has correct dimensions, but needs to be rotated
-            img = img.rotate(90, expand=True).convert('1')
-        else:
-            logger.warning("Wrong image dimensions: must be " + str(self.width) + "x" + str(self.height))
-            # return a blank buffer
-            return [0x00] * (int(self.width/8) * self.height)
-
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return epdbuffer.getbuffer_1bpp(image, self.width, self.height, blank=0x00, invert=True, rotate_first=True)
 
     def display(self, imageblack, imagered):
         self.send_command(0x10)
@@ -163,12 +134,12 @@ class EPD:
         self.send_data2(imagered)
         
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
         
     def Clear(self):
-        buf = [0x00] * (int(self.width/8) * self.height)
-        buf2 = [0xff] * (int(self.width/8) * self.height)
+        buf = bytes([0x00]) * (int(self.width/8) * self.height)
+        buf2 = bytes([0xff]) * (int(self.width/8) * self.height)
         self.send_command(0x10)
         self.send_data2(buf2)
             
@@ -176,17 +147,16 @@ class EPD:
         self.send_data2(buf)
                 
         self.send_command(0x12)
-        epdconfig.delay_ms(100)
+        self.backend.delay_ms(100)
         self.ReadBusy()
 
     def sleep(self):
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send(0x07, 0XA5) # DEEP_SLEEP
         
-        epdconfig.delay_ms(2000)
-        epdconfig.module_exit()
+        self.backend.delay_ms(2000)
+        self.backend.module_exit()
 ### END OF FILE ###
 
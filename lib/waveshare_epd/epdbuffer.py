@@ -0,0 +1,175 @@
+# *****************************************************************************
+# * | File        :	  epdbuffer.py
+# * | Function    :   Image to frame buffer conversion shared by the drivers
+# * | Info        :
+# *----------------
+# * | This version:   V1.0
+# * | Info        :
+# ******************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import logging
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# bytes.translate table flipping every bit
+INVERT = bytes(0xFF - i for i in range(256))
+
+
+def pack_1bpp(image):
+    """Mode '1' image to MSB-first bytes, 1 = white, rows padded to a whole byte with white"""
+    imwidth, imheight = image.size
+    if imwidth % 8:
+        padded = Image.new('1', ((imwidth + 7) // 8 * 8, imheight), 1)
+        padded.paste(image, (0, 0))
+        image = padded
+    return bytearray(image.tobytes('raw'))
+
+
+def getbuffer_1bpp(image, width, height, blank=0xFF, invert=False, rotate_first=False):
+    """
+    Frame buffer of a width x height 1bpp panel, one bit per pixel, MSB first.
+    A height x width (portrait) image is rotated 90 degrees into the panel
+    orientation after dithering, so pixel (x, y) lands on (y, height - 1 - x).
+    Any other size gives a buffer filled with blank.
+    With rotate_first the image is rotated before it is dithered and rows
+    keep the black padding of tobytes(), the output of the drivers that
+    always used tobytes().
+    """
+    imwidth, imheight = image.size
+    if(imwidth == width and imheight == height):
+        image_monocolor = image.convert('1')
+    elif(imwidth == height and imheight == width):
+        if rotate_first:
+            image_monocolor = image.transpose(Image.Transpose.ROTATE_90).convert('1')
+        else:
+            image_monocolor = image.convert('1').transpose(Image.Transpose.ROTATE_90)
+    else:
+        logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, width, height))
+        return bytearray([blank]) * ((width + 7) // 8 * height)
+
+    if rotate_first:
+        buf = bytearray(image_monocolor.tobytes('raw'))
+    else:
+        buf = pack_1bpp(image_monocolor)
+    if invert:
+        buf = buf.translate(INVERT)
+    return buf
+
+
+def palette_image(colors):
+    """P mode image carrying colors (flat r, g, b values) for Image.quantize, built once per driver"""
+    pal_image = Image.new("P", (1,1))
+    pal_image.putpalette(tuple(colors) + (0,0,0) * (256 - len(colors) // 3))
+    return pal_image
+
+
+def quantize(image, width, height, pal_image):
+    """
+    Rotate a height x width (portrait) image into the panel orientation and
+    reduce it to the colors of pal_image, dithering if needed.
+    None if the image has neither size.
+    """
+    imwidth, imheight = image.size
+    if(imwidth == width and imheight == height):
+        image_temp = image
+    elif(imwidth == height and imheight == width):
+        image_temp = image.transpose(Image.Transpose.ROTATE_90)
+    else:
+        logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, width, height))
+        return None
+
+    return image_temp.convert("RGB").quantize(palette=pal_image)
+
+
+def getbuffer_4bpp(image, width, height, pal_image, blank=0x11):
+    """Frame buffer of a 4bpp color panel, two palette indices per byte, high nibble first"""
+    image_color = quantize(image, width, height, pal_image)
+    if image_color is None:
+        return bytearray([blank]) * (width * height // 2)
+
+    # PIL packs the indices itself with the P;4 raw mode
+    return bytearray(image_color.tobytes('raw', 'P;4'))
+
+
+def getbuffer_2bpp(image, width, height, pal_image, blank=0x55):
+    """Frame buffer of a 4 color panel, four palette indices per byte, first pixel in the high bits, rows padded to a whole byte"""
+    image_color = quantize(image, width, height, pal_image)
+    if image_color is None:
+        return bytearray([blank]) * ((width + 3) // 4 * height)
+
+    # PIL packs the indices itself with the P;2 raw mode
+    return bytearray(image_color.tobytes('raw', 'P;2'))
+
+
+# 2bpp level of an 'L' pixel for the 4-gray mode. 0xC0 and 0x80 are the
+# light and dark gray of a 4-gray image and map to 2 and 1, the rest
+# keeps its two top bits.
+GRAY4_LEVELS = bytes(2 if v == 0xC0 else 1 if v == 0x80 else v >> 6 for v in range(256))
+
+_gray4_tables = {}
+
+
+def getbuffer_4gray(image, width, height, rotation=Image.Transpose.ROTATE_90):
+    """
+    Frame buffer of a 4-gray panel, 2 bits per pixel, first pixel in the high bits.
+    A height x width (portrait) image is turned into the panel orientation
+    with rotation. Any other size gives a white buffer.
+    """
+    image_monocolor = image.convert('L')
+    imwidth, imheight = image_monocolor.size
+    if(imwidth != width or imheight != height):
+        if(imwidth == height and imheight == width):
+            image_monocolor = image_monocolor.transpose(rotation)
+        else:
+            logger.warning("Invalid image dimensions: %d x %d, expected %d x %d" % (imwidth, imheight, width, height))
+            return bytearray([0xFF]) * ((width + 3) // 4 * height)
+
+    levels = image_monocolor.tobytes().translate(GRAY4_LEVELS)
+    return bytearray(Image.frombytes('P', (width, height), levels).tobytes('raw', 'P;2'))
+
+
+def gray4_table(bits):
+    """
+    256-entry translate table from a packed 4-gray byte to the nibble its
+    four pixels set in one RAM plane, bits[level] being the bit of a level.
+    """
+    table = _gray4_tables.get(bits)
+    if table is None:
+        table = bytes(
+            sum(bits[(b >> (6 - 2 * k)) & 0x03] << (3 - k) for k in range(4))
+            for b in range(256)
+        )
+        _gray4_tables[bits] = table
+    return table
+
+
+def split_4gray(buf, *planes):
+    """
+    Split a packed 4-gray buffer into 1bpp RAM planes, one per bits tuple
+    in planes (see gray4_table). Each plane packs two source bytes into one.
+    """
+    buf = bytes(buf)
+    result = []
+    for bits in planes:
+        nibbles = buf.translate(gray4_table(bits))
+        result.append(bytearray(Image.frombytes('P', (len(nibbles), 1), nibbles).tobytes('raw', 'P;4')))
+    return result
@@ -28,120 +28,381 @@
 #
 
 import os
+import functools
 import logging
 import sys
+import threading
 import time
-import subprocess
 
 from ctypes import *
 
 logger = logging.getLogger(__name__)
 
+# Default pin numbers, the same on every backend. Drivers read them at
+# EPD() without building the backend.
+RST_PIN  = 17
+DC_PIN   = 25
+CS_PIN   = 8
+BUSY_PIN = 24
+PWR_PIN  = 18
+
+# Backend to use, skipping detection: raspberrypi, raspberrypi_lgpio,
+# raspberrypi_devconfig, jetsonnano or sunrisex3
+EPD_PLATFORM     = os.getenv('EPD_PLATFORM', '').lower() or None
+# BUSY waits raise TimeoutError after this long, None waits forever
+BUSY_TIMEOUT_MS  = int(os.getenv('EPD_BUSY_TIMEOUT_MS', '120000')) or None
+# Read interval when BUSY has to be polled
+BUSY_POLL_MS     = 10
+# Edge waits are re-checked at this interval, so an edge missed between
+# the first read and the wait costs at most this much
+BUSY_EDGE_SLICE_MS = 100
+# Largest single spidev transfer, the kernel rejects anything longer
+SPI_BUFSIZ_PATH  = '/sys/module/spidev/parameters/bufsiz'
+SPI_BUFSIZ_DEFAULT = 4096
+# SPI clock of drivers that do not ask for one
+SPI_SPEED_DEFAULT_HZ = 4000000
+# Clock for every model, wins over the driver and the calibrated speed.
+# Unlike those it is not capped, set it only for a panel known to take it
+SPI_SPEED_HZ     = int(os.getenv('EPD_SPI_SPEED_HZ', '0')) or None
+# Clock steps tried by spi_calibrate, slowest first
+SPI_CALIBRATE_HZ = (2000000, 4000000, 8000000, 10000000, 16000000, 20000000, 25000000, 32000000)
+# Waveshare's native GPIO/SPI library, built for the word size of this
+# Python rather than of the kernel
+DEV_CONFIG_SO    = 'DEV_Config_64.so' if sys.maxsize > 2**32 else 'DEV_Config_32.so'
+
+
+def _poll_busy(read, level, timeout_ms, poll=None, poll_ms=BUSY_POLL_MS):
+    """
+    Read BUSY until it leaves level. poll is called after every read that
+    finds it still at level, then poll_ms later BUSY is read again, so a
+    panel that is already idle never sees poll.
+    """
+    start = time.monotonic()
+    while True:
+        if read() != level:
+            return True
+        if timeout_ms is not None and (time.monotonic() - start) * 1000 >= timeout_ms:
+            return False
+        if poll is not None:
+            poll()
+        time.sleep(poll_ms / 1000.0)
+
+
+def _edge_busy(read, wait_edge, level, timeout_ms):
+    """Wait for BUSY to leave level with wait_edge(timeout_ms), a blocking edge wait"""
+    start = time.monotonic()
+    while read() == level:
+        remaining = BUSY_EDGE_SLICE_MS
+        if timeout_ms is not None:
+            remaining = min(remaining, timeout_ms - (time.monotonic() - start) * 1000)
+            if remaining <= 0:
+                return False
+        wait_edge(int(remaining))
+    return True
+
+
+def _gpio_wait_busy(GPIO, pin, level, timeout_ms, poll, poll_ms):
+    """wait_busy for RPi.GPIO style modules (Jetson.GPIO, Hobot.GPIO)"""
+    read = lambda: GPIO.input(pin)
+    if poll is not None:
+        return _report_busy(_poll_busy(read, level, timeout_ms, poll, poll_ms), level, timeout_ms)
+
+    edge = GPIO.FALLING if level else GPIO.RISING
+    try:
+        released = _edge_busy(read, lambda ms: GPIO.wait_for_edge(pin, edge, timeout=ms), level, timeout_ms)
+    except Exception as e:
+        logger.debug("BUSY edge wait unavailable, polling: %s" % e)
+        released = _poll_busy(read, level, timeout_ms)
+    return _report_busy(released, level, timeout_ms)
+
+
+class _GpioPin:
+    """
+    Pin handle over an RPi.GPIO style module (Jetson.GPIO, Hobot.GPIO) with
+    the same on/off/value interface as a gpiozero device. The pin number is
+    bound once, a write is a single call.
+    """
+
+    def __init__(self, GPIO, pin):
+        self.pin = pin
+        self.on = functools.partial(GPIO.output, pin, 1)
+        self.off = functools.partial(GPIO.output, pin, 0)
+        self._input = functools.partial(GPIO.input, pin)
+
+    @property
+    def value(self):
+        return self._input()
+
+
+def _report_busy(released, level, timeout_ms):
+    # Raised so the caller does not go on as if the panel had taken the frame
+    if not released:
+        raise TimeoutError("e-Paper busy timeout, BUSY still %d after %d ms" % (level, timeout_ms))
+    return released
+
+
+def _load_dev_config():
+    """DEV_CONFIG_SO from the package directory or the system library paths"""
+    find_dirs = [
+        os.path.dirname(os.path.realpath(__file__)),
+        '/usr/local/lib',
+        '/usr/lib',
+    ]
+    for find_dir in find_dirs:
+        so_filename = os.path.join(find_dir, DEV_CONFIG_SO)
+        if os.path.exists(so_filename):
+            logger.debug("Loading %s" % so_filename)
+            return CDLL(so_filename)
+    raise RuntimeError('Cannot find %s' % DEV_CONFIG_SO)
+
+
+def _spi_bufsiz():
+    try:
+        with open(SPI_BUFSIZ_PATH) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return SPI_BUFSIZ_DEFAULT
+
+
+def _byte_view(data):
+    """
+    data as a flat memoryview of unsigned bytes. bytes, bytearray and other
+    buffer objects are not copied, lists and tuples of ints are packed once,
+    masked to 8 bits like spidev does.
+    """
+    try:
+        view = memoryview(data)
+    except TypeError:
+        try:
+            view = memoryview(bytes(data))
+        except ValueError:
+            view = memoryview(bytes(b & 0xFF for b in data))
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+def _ctypes_buffer(view):
+    """ctypes array over a byte memoryview, copied only if it is read-only"""
+    if view.readonly:
+        return (c_ubyte * len(view)).from_buffer_copy(view)
+    return (c_ubyte * len(view)).from_buffer(view)
+
+
+def _spi_upload(backend, write, data, chunk=None):
+    """
+    Write data with write, in memoryview slices of at most chunk bytes,
+    as a single view with chunk 0, or one byte at a time without chunk,
+    and add it to the backend counters.
+    """
+    view = _byte_view(data)
+    start = time.perf_counter()
+    if chunk is None:
+        for b in view:
+            write(b)
+    elif chunk == 0:
+        if len(view):
+            write(view)
+    else:
+        for i in range(0, len(view), chunk):
+            write(view[i:i + chunk])
+    elapsed = time.perf_counter() - start
+
+    backend.spi_bytes += len(view)
+    backend.spi_seconds += elapsed
+    if len(view) >= SPI_BUFSIZ_DEFAULT and elapsed > 0:
+        logger.debug("SPI %d bytes in %.1f ms, %d bytes/s" % (len(view), elapsed * 1000, len(view) / elapsed))
+
+
+def _spi_stats(backend):
+    """(bytes, seconds, bytes/s) written since the previous call"""
+    sent, seconds = backend.spi_bytes, backend.spi_seconds
+    backend.spi_bytes, backend.spi_seconds = 0, 0.0
+    return sent, seconds, (sent / seconds if seconds else 0.0)
+
+
+def _spi_speed(calibrated, rated):
+    """
+    EPD_SPI_SPEED_HZ, else the driver's rated speed (the default if it
+    has none), lowered to the calibrated speed if that is slower.
+    Calibration only checks the bus wiring, never the panel, so it can
+    not raise the clock above what the driver asks for.
+    """
+    if SPI_SPEED_HZ:
+        return SPI_SPEED_HZ
+    speed = rated or SPI_SPEED_DEFAULT_HZ
+    if calibrated:
+        speed = min(speed, calibrated)
+    return speed
+
+
+def _spi_loopback(backend):
+    """
+    Readback check: a random block written on MOSI has to come back
+    unchanged on MISO, which needs MOSI wired to MISO for the test.
+    """
+    pattern = os.urandom(backend.SPI_BUFSIZ)
+    return bytes(backend.SPI.xfer3(pattern)) == pattern
+
+
+def _spi_calibrate(backend, speeds, check, rounds):
+    """
+    Step the clock up through speeds until check(backend) fails once in
+    rounds tries. Leaves the bus at, and returns, the highest stable speed,
+    None if even the slowest one failed. The default check is a loopback
+    of the bus alone, the panel's own limit is the driver's speed_hz.
+    """
+    previous = backend.SPI.max_speed_hz
+    stable = None
+    for speed in sorted(speeds):
+        backend.SPI.max_speed_hz = speed
+        if not all(check(backend) for _ in range(rounds)):
+            logger.info("SPI unstable at %d Hz" % speed)
+            break
+        logger.info("SPI stable at %d Hz" % speed)
+        stable = speed
+    backend.SPI.max_speed_hz = stable or previous
+    return stable
+
 
 class RaspberryPi:
     # Pin definition
-    RST_PIN  = 17
-    DC_PIN   = 25
-    CS_PIN   = 8
-    BUSY_PIN = 24
-    PWR_PIN  = 18
     MOSI_PIN = 10
     SCLK_PIN = 11
 
-    def __init__(self):
+    def __init__(self, rst_pin=RST_PIN, dc_pin=DC_PIN, cs_pin=CS_PIN, busy_pin=BUSY_PIN, pwr_pin=PWR_PIN,
+                 spi_bus=0, spi_device=0):
         import spidev
-        import gpiozero
-        
+
+        # CS is the hardware chip select of spi_device, driven by spidev
+        self.RST_PIN  = rst_pin
+        self.DC_PIN   = dc_pin
+        self.CS_PIN   = cs_pin
+        self.BUSY_PIN = busy_pin
+        self.PWR_PIN  = pwr_pin
+        self.SPI_BUS  = spi_bus
+        self.SPI_DEVICE = spi_device
+
         self.SPI = spidev.SpiDev()
+        # Pin handles, claimed through lgpio directly by RaspberryPiLgpio
+        self._open_gpio()
+
+        # pin number -> handle, writes to CS are left to spidev
+        self.pins = {
+            self.RST_PIN:  self.GPIO_RST_PIN,
+            self.DC_PIN:   self.GPIO_DC_PIN,
+            self.PWR_PIN:  self.GPIO_PWR_PIN,
+            self.BUSY_PIN: self.GPIO_BUSY_PIN,
+        }
+
+        self.SPI_BUFSIZ  = _spi_bufsiz()
+        self.spi_bytes   = 0
+        self.spi_seconds = 0.0
+        self.spi_speed_hz = None
+
+    def _open_gpio(self):
+        import gpiozero
+
         self.GPIO_RST_PIN    = gpiozero.LED(self.RST_PIN)
         self.GPIO_DC_PIN     = gpiozero.LED(self.DC_PIN)
-        # self.GPIO_CS_PIN     = gpiozero.LED(self.CS_PIN)
         self.GPIO_PWR_PIN    = gpiozero.LED(self.PWR_PIN)
         self.GPIO_BUSY_PIN   = gpiozero.Button(self.BUSY_PIN, pull_up = False)
 
-        
-
     def digital_write(self, pin, value):
-        if pin == self.RST_PIN:
-            if value:
-                self.GPIO_RST_PIN.on()
-            else:
-                self.GPIO_RST_PIN.off()
-        elif pin == self.DC_PIN:
-            if value:
-                self.GPIO_DC_PIN.on()
-            else:
-                self.GPIO_DC_PIN.off()
-        # elif pin == self.CS_PIN:
-        #     if value:
-        #         self.GPIO_CS_PIN.on()
-        #     else:
-        #         self.GPIO_CS_PIN.off()
-        elif pin == self.PWR_PIN:
-            if value:
-                self.GPIO_PWR_PIN.on()
-            else:
-                self.GPIO_PWR_PIN.off()
+        handle = self.pins.get(pin)
+        if handle is None:
+            return
+        if value:
+            handle.on()
+        else:
+            handle.off()
 
     def digital_read(self, pin):
-        if pin == self.BUSY_PIN:
-            return self.GPIO_BUSY_PIN.value
-        elif pin == self.RST_PIN:
-            return self.RST_PIN.value
-        elif pin == self.DC_PIN:
-            return self.DC_PIN.value
-        # elif pin == self.CS_PIN:
-        #     return self.CS_PIN.value
-        elif pin == self.PWR_PIN:
-            return self.PWR_PIN.value
+        handle = self.pins.get(pin)
+        if handle is not None:
+            return handle.value
 
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy(self, level, timeout_ms=BUSY_TIMEOUT_MS, poll=None, poll_ms=BUSY_POLL_MS):
+        # Controllers that only update BUSY after a status command have to be polled
+        if poll is not None:
+            released = _poll_busy(lambda: self.GPIO_BUSY_PIN.value, level, timeout_ms, poll, poll_ms)
+            return _report_busy(released, level, timeout_ms)
+
+        # gpiozero tracks BUSY with edge events, the wait sleeps until it changes
+        timeout = None if timeout_ms is None else timeout_ms / 1000.0
+        try:
+            if level:
+                released = self.GPIO_BUSY_PIN.wait_for_release(timeout)
+            else:
+                released = self.GPIO_BUSY_PIN.wait_for_press(timeout)
+        except Exception as e:
+            logger.debug("BUSY edge wait unavailable, polling: %s" % e)
+            released = _poll_busy(lambda: self.GPIO_BUSY_PIN.value, level, timeout_ms)
+        return _report_busy(released, level, timeout_ms)
+
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
     def spi_writebyte2(self, data):
-        self.SPI.writebytes2(data)
+        # bytes, bytearray or memoryview go to spidev as bufsiz slices, without copies
+        _spi_upload(self, self.SPI.writebytes2, data, self.SPI_BUFSIZ)
+
+    def spi_stats(self):
+        return _spi_stats(self)
+
+    def set_spi_speed(self, speed_hz):
+        # Calibrated speed, caps the driver's own from the next module_init
+        self.spi_speed_hz = speed_hz
+
+    def spi_calibrate(self, speeds=SPI_CALIBRATE_HZ, check=_spi_loopback, rounds=3):
+        return _spi_calibrate(self, speeds, check, rounds)
+
+    # Driver writes, DC goes through its handle and CS is driven by spidev
+    def send_command(self, command):
+        self.GPIO_DC_PIN.off()
+        self.SPI.writebytes([command])
+
+    def send_data(self, data):
+        self.GPIO_DC_PIN.on()
+        self.SPI.writebytes([data])
+
+    def send_data2(self, data):
+        self.GPIO_DC_PIN.on()
+        self.spi_writebyte2(data)
+
+    def send(self, command, *data):
+        # One transaction: command byte with DC low, then all parameters with DC high.
+        self.GPIO_DC_PIN.off()
+        self.SPI.writebytes([command])
+        if data:
+            self.GPIO_DC_PIN.on()
+            self.spi_writebyte2(data)
 
     def DEV_SPI_write(self, data):
         self.DEV_SPI.DEV_SPI_SendData(data)
 
     def DEV_SPI_nwrite(self, data):
-        self.DEV_SPI.DEV_SPI_SendnData(data)
+        # DEV_SPI_SendnData stops after sizeof(pointer) bytes, send them one by one
+        for b in _byte_view(data):
+            self.DEV_SPI.DEV_SPI_SendData(b)
 
     def DEV_SPI_read(self):
         return self.DEV_SPI.DEV_SPI_ReadData()
 
-    def module_init(self, cleanup=False):
+    def module_init(self, cleanup=False, speed_hz=None):
         self.GPIO_PWR_PIN.on()
         
         if cleanup:
-            find_dirs = [
-                os.path.dirname(os.path.realpath(__file__)),
-                '/usr/local/lib',
-                '/usr/lib',
-            ]
-            self.DEV_SPI = None
-            for find_dir in find_dirs:
-                val = int(os.popen('getconf LONG_BIT').read())
-                logging.debug("System is %d bit"%val)
-                if val == 64:
-                    so_filename = os.path.join(find_dir, 'DEV_Config_64.so')
-                else:
-                    so_filename = os.path.join(find_dir, 'DEV_Config_32.so')
-                if os.path.exists(so_filename):
-                    self.DEV_SPI = CDLL(so_filename)
-                    break
-            if self.DEV_SPI is None:
-                RuntimeError('Cannot find DEV_Config.so')
-
+            self.DEV_SPI = _load_dev_config()
             self.DEV_SPI.DEV_Module_Init()
 
         else:
             # SPI device, bus = 0, device = 0
-            self.SPI.open(0, 0)
-            self.SPI.max_speed_hz = 4000000
+            self.SPI.open(self.SPI_BUS, self.SPI_DEVICE)
+            self.SPI.max_speed_hz = _spi_speed(self.spi_speed_hz, speed_hz)
             self.SPI.mode = 0b00
         return 0
 
@@ -157,24 +418,229 @@ class RaspberryPi:
         if cleanup:
             self.GPIO_RST_PIN.close()
             self.GPIO_DC_PIN.close()
-            # self.GPIO_CS_PIN.close()
             self.GPIO_PWR_PIN.close()
             self.GPIO_BUSY_PIN.close()
 
-        
 
+class _LgpioPin:
+    """lgpio line with the on/off/value/close interface of a gpiozero device"""
 
+    def __init__(self, lgpio, chip, pin):
+        self.pin = pin
+        self.on = functools.partial(lgpio.gpio_write, chip, pin, 1)
+        self.off = functools.partial(lgpio.gpio_write, chip, pin, 0)
+        self._read = functools.partial(lgpio.gpio_read, chip, pin)
+        self.close = functools.partial(lgpio.gpio_free, chip, pin)
 
-class JetsonNano:
-    # Pin definition
-    RST_PIN  = 17
-    DC_PIN   = 25
-    CS_PIN   = 8
-    BUSY_PIN = 24
-    PWR_PIN  = 18
+    @property
+    def value(self):
+        return self._read()
+
+
+class RaspberryPiLgpio(RaspberryPi):
+    """
+    RaspberryPi with its lines claimed straight from lgpio, without the
+    gpiozero device and pin factory layers: a pin write is a single
+    lgpio.gpio_write call. Picked with EPD_PLATFORM=raspberrypi_lgpio.
+    """
+
+    def __init__(self, *args, chip=0, **kwargs):
+        self.GPIO_CHIP = chip
+        super().__init__(*args, **kwargs)
+
+    def _open_gpio(self):
+        import lgpio
+
+        self.lgpio = lgpio
+        self.chip = lgpio.gpiochip_open(self.GPIO_CHIP)
+        for pin in (self.RST_PIN, self.DC_PIN, self.PWR_PIN):
+            lgpio.gpio_claim_output(self.chip, pin, 0)
+        lgpio.gpio_claim_alert(self.chip, self.BUSY_PIN, lgpio.BOTH_EDGES, lgpio.SET_PULL_DOWN)
+
+        self.GPIO_RST_PIN  = _LgpioPin(lgpio, self.chip, self.RST_PIN)
+        self.GPIO_DC_PIN   = _LgpioPin(lgpio, self.chip, self.DC_PIN)
+        self.GPIO_PWR_PIN  = _LgpioPin(lgpio, self.chip, self.PWR_PIN)
+        self.GPIO_BUSY_PIN = _LgpioPin(lgpio, self.chip, self.BUSY_PIN)
+
+        # Set from lgpio's callback thread on every BUSY edge
+        self.busy_edge = threading.Event()
+        self.busy_callback = lgpio.callback(self.chip, self.BUSY_PIN, lgpio.BOTH_EDGES,
+                                            lambda chip, gpio, level, tick: self.busy_edge.set())
+
+    def wait_busy(self, level, timeout_ms=BUSY_TIMEOUT_MS, poll=None, poll_ms=BUSY_POLL_MS):
+        read = lambda: self.GPIO_BUSY_PIN.value
+        if poll is not None:
+            return _report_busy(_poll_busy(read, level, timeout_ms, poll, poll_ms), level, timeout_ms)
+
+        def wait_edge(ms):
+            if self.busy_edge.wait(ms / 1000.0):
+                self.busy_edge.clear()
+
+        self.busy_edge.clear()
+        return _report_busy(_edge_busy(read, wait_edge, level, timeout_ms), level, timeout_ms)
+
+    def module_exit(self, cleanup=False):
+        super().module_exit(cleanup)
+
+        if cleanup:
+            self.busy_callback.cancel()
+            self.lgpio.gpiochip_close(self.chip)
+
+
+class _DevConfigGPIO:
+    """DEV_Digital_Write/Read under the RPi.GPIO names _GpioPin binds"""
+
+    def __init__(self, dev):
+        self.output = dev.DEV_Digital_Write
+        self.input = dev.DEV_Digital_Read
+
+
+class RaspberryPiDevConfig:
+    """
+    Raspberry Pi through Waveshare's DEV_Config library, GPIO and hardware
+    SPI both in native code over liblgpio: a frame goes out in one ctypes
+    call per bufsiz slice. The pins, bus 0 device 0 and the SPI clock are
+    built into the library. Picked with EPD_PLATFORM=raspberrypi_devconfig.
+    """
 
     def __init__(self):
+        self.RST_PIN  = RST_PIN
+        self.DC_PIN   = DC_PIN
+        self.CS_PIN   = CS_PIN
+        self.BUSY_PIN = BUSY_PIN
+        self.PWR_PIN  = PWR_PIN
+
+        self.DEV = _load_dev_config()
+        self.DEV.DEV_Module_Init.restype = c_ubyte
+        self.DEV.DEV_Digital_Write.argtypes = [c_uint16, c_ubyte]
+        self.DEV.DEV_Digital_Write.restype = None
+        self.DEV.DEV_Digital_Read.argtypes = [c_uint16]
+        self.DEV.DEV_Digital_Read.restype = c_ubyte
+        self.DEV.DEV_SPI_WriteByte.argtypes = [c_ubyte]
+        self.DEV.DEV_SPI_WriteByte.restype = None
+        self.DEV.DEV_SPI_Write_nByte.argtypes = [POINTER(c_ubyte), c_uint32]
+        self.DEV.DEV_SPI_Write_nByte.restype = None
+        self.DEV.DEV_SPI_SendData.argtypes = [c_ubyte]
+        self.DEV.DEV_SPI_SendData.restype = None
+        self.DEV.DEV_SPI_ReadData.restype = c_ubyte
+        # Set once DEV_Module_Init has opened the chip and the SPI device.
+        # DEV_Module_Exit closes neither, so they stay open until exit.
+        self.dev_open = False
+
+        # CS is claimed as a GPIO by DEV_Module_Init, the drivers drive it
+        gpio = _DevConfigGPIO(self.DEV)
+        self.GPIO_RST_PIN  = _GpioPin(gpio, self.RST_PIN)
+        self.GPIO_DC_PIN   = _GpioPin(gpio, self.DC_PIN)
+        self.GPIO_CS_PIN   = _GpioPin(gpio, self.CS_PIN)
+        self.GPIO_PWR_PIN  = _GpioPin(gpio, self.PWR_PIN)
+        self.GPIO_BUSY_PIN = _GpioPin(gpio, self.BUSY_PIN)
+        self._spi_byte = self.DEV.DEV_SPI_WriteByte
+
+        self.SPI_BUFSIZ  = _spi_bufsiz()
+        self.spi_bytes   = 0
+        self.spi_seconds = 0.0
+
+    def digital_write(self, pin, value):
+        self.DEV.DEV_Digital_Write(pin, value)
+
+    def digital_read(self, pin):
+        return self.DEV.DEV_Digital_Read(pin)
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def wait_busy(self, level, timeout_ms=BUSY_TIMEOUT_MS, poll=None, poll_ms=BUSY_POLL_MS):
+        # The library has no edge events, BUSY is always polled
+        released = _poll_busy(lambda: self.GPIO_BUSY_PIN.value, level, timeout_ms, poll, poll_ms)
+        return _report_busy(released, level, timeout_ms)
+
+    def spi_writebyte(self, data):
+        for b in _byte_view(data):
+            self._spi_byte(b)
+
+    def _spi_write_n(self, view):
+        self.DEV.DEV_SPI_Write_nByte(_ctypes_buffer(view), len(view))
+
+    def spi_writebyte2(self, data):
+        # lgSpiWrite goes through spidev too, which rejects more than bufsiz
+        _spi_upload(self, self._spi_write_n, data, self.SPI_BUFSIZ)
+
+    def spi_stats(self):
+        return _spi_stats(self)
+
+    # Driver writes, DC and CS go through their handles
+    def send_command(self, command):
+        self.GPIO_DC_PIN.off()
+        self.GPIO_CS_PIN.off()
+        self._spi_byte(command)
+        self.GPIO_CS_PIN.on()
+
+    def send_data(self, data):
+        self.GPIO_DC_PIN.on()
+        self.GPIO_CS_PIN.off()
+        self._spi_byte(data)
+        self.GPIO_CS_PIN.on()
+
+    def send_data2(self, data):
+        self.GPIO_DC_PIN.on()
+        self.GPIO_CS_PIN.off()
+        self.spi_writebyte2(data)
+        self.GPIO_CS_PIN.on()
+
+    def send(self, command, *data):
+        # One transaction: command byte with DC low, then all parameters with DC high.
+        self.GPIO_DC_PIN.off()
+        self.GPIO_CS_PIN.off()
+        self._spi_byte(command)
+        if data:
+            self.GPIO_DC_PIN.on()
+            self.spi_writebyte2(data)
+        self.GPIO_CS_PIN.on()
+
+    # 3-wire bit-banged transfers of the drivers that read the panel back
+    def DEV_SPI_write(self, data):
+        self.DEV.DEV_SPI_SendData(data)
+
+    def DEV_SPI_nwrite(self, data):
+        # DEV_SPI_SendnData stops after sizeof(pointer) bytes, send them one by one
+        for b in _byte_view(data):
+            self.DEV.DEV_SPI_SendData(b)
+
+    def DEV_SPI_read(self):
+        return self.DEV.DEV_SPI_ReadData()
+
+    def module_init(self, cleanup=False, speed_hz=None):
+        # speed_hz is ignored, the clock is fixed when the library is built
+        if not self.dev_open:
+            if self.DEV.DEV_Module_Init() != 0:
+                raise RuntimeError('DEV_Module_Init failed')
+            self.dev_open = True
+        self.GPIO_PWR_PIN.on()
+        return 0
+
+    def module_exit(self, cleanup=False):
+        self.GPIO_RST_PIN.off()
+        self.GPIO_DC_PIN.off()
+        self.GPIO_PWR_PIN.off()
+        logger.debug("close 5V, Module enters 0 power consumption ...")
+
+        if cleanup and self.dev_open:
+            self.DEV.DEV_Module_Exit()
+
+
+class JetsonNano:
+
+    def __init__(self, rst_pin=RST_PIN, dc_pin=DC_PIN, cs_pin=CS_PIN, busy_pin=BUSY_PIN, pwr_pin=PWR_PIN):
         import ctypes
+
+        # MOSI and SCLK are fixed by sysfs_software_spi, panels share them
+        # and are told apart by CS
+        self.RST_PIN  = rst_pin
+        self.DC_PIN   = dc_pin
+        self.CS_PIN   = cs_pin
+        self.BUSY_PIN = busy_pin
+        self.PWR_PIN  = pwr_pin
+
         find_dirs = [
             os.path.dirname(os.path.realpath(__file__)),
             '/usr/local/lib',
@@ -184,31 +650,89 @@ class JetsonNano:
         for find_dir in find_dirs:
             so_filename = os.path.join(find_dir, 'sysfs_software_spi.so')
             if os.path.exists(so_filename):
-                self.SPI = ctypes.cdll.LoadLibrary(so_filename)
+                # Global, so sysfs_software_spi_bulk.so binds to this copy
+                self.SPI = ctypes.CDLL(so_filename, mode=ctypes.RTLD_GLOBAL)
                 break
         if self.SPI is None:
             raise RuntimeError('Cannot find sysfs_software_spi.so')
 
+        # Optional, built from sysfs_software_spi_bulk.c
+        self.SPI_BULK = None
+        for find_dir in find_dirs:
+            so_filename = os.path.join(find_dir, 'sysfs_software_spi_bulk.so')
+            if os.path.exists(so_filename):
+                self.SPI_BULK = ctypes.CDLL(so_filename).SYSFS_software_spi_transfer_n
+                self.SPI_BULK.argtypes = [ctypes.POINTER(ctypes.c_ubyte), ctypes.c_uint32]
+                self.SPI_BULK.restype = None
+                break
+        if self.SPI_BULK is None:
+            logger.debug("sysfs_software_spi_bulk.so not found, data is sent with one call per byte")
+
         import Jetson.GPIO
         self.GPIO = Jetson.GPIO
+        self.GPIO_DC_PIN = _GpioPin(self.GPIO, self.DC_PIN)
+        self.GPIO_CS_PIN = _GpioPin(self.GPIO, self.CS_PIN)
+
+        self.spi_bytes   = 0
+        self.spi_seconds = 0.0
 
     def digital_write(self, pin, value):
         self.GPIO.output(pin, value)
 
     def digital_read(self, pin):
-        return self.GPIO.input(self.BUSY_PIN)
+        return self.GPIO.input(pin)
 
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy(self, level, timeout_ms=BUSY_TIMEOUT_MS, poll=None, poll_ms=BUSY_POLL_MS):
+        return _gpio_wait_busy(self.GPIO, self.BUSY_PIN, level, timeout_ms, poll, poll_ms)
+
     def spi_writebyte(self, data):
         self.SPI.SYSFS_software_spi_transfer(data[0])
 
     def spi_writebyte2(self, data):
-        for i in range(len(data)):
-            self.SPI.SYSFS_software_spi_transfer(data[i])
+        if self.SPI_BULK is None:
+            _spi_upload(self, self.SPI.SYSFS_software_spi_transfer, data)
+        else:
+            # The whole buffer in one native call
+            _spi_upload(self, self._spi_transfer_n, data, 0)
 
-    def module_init(self):
+    def _spi_transfer_n(self, view):
+        self.SPI_BULK(_ctypes_buffer(view), len(view))
+
+    def spi_stats(self):
+        return _spi_stats(self)
+
+    def send_command(self, command):
+        self.GPIO_DC_PIN.off()
+        self.GPIO_CS_PIN.off()
+        self.SPI.SYSFS_software_spi_transfer(command)
+        self.GPIO_CS_PIN.on()
+
+    def send_data(self, data):
+        self.GPIO_DC_PIN.on()
+        self.GPIO_CS_PIN.off()
+        self.SPI.SYSFS_software_spi_transfer(data)
+        self.GPIO_CS_PIN.on()
+
+    def send_data2(self, data):
+        self.GPIO_DC_PIN.on()
+        self.GPIO_CS_PIN.off()
+        self.spi_writebyte2(data)
+        self.GPIO_CS_PIN.on()
+
+    def send(self, command, *data):
+        self.GPIO_DC_PIN.off()
+        self.GPIO_CS_PIN.off()
+        self.SPI.SYSFS_software_spi_transfer(command)
+        if data:
+            self.GPIO_DC_PIN.on()
+            self.spi_writebyte2(data)
+        self.GPIO_CS_PIN.on()
+
+    def module_init(self, speed_hz=None):
+        # Bit-banged SPI, speed_hz does not apply
         self.GPIO.setmode(self.GPIO.BCM)
         self.GPIO.setwarnings(False)
         self.GPIO.setup(self.RST_PIN, self.GPIO.OUT)
@@ -235,20 +759,30 @@ class JetsonNano:
 
 
 class SunriseX3:
-    # Pin definition
-    RST_PIN  = 17
-    DC_PIN   = 25
-    CS_PIN   = 8
-    BUSY_PIN = 24
-    PWR_PIN  = 18
     Flag     = 0
 
-    def __init__(self):
+    def __init__(self, rst_pin=RST_PIN, dc_pin=DC_PIN, cs_pin=CS_PIN, busy_pin=BUSY_PIN, pwr_pin=PWR_PIN,
+                 spi_bus=2, spi_device=0):
         import spidev
         import Hobot.GPIO
 
+        self.RST_PIN  = rst_pin
+        self.DC_PIN   = dc_pin
+        self.CS_PIN   = cs_pin
+        self.BUSY_PIN = busy_pin
+        self.PWR_PIN  = pwr_pin
+        self.SPI_BUS  = spi_bus
+        self.SPI_DEVICE = spi_device
+
         self.GPIO = Hobot.GPIO
         self.SPI = spidev.SpiDev()
+        self.GPIO_DC_PIN = _GpioPin(self.GPIO, self.DC_PIN)
+        self.GPIO_CS_PIN = _GpioPin(self.GPIO, self.CS_PIN)
+
+        self.SPI_BUFSIZ  = _spi_bufsiz()
+        self.spi_bytes   = 0
+        self.spi_seconds = 0.0
+        self.spi_speed_hz = None
 
     def digital_write(self, pin, value):
         self.GPIO.output(pin, value)
@@ -259,15 +793,54 @@ class SunriseX3:
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
+    def wait_busy(self, level, timeout_ms=BUSY_TIMEOUT_MS, poll=None, poll_ms=BUSY_POLL_MS):
+        return _gpio_wait_busy(self.GPIO, self.BUSY_PIN, level, timeout_ms, poll, poll_ms)
+
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
     def spi_writebyte2(self, data):
-        # for i in range(len(data)):
-        #     self.SPI.writebytes([data[i]])
-        self.SPI.xfer3(data)
+        # writebytes2 takes the buffer as-is, xfer3 copied it into a list
+        # and read the same amount back
+        _spi_upload(self, self.SPI.writebytes2, data, self.SPI_BUFSIZ)
+
+    def spi_stats(self):
+        return _spi_stats(self)
 
-    def module_init(self):
+    def set_spi_speed(self, speed_hz):
+        self.spi_speed_hz = speed_hz
+
+    def spi_calibrate(self, speeds=SPI_CALIBRATE_HZ, check=_spi_loopback, rounds=3):
+        return _spi_calibrate(self, speeds, check, rounds)
+
+    def send_command(self, command):
+        self.GPIO_DC_PIN.off()
+        self.GPIO_CS_PIN.off()
+        self.SPI.writebytes([command])
+        self.GPIO_CS_PIN.on()
+
+    def send_data(self, data):
+        self.GPIO_DC_PIN.on()
+        self.GPIO_CS_PIN.off()
+        self.SPI.writebytes([data])
+        self.GPIO_CS_PIN.on()
+
+    def send_data2(self, data):
+        self.GPIO_DC_PIN.on()
+        self.GPIO_CS_PIN.off()
+        self.spi_writebyte2(data)
+        self.GPIO_CS_PIN.on()
+
+    def send(self, command, *data):
+        self.GPIO_DC_PIN.off()
+        self.GPIO_CS_PIN.off()
+        self.SPI.writebytes([command])
+        if data:
+            self.GPIO_DC_PIN.on()
+            self.spi_writebyte2(data)
+        self.GPIO_CS_PIN.on()
+
+    def module_init(self, speed_hz=None):
         if self.Flag == 0:
             self.Flag = 1
             self.GPIO.setmode(self.GPIO.BCM)
@@ -281,8 +854,8 @@ class SunriseX3:
             self.GPIO.output(self.PWR_PIN, 1)
         
             # SPI device, bus = 0, device = 0
-            self.SPI.open(2, 0)
-            self.SPI.max_speed_hz = 4000000
+            self.SPI.open(self.SPI_BUS, self.SPI_DEVICE)
+            self.SPI.max_speed_hz = _spi_speed(self.spi_speed_hz, speed_hz)
             self.SPI.mode = 0b00
             return 0
         else:
@@ -301,22 +874,78 @@ class SunriseX3:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
 
 
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
-
-if "Raspberry" in output:
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
-else:
-    implementation = JetsonNano()
-
-for func in [x for x in dir(implementation) if not x.startswith('_')]:
-    setattr(sys.modules[__name__], func, getattr(implementation, func))
+PLATFORMS = {
+    'raspberrypi': RaspberryPi,
+    'raspberrypi_lgpio': RaspberryPiLgpio,
+    'raspberrypi_devconfig': RaspberryPiDevConfig,
+    'jetsonnano':  JetsonNano,
+    'sunrisex3':   SunriseX3,
+}
+
+implementation = None
+_implementation_lock = threading.Lock()
+
+
+def detect_platform():
+    """
+    Name of the backend for this board, EPD_PLATFORM if set. Reads the
+    device tree model, then cpuinfo, instead of spawning a shell.
+    """
+    if EPD_PLATFORM:
+        if EPD_PLATFORM not in PLATFORMS:
+            raise RuntimeError('Unknown EPD_PLATFORM %s, expected one of %s' % (EPD_PLATFORM, ', '.join(PLATFORMS)))
+        return EPD_PLATFORM
+
+    for path in ('/proc/device-tree/model', '/proc/cpuinfo'):
+        try:
+            with open(path, 'rb') as f:
+                if b'Raspberry' in f.read():
+                    return 'raspberrypi'
+        except OSError:
+            pass
+
+    if os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
+        return 'sunrisex3'
+    return 'jetsonnano'
+
+
+def create_backend(platform=None, **kwargs):
+    """
+    A backend of its own, for driving one more panel: pass it to the
+    driver, EPD(backend). kwargs are the backend's pins (rst_pin, dc_pin,
+    cs_pin, busy_pin, pwr_pin) and, with spidev, spi_bus and spi_device.
+    """
+    platform = platform or detect_platform()
+    logger.debug("e-Paper platform %s %s" % (platform, kwargs))
+    return PLATFORMS[platform](**kwargs)
+
+
+def get_implementation():
+    """
+    The default backend, used by drivers created without one, built on
+    first use. Its public methods and attributes are then copied onto this
+    module so later calls skip __getattr__.
+    """
+    global implementation
+
+    with _implementation_lock:
+        if implementation is None:
+            backend = create_backend()
+
+            for func in [x for x in dir(backend) if not x.startswith('_')]:
+                setattr(sys.modules[__name__], func, getattr(backend, func))
+            implementation = backend
+
+    return implementation
+
+
+def __getattr__(name):
+    # Only reached for names the backend has not been copied over yet
+    if name.startswith('_'):
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    try:
+        return getattr(get_implementation(), name)
+    except AttributeError:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name)) from None
 
 ### END OF FILE ###
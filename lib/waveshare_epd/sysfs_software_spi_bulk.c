@@ -0,0 +1,51 @@
+/*****************************************************************************
+* | File        :   sysfs_software_spi_bulk.c
+* | Function    :   Bulk transfer on top of sysfs_software_spi.so
+* | Info        :
+*   epdconfig.JetsonNano streams a whole buffer with one ctypes call
+*   to SYSFS_software_spi_transfer_n instead of one call per byte.
+*   Build it on the Jetson, next to sysfs_software_spi.so:
+*
+*   gcc -O2 -shared -fPIC -o sysfs_software_spi_bulk.so sysfs_software_spi_bulk.c \
+*       -L. -l:sysfs_software_spi.so -Wl,-rpath,'$ORIGIN'
+*----------------
+* | This version:   V1.0
+* | Info        :
+******************************************************************************
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documnetation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to  whom the Software is
+# furished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS OR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+******************************************************************************/
+#include <stdint.h>
+
+/* From sysfs_software_spi.so */
+uint8_t SYSFS_software_spi_transfer(uint8_t value);
+
+/******************************************************************************
+function:   Send len bytes from data, MSB first like SYSFS_software_spi_transfer
+parameter:
+    data : buffer to send
+    len  : number of bytes
+******************************************************************************/
+void SYSFS_software_spi_transfer_n(const uint8_t *data, uint32_t len)
+{
+    uint32_t i;
+    for(i = 0; i < len; i++) {
+        SYSFS_software_spi_transfer(data[i]);
+    }
+}
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+
+import argparse
+import glob
+import importlib
+import os
+import sys
+import time
+
+from PIL import Image
+
+
+DIR_ROOT: str = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DIR_IMG: str = os.path.join(DIR_ROOT, "img")
+sys.path.append(os.path.join(DIR_ROOT, "lib"))
+
+from waveshare_epd import epdbuffer
+
+
+def getbuffer_loop(epd, image: Image.Image) -> list[int]:
+	"""Previous getbuffer, palette rebuilt per call and nibbles packed in Python"""
+	pal_image = Image.new("P", (1, 1))
+	pal_image.putpalette(epd.pal_image.getpalette())
+
+	image_color = epdbuffer.quantize(image, epd.width, epd.height, pal_image)
+	buf_color = bytearray(image_color.tobytes("raw"))
+
+	buf = [0x00] * int(epd.width * epd.height / 2)
+	idx = 0
+	for i in range(0, len(buf_color), 2):
+		buf[idx] = (buf_color[i] << 4) + buf_color[i + 1]
+		idx += 1
+
+	return buf
+
+
+# Colour to palette index of the previous epd4in01f getbuffer, anything else was black
+EXACT_COLORS: dict[tuple[int, int, int], int] = {
+	(0, 0, 0): 0,
+	(255, 255, 255): 1,
+	(0, 255, 0): 2,
+	(0, 0, 255): 3,
+	(255, 0, 0): 4,
+	(255, 255, 0): 5,
+	(255, 128, 0): 6,
+}
+
+
+def getbuffer_exact(epd, image: Image.Image) -> list[int]:
+	"""Previous epd4in01f getbuffer, exact palette colours only and no quantize"""
+	buf = [0x00] * int(epd.width * epd.height / 2)
+	image_rgb = image.convert("RGB")
+	imwidth, imheight = image_rgb.size
+	pixels = image_rgb.load()
+
+	for y in range(imheight):
+		for x in range(imwidth):
+			if imwidth == epd.width and imheight == epd.height:
+				newx, newy = x, y
+			elif imwidth == epd.height and imheight == epd.width:
+				newx, newy = y, epd.height - x - 1
+			else:
+				return buf
+
+			color: int = EXACT_COLORS.get(pixels[x, y], 0)
+			add: int = (newx + newy * epd.width) // 2
+			shift: int = (newx % 2) * 4
+			buf[add] = buf[add] & ~(0xF0 >> shift) | ((color << 4) >> shift)
+
+	return buf
+
+
+# Models whose previous getbuffer was not the quantize and pack loop
+LOOPS = {
+	"epd4in01f": getbuffer_exact,
+}
+
+
+def measure(func, image: Image.Image, rounds: int) -> float:
+	start: float = time.perf_counter()
+	for _ in range(rounds):
+		func(image)
+	return (time.perf_counter() - start) / rounds
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Compare the packed and the per-pixel 4bpp getbuffer on the img/ samples")
+	parser.add_argument("--model", default="epd7in3e", help="4bpp driver module, e.g. epd7in3f, epd5in65f, epd4in01f")
+	parser.add_argument("--rounds", type=int, default=3)
+	args = parser.parse_args()
+
+	epd = importlib.import_module(f"waveshare_epd.{args.model}").EPD()
+	loop_getbuffer = LOOPS.get(args.model, getbuffer_loop)
+	sizes: set[tuple[int, int]] = {(epd.width, epd.height), (epd.height, epd.width)}
+
+	total_loop: float = 0
+	total_packed: float = 0
+	for path in sorted(glob.glob(os.path.join(DIR_IMG, "*.bmp"))):
+		image = Image.open(path)
+		if image.size not in sizes:
+			continue
+
+		image.load()
+		# epd4in01f only matches on images made of the palette colours
+		if bytes(loop_getbuffer(epd, image)) != bytes(epd.getbuffer(image)):
+			print(f"{os.path.basename(path)}: buffers differ")
+
+		loop: float = measure(lambda i: loop_getbuffer(epd, i), image, args.rounds)
+		packed: float = measure(epd.getbuffer, image, args.rounds)
+		total_loop += loop
+		total_packed += packed
+		print(f"{os.path.basename(path):24} loop {loop * 1000:8.1f} ms  packed {packed * 1000:8.1f} ms  x{loop / packed:.1f}")
+
+	if total_packed:
+		print(f"{args.model} total loop {total_loop * 1000:.1f} ms  packed {total_packed * 1000:.1f} ms  x{total_loop / total_packed:.1f}")
+	else:
+		print(f"No {epd.width}x{epd.height} samples in {DIR_IMG}")
+
+
+if __name__ == "__main__":
+	main()
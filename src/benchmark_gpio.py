@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+import argparse
+import os
+import sys
+import time
+
+
+DIR_ROOT: str = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(DIR_ROOT, "lib"))
+
+from waveshare_epd import epdconfig
+
+
+def measure(func, toggles: int) -> float:
+	"""Seconds per call of func, called toggles times"""
+	start: float = time.perf_counter()
+	for _ in range(toggles):
+		func()
+	return (time.perf_counter() - start) / toggles
+
+
+def bench(platform: str, toggles: int) -> dict[str, float]:
+	# Only the GPIO lines are claimed, SPI stays closed and the panel sees no data
+	backend = epdconfig.create_backend(platform)
+	dc: int = backend.DC_PIN
+	handle = backend.GPIO_DC_PIN
+
+	try:
+		return {
+			"digital_write": measure(lambda: (backend.digital_write(dc, 1), backend.digital_write(dc, 0)), toggles) / 2,
+			"handle": measure(lambda: (handle.on(), handle.off()), toggles) / 2,
+			"digital_read": measure(lambda: backend.digital_read(backend.BUSY_PIN), toggles),
+		}
+	finally:
+		backend.module_exit(cleanup=True)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Per-toggle cost of the DC line with the gpiozero and the lgpio Raspberry Pi backends")
+	parser.add_argument("--toggles", type=int, default=100000)
+	args = parser.parse_args()
+
+	results: dict[str, dict[str, float]] = {}
+	for platform in ("raspberrypi", "raspberrypi_lgpio"):
+		results[platform] = bench(platform, args.toggles)
+		timings: str = "  ".join(f"{name} {seconds * 1e6:6.2f} us" for name, seconds in results[platform].items())
+		print(f"{platform:18} {timings}")
+
+	gpiozero: dict[str, float] = results["raspberrypi"]
+	lgpio: dict[str, float] = results["raspberrypi_lgpio"]
+	print(f"lgpio speed-up  digital_write x{gpiozero['digital_write'] / lgpio['digital_write']:.1f}  handle x{gpiozero['handle'] / lgpio['handle']:.1f}")
+
+
+if __name__ == "__main__":
+	main()
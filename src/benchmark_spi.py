@@ -0,0 +1,59 @@
+#!/usr/bin/python
+
+import argparse
+import os
+import sys
+import time
+
+
+DIR_ROOT: str = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(DIR_ROOT, "lib"))
+
+from waveshare_epd import epdconfig
+
+
+def measure(func, rounds: int) -> float:
+	"""Seconds per call of func, called rounds times"""
+	start: float = time.perf_counter()
+	for _ in range(rounds):
+		func()
+	return (time.perf_counter() - start) / rounds
+
+
+def bench(platform: str, frame: bytearray, rounds: int, speed_hz: int) -> dict[str, float]:
+	backend = epdconfig.create_backend(platform)
+	# DEV_Config ignores speed_hz, its clock is built in
+	backend.module_init(speed_hz=speed_hz)
+	# The controller is held in reset, it ignores the bytes on the bus
+	backend.digital_write(backend.RST_PIN, 0)
+
+	try:
+		return {
+			"send_data2": measure(lambda: backend.send_data2(frame), rounds),
+			"send_data": measure(lambda: backend.send_data(0xFF), rounds * 100),
+		}
+	finally:
+		backend.module_exit(cleanup=True)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Frame upload and per-byte cost of the spidev and the DEV_Config Raspberry Pi backends")
+	parser.add_argument("--bytes", type=int, default=48000, help="Frame size, 48000 is a 800x480 1bpp plane")
+	parser.add_argument("--rounds", type=int, default=20)
+	parser.add_argument("--speed", type=int, default=10000000, help="spidev clock in Hz, 10 MHz is the one built into DEV_Config")
+	args = parser.parse_args()
+
+	frame = bytearray([0xFF]) * args.bytes
+	results: dict[str, dict[str, float]] = {}
+	for platform in ("raspberrypi_lgpio", "raspberrypi_devconfig"):
+		results[platform] = bench(platform, frame, args.rounds, args.speed)
+		upload: float = results[platform]["send_data2"]
+		print(f"{platform:22} send_data2 {upload * 1000:8.2f} ms {args.bytes / upload / 1e6:6.2f} MB/s  send_data {results[platform]['send_data'] * 1e6:6.2f} us")
+
+	spidev: dict[str, float] = results["raspberrypi_lgpio"]
+	native: dict[str, float] = results["raspberrypi_devconfig"]
+	print(f"DEV_Config speed-up  send_data2 x{spidev['send_data2'] / native['send_data2']:.2f}  send_data x{spidev['send_data'] / native['send_data']:.2f}")
+
+
+if __name__ == "__main__":
+	main()
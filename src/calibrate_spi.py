@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import display
+
+from consts import *
+
+
+# display puts lib/ on the path
+from waveshare_epd import epdconfig
+
+
+def parse_speeds(value: str) -> tuple[int, ...]:
+	return tuple(int(speed) for speed in value.split(","))
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(
+		description="Step the SPI clock up with a readback check, MOSI wired to MISO, and record the highest stable speed for the daemon. "
+		"Only the bus wiring is checked, never the panel: the recorded speed can lower the driver's clock, not raise it"
+	)
+	parser.add_argument("--speeds", type=parse_speeds, default=epdconfig.SPI_CALIBRATE_HZ, help="Comma separated Hz, e.g. 4000000,8000000")
+	parser.add_argument("--rounds", type=int, default=3, help="Checks that have to pass at each speed")
+	parser.add_argument("--dry-run", action="store_true", help="Print the result without recording it")
+	args = parser.parse_args()
+
+	if not hasattr(epdconfig, "spi_calibrate"):
+		print("This backend has no SPI clock to calibrate")
+		sys.exit(1)
+
+	epdconfig.module_init()
+	try:
+		speed: int | None = epdconfig.spi_calibrate(args.speeds, rounds=args.rounds)
+	finally:
+		epdconfig.module_exit()
+
+	if speed is None:
+		print(f"No stable speed in {args.speeds}, check the MOSI to MISO loopback")
+		sys.exit(1)
+
+	print(f"Highest stable SPI clock {speed} Hz")
+	if args.dry_run:
+		return
+
+	display.save_spi_speed(speed)
+	print(f"Recorded in {STATE_SPI_SPEED}, caps the driver's clock from the next init. EPD_SPI_SPEED_HZ in .env overrides it")
+
+
+if __name__ == "__main__":
+	main()
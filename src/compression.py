@@ -0,0 +1,140 @@
+import re
+import zlib
+
+from consts import *
+
+
+"""
+FRAME_CODEC_RLE4, run-length encoding of packed 4bpp buffers.
+
+Flat areas of the panel are runs of "solid" bytes, both nibbles holding
+the same colour code (e.g. 0x11 for white on the epd7in3e). Tokens:
+
+	0lllllll               literal, the next l + 1 bytes are copied as-is
+	1cccllll               run of l bytes of colour c (0x11 * c), l in 1..15
+	1ccc0000 + 3 bytes     run of colour c, length as big-endian u24
+"""
+RLE4_LITERAL_MAX: int = 0x80
+RLE4_SHORT_RUN_MAX: int = 0x0F
+RLE4_LONG_RUN_MAX: int = 0xFFFFFF
+RLE4_SOLID: list[bytes] = [bytes([c * 0x11]) for c in range(8)]
+RLE4_RUN_PATTERN: re.Pattern = re.compile(rb"([\x00\x11\x22\x33\x44\x55\x66\x77])\1{2,}")
+
+ZLIB_CHUNK_SIZE: int = 64 * 1024
+
+
+class CodecError(ValueError):
+	pass
+
+
+def compress(codec: int, buffer: bytes) -> bytes:
+	if codec == FRAME_CODEC_RAW:
+		return bytes(buffer)
+
+	if codec == FRAME_CODEC_ZLIB:
+		return zlib.compress(buffer, 9)
+
+	if codec == FRAME_CODEC_RLE4:
+		return _rle4_encode(buffer)
+
+	raise CodecError(f"Unknown codec. {codec=}")
+
+
+def decompress_into(codec: int, payload: bytes, out: bytearray) -> None:
+	"""Decode payload into the preallocated out, which it must fill exactly"""
+	if codec == FRAME_CODEC_RAW:
+		if len(payload) != len(out):
+			raise CodecError(f"Invalid payload size. {len(payload)=} {len(out)=}")
+		out[:] = payload
+
+	elif codec == FRAME_CODEC_ZLIB:
+		_zlib_decode(payload, out)
+
+	elif codec == FRAME_CODEC_RLE4:
+		_rle4_decode(payload, out)
+
+	else:
+		raise CodecError(f"Unknown codec. {codec=}")
+
+
+def _zlib_decode(payload: bytes, out: bytearray) -> None:
+	view = memoryview(out)
+	decompressor = zlib.decompressobj()
+	data: bytes = payload
+	pos: int = 0
+
+	try:
+		while data and pos < len(out):
+			chunk: bytes = decompressor.decompress(data, min(ZLIB_CHUNK_SIZE, len(out) - pos))
+			view[pos:pos + len(chunk)] = chunk
+			pos += len(chunk)
+			data = decompressor.unconsumed_tail
+	except zlib.error as error:
+		raise CodecError(f"Invalid zlib payload. {error=}")
+
+	if pos != len(out) or not decompressor.eof or decompressor.unconsumed_tail:
+		raise CodecError(f"Invalid zlib payload size. {pos=} {len(out)=}")
+
+
+def _rle4_encode(buffer: bytes) -> bytes:
+	out = bytearray()
+
+	def add_literal(start: int, end: int) -> None:
+		for i in range(start, end, RLE4_LITERAL_MAX):
+			chunk = buffer[i:min(end, i + RLE4_LITERAL_MAX)]
+			out.append(len(chunk) - 1)
+			out.extend(chunk)
+
+	pos: int = 0
+	for match in RLE4_RUN_PATTERN.finditer(buffer):
+		add_literal(pos, match.start())
+
+		colour: int = match.group(1)[0] & 0x0F
+		length: int = match.end() - match.start()
+		while length > 0:
+			n: int = min(length, RLE4_LONG_RUN_MAX)
+			if n <= RLE4_SHORT_RUN_MAX:
+				out.append(0x80 | colour << 4 | n)
+			else:
+				out.append(0x80 | colour << 4)
+				out.extend(n.to_bytes(3, "big"))
+			length -= n
+
+		pos = match.end()
+
+	add_literal(pos, len(buffer))
+
+	return bytes(out)
+
+
+def _rle4_decode(payload: bytes, out: bytearray) -> None:
+	view = memoryview(out)
+	pos: int = 0
+	i: int = 0
+
+	while i < len(payload):
+		token: int = payload[i]
+		i += 1
+
+		if token < RLE4_LITERAL_MAX:
+			n: int = token + 1
+			if i + n > len(payload) or pos + n > len(out):
+				raise CodecError(f"RLE4 literal out of bounds. {i=} {pos=}")
+			view[pos:pos + n] = payload[i:i + n]
+			i += n
+
+		else:
+			n: int = token & 0x0F
+			if n == 0:
+				if i + 3 > len(payload):
+					raise CodecError(f"Truncated RLE4 run. {i=}")
+				n = int.from_bytes(payload[i:i + 3], "big")
+				i += 3
+			if pos + n > len(out):
+				raise CodecError(f"RLE4 run out of bounds. {pos=} {n=}")
+			view[pos:pos + n] = RLE4_SOLID[(token >> 4) & 0x07] * n
+
+		pos += n
+
+	if pos != len(out):
+		raise CodecError(f"Invalid RLE4 payload size. {pos=} {len(out)=}")
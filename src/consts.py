@@ -8,21 +8,107 @@ R_CH_SUB: str = f"epdpi_{os.getenv('ID')}"
 
 R_MSG_CLEAR: str = "clear"
 R_MSG_DRAW: str = "draw"
+R_MSG_DRAW_REF: str = "draw_ref"
 R_MSG_BUSY: str = "busy"
+R_MSG_STATUS: str = "status"
+R_MSG_HEARTBEAT: str = "heartbeat"
 R_MSG_UPDATED: str = "updated"
 R_MSG_RESULT: str = "result"
+R_MSG_HELLO: str = "hello"
+R_MSG_FORCE: str = "force"
+
+# Durable ingest, see INGEST_STREAM. One consumer group per device so a
+# stream shared by a fleet still delivers every entry to every device
+R_STREAM: str = os.getenv("STREAM", f"epdpi:stream:{os.getenv('ID')}")
+R_STREAM_GROUP: str = f"epdpi_{os.getenv('ID')}"
+R_STREAM_FIELD: str = "data"
+R_STREAM_BLOCK_MS: int = 5 * 60 * 1000
+R_STREAM_CLAIM_IDLE_MS: int = 60 * 1000
+# Entries still failing after this many deliveries are moved to R_STREAM_DEAD
+R_STREAM_MAX_DELIVERIES: int = int(os.getenv("STREAM_MAX_DELIVERIES", "5"))
+R_STREAM_DEAD: str = f"{R_STREAM}:dead"
+R_STREAM_DEAD_MAXLEN: int = 100
+
+# Frames stored by content hash, see R_MSG_DRAW_REF
+R_KEY_FRAME: str = "epdpi:frame:"
+R_KEY_FRAME_TTL: int = 3600
+
+
+"""
+FRAME
+"""
+FRAME_MAGIC: bytes = b"EP"
+FRAME_VERSION: int = 2
+
+FRAME_CMD_CLEAR: int = 0x01
+FRAME_CMD_DRAW: int = 0x02
+FRAME_CMD_DRAW_DELTA: int = 0x03
+
+# Redraw even if the frame matches the one on the panel
+FRAME_FLAG_FORCE: int = 0x01
+
+FRAME_CODEC_RAW: int = 0x00
+FRAME_CODEC_ZLIB: int = 0x01
+FRAME_CODEC_RLE4: int = 0x02
+
+FRAME_CODECS: dict[str, int] = {
+	"raw": FRAME_CODEC_RAW,
+	"zlib": FRAME_CODEC_ZLIB,
+	"rle4": FRAME_CODEC_RLE4,
+}
+
+
+"""
+EPD
+"""
+EPD_MODEL: str = "epd7in3e"
+EPD_WIDTH: int = 800
+EPD_HEIGHT: int = 480
+EPD_BPP: int = 4
 
 
 """
 OTHER
 """
-EPD_BUSY: str = "epd_busy"
+# Seconds a command waits for the panel before RETURN_CODE_EPD_BUSY
+PANEL_ACQUIRE_TIMEOUT: float = float(os.getenv("PANEL_ACQUIRE_TIMEOUT", "1"))
+
+# Seconds the panel stays awake after a command before deep sleep,
+# 0 sleeps as soon as the result is published and no command is waiting
+PANEL_IDLE_TIMEOUT: float = float(os.getenv("PANEL_IDLE_TIMEOUT", "60"))
+
+INGEST_PUBSUB: str = "pubsub"
+INGEST_STREAM: str = "stream"
+INGEST: str = os.getenv("INGEST", INGEST_PUBSUB)
+
+QUEUE_POLICY_COALESCE: str = "coalesce"
+QUEUE_POLICY_DROP_OLDEST: str = "drop_oldest"
+QUEUE_POLICY_DROP_NEWEST: str = "drop_newest"
+QUEUE_POLICIES: tuple[str, ...] = (QUEUE_POLICY_COALESCE, QUEUE_POLICY_DROP_OLDEST, QUEUE_POLICY_DROP_NEWEST)
+
+# Commands waiting for the display worker, see DrawQueue
+QUEUE_SIZE: int = int(os.getenv("QUEUE_SIZE", "1"))
+QUEUE_POLICY: str = os.getenv("QUEUE_POLICY", QUEUE_POLICY_COALESCE)
+
+HEARTBEAT_INTERVAL: int = int(os.getenv("HEARTBEAT_INTERVAL", "60"))
+
+STATE_DIR: str = os.getenv("STATE_DIR", os.path.join(os.path.expanduser("~"), ".local", "state", "epdpi"))
+STATE_DISPLAYED_DIGEST: str = os.path.join(STATE_DIR, "displayed.sha256")
+STATE_DISPLAYED_FRAME: str = os.path.join(STATE_DIR, "displayed.bin")
+# Highest stable SPI clock found by calibrate_spi.py, caps the driver's own,
+# EPD_SPI_SPEED_HZ wins over it
+STATE_SPI_SPEED: str = os.path.join(STATE_DIR, "spi_speed_hz")
 
 
 """
 RETURN CODE
 """
+RETURN_CODE_UNCHANGED = 1
 RETURN_CODE_SUCCESS = 0
 RETURN_CODE_INVALID_MACHINE = -1
 RETURN_CODE_EPD_BUSY = -2
 RETURN_CODE_EXCEPTION = -3
+RETURN_CODE_INVALID_FRAME = -4
+RETURN_CODE_FRAME_NOT_FOUND = -5
+RETURN_CODE_BASE_MISMATCH = -6
+RETURN_CODE_SUPERSEDED = -7
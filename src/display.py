@@ -1,8 +1,11 @@
+import hashlib
 import os
+import time
 
 from logging import Logger, getLogger
 import sys
 from consts import *
+from panel import PanelController, PanelState
 
 
 log: Logger = getLogger(__name__)
@@ -15,20 +18,203 @@ if os.path.exists(DIR_LIB):
 	sys.path.append(DIR_LIB)
 
 
-def draw(buffer:list[int]) -> tuple[int, str]:
-	log.info(f"draw {buffer=}")
-    
+panel: PanelController = PanelController()
+
+_epd = None
+_last_active: float = 0.0
+
+# Frame currently shown on the panel and its digest, None if unknown
+_displayed_digest: str | None = None
+_displayed_frame: bytes | None = None
+
+
+def _read_state(path: str) -> bytes | None:
 	try:
+		with open(path, "rb") as file:
+			return file.read() or None
+	except FileNotFoundError:
+		return None
+	except OSError as error:
+		log.warning(f"Unable to read {path=}. {error=}")
+		return None
+
+
+def _write_state(path: str, data: bytes | None) -> None:
+	try:
+		if data is None:
+			if os.path.exists(path):
+				os.remove(path)
+			return
+
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp: str = f"{path}.tmp"
+		with open(tmp, "wb") as file:
+			file.write(data)
+		os.replace(tmp, path)
+	except OSError as error:
+		log.warning(f"Unable to write {path=}. {error=}")
+
+
+def load_displayed() -> str | None:
+	global _displayed_digest, _displayed_frame
+
+	digest: bytes | None = _read_state(STATE_DISPLAYED_DIGEST)
+	_displayed_digest = digest.decode().strip() if digest else None
+	_displayed_frame = _read_state(STATE_DISPLAYED_FRAME)
+
+	# Only keep a cached frame that is known to be the one displayed
+	if _displayed_frame is not None and hashlib.sha256(_displayed_frame).hexdigest() != _displayed_digest:
+		log.warning(f"Displayed frame does not match digest, dropping it")
+		_displayed_frame = None
+
+	return _displayed_digest
+
+
+def get_displayed_digest() -> str | None:
+	return _displayed_digest
+
+
+def get_displayed_frame() -> bytes | None:
+	return _displayed_frame
+
+
+def set_displayed(buffer: bytes | None, digest: str | None = None) -> None:
+	global _displayed_digest, _displayed_frame
+
+	if buffer is None:
+		_displayed_digest = None
+		_displayed_frame = None
+	else:
+		_displayed_frame = bytes(buffer)
+		_displayed_digest = digest or hashlib.sha256(_displayed_frame).hexdigest()
+
+	_write_state(STATE_DISPLAYED_DIGEST, _displayed_digest.encode() if _displayed_digest else None)
+	_write_state(STATE_DISPLAYED_FRAME, _displayed_frame)
+
+
+def get_epd():
+	"""Driver instance kept for the lifetime of the daemon"""
+	global _epd
+
+	if _epd is None:
 		from waveshare_epd.epd7in3e import EPD
 
-		epd = EPD()
+		_epd = EPD()
+		load_spi_speed()
+
+	return _epd
+
+
+def load_spi_speed() -> int | None:
+	"""Apply the SPI clock recorded by calibrate_spi.py, from the next init on"""
+	data: bytes | None = _read_state(STATE_SPI_SPEED)
+	if data is None:
+		return None
+
+	try:
+		speed: int = int(data)
+	except ValueError:
+		log.warning(f"Invalid SPI speed in {STATE_SPI_SPEED=}. {data=}")
+		return None
+
+	from waveshare_epd import epdconfig
+
+	# hasattr builds the backend, which raises without the board's libraries
+	try:
+		settable: bool = hasattr(epdconfig, "set_spi_speed")
+	except Exception as error:
+		log.warning(f"No e-Paper backend, default SPI speed. {error=}")
+		return None
+
+	# Bit-banged backends have no clock to set
+	if not settable:
+		return None
+
+	epdconfig.set_spi_speed(speed)
+	log.info(f"SPI speed {speed=}")
+	return speed
+
+
+def save_spi_speed(speed: int | None) -> None:
+	_write_state(STATE_SPI_SPEED, str(speed).encode() if speed else None)
+
+
+def spi_stats() -> tuple[int, float, float]:
+	"""Bytes, seconds and bytes/s written to SPI since the previous call"""
+	from waveshare_epd import epdconfig
+
+	return epdconfig.spi_stats()
+
+
+def wake():
+	"""Init the panel, unless it is still awake from a previous command"""
+	global _last_active
+
+	_last_active = time.monotonic()
+	epd = get_epd()
+
+	if panel.needs_init:
 		epd.init()
+		panel.set_state(PanelState.INITIALISED)
+	else:
+		log.info(f"init skipped, panel is {panel.state.value}")
+
+	return epd
+
+
+def rest() -> None:
+	"""
+	Called after a refresh. The panel is put to sleep by the hardware owner
+	once idle for PANEL_IDLE_TIMEOUT, never here: the result is published
+	first and the deep sleep tail only runs if no command is waiting.
+	"""
+	global _last_active
+
+	_last_active = time.monotonic()
+
+
+def idle_timeout() -> float | None:
+	"""Seconds until the panel is due to sleep, None if it is not awake"""
+	if panel.needs_init:
+		return None
 
-		# Send to display
+	return max(0.0, _last_active + PANEL_IDLE_TIMEOUT - time.monotonic())
+
+
+def sleep_if_idle(force: bool = False) -> None:
+	if panel.needs_init or (not force and idle_timeout() > 0):
+		return
+
+	if not panel.acquire(PANEL_ACQUIRE_TIMEOUT if force else 0):
+		return
+
+	try:
+		log.info(f"sleep {force=}")
+		get_epd().sleep()
+		panel.set_state(PanelState.SLEEPING)
+	except Exception as error:
+		log.error(msg=f"Unable to sleep display. {error=}")
+		panel.set_state(PanelState.OFF)
+	finally:
+		panel.release()
+
+
+def draw(buffer: bytes) -> tuple[int, str]:
+	log.info(f"draw {len(buffer)=}")
+    
+	try:
+		epd = wake()
+
+		# Send to display, the packed buffer is handed to SPI as-is
+		panel.set_state(PanelState.REFRESHING)
+		spi_stats()
 		epd.display(buffer)
+		panel.set_state(PanelState.IDLE_AWAKE)
+
+		sent, seconds, rate = spi_stats()
+		log.info(f"draw upload {sent=} {seconds=:.3f} {rate=:.0f}")
 
-		# Sleep
-		epd.sleep()
+		rest()
 
 		log.info(f"draw finish")
 
@@ -36,6 +222,7 @@ def draw(buffer:list[int]) -> tuple[int, str]:
 
 	except Exception as error:
 		log.error(msg=f"Unable to draw buffer. {error=}")
+		panel.set_state(PanelState.OFF)
 		return RETURN_CODE_EXCEPTION, error
 
 
@@ -43,22 +230,20 @@ def clear() -> tuple[int, str]:
 	log.info(f"clear")
  
 	try:
-		from waveshare_epd.epd7in3e import EPD
-
-		# Init
-		epd = EPD()
-		epd.init()
+		epd = wake()
   
 		# Clear display
+		panel.set_state(PanelState.REFRESHING)
 		epd.clear()
+		panel.set_state(PanelState.IDLE_AWAKE)
   
-		# Sleep
-		epd.sleep()
+		rest()
   
 		log.info(f"clear finish")
   
 		return RETURN_CODE_SUCCESS, None
 
-	except IOError as error:
+	except Exception as error:
 		log.error(msg=f"Unable to clear display. {error=}")
+		panel.set_state(PanelState.OFF)
 		return RETURN_CODE_EXCEPTION, error
@@ -0,0 +1,97 @@
+import threading
+
+from collections import deque
+from consts import *
+from typing import Callable, Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+def replace(pending: T, item: T) -> T:
+	return item
+
+
+class DrawQueue(Generic[T]):
+	"""
+	Bounded queue of commands waiting for the display worker.
+
+	When a command arrives the policy decides what is dropped:
+	QUEUE_POLICY_COALESCE asks merge(pending, item) for every pending
+	command, which returns what replaces both or None to keep pending,
+	then drops the oldest ones left if still full.
+	With the default merge everything pending is dropped, so after a burst
+	the panel only refreshes once, with the latest frame.
+	QUEUE_POLICY_DROP_OLDEST drops the oldest pending command when full.
+	QUEUE_POLICY_DROP_NEWEST rejects the incoming command when full.
+	"""
+
+	def __init__(self, maxsize: int = 1, policy: str = QUEUE_POLICY_COALESCE, merge: Callable[[T, T], T | None] = replace) -> None:
+		if maxsize < 1:
+			raise ValueError(f"Invalid queue size. {maxsize=}")
+
+		if policy not in QUEUE_POLICIES:
+			raise ValueError(f"Invalid queue policy. {policy=}")
+
+		self.maxsize: int = maxsize
+		self.policy: str = policy
+		self.merge: Callable[[T, T], T | None] = merge
+		self.max_depth: int = 0
+		self.dropped: int = 0
+
+		self._condition = threading.Condition()
+		self._pending: deque[T] = deque()
+		self._closed: bool = False
+
+	@property
+	def closed(self) -> bool:
+		with self._condition:
+			return self._closed
+
+	def __len__(self) -> int:
+		with self._condition:
+			return len(self._pending)
+
+	def put(self, item: T) -> list[T]:
+		"""Queue item, returns the commands dropped for it, item itself if it was rejected"""
+		with self._condition:
+			dropped: list[T] = []
+
+			if self.policy == QUEUE_POLICY_COALESCE:
+				for pending in list(self._pending):
+					merged: T | None = self.merge(pending, item)
+					if merged is not None:
+						self._pending.remove(pending)
+						dropped.append(pending)
+						item = merged
+
+			# Commands that could not be merged still count against maxsize
+			if len(self._pending) >= self.maxsize:
+				if self.policy == QUEUE_POLICY_DROP_NEWEST:
+					self.dropped += 1
+					return [item]
+
+				while len(self._pending) >= self.maxsize:
+					dropped.append(self._pending.popleft())
+
+			self._pending.append(item)
+			self.dropped += len(dropped)
+			self.max_depth = max(self.max_depth, len(self._pending))
+			self._condition.notify()
+
+			return dropped
+
+	def get_nowait(self) -> T | None:
+		with self._condition:
+			return self._pending.popleft() if self._pending else None
+
+	def get(self, timeout: float | None = None) -> T | None:
+		"""Wait for the next command, None on timeout or once closed"""
+		with self._condition:
+			self._condition.wait_for(lambda: self._pending or self._closed, timeout)
+			return self._pending.popleft() if self._pending else None
+
+	def close(self) -> None:
+		with self._condition:
+			self._closed = True
+			self._condition.notify_all()
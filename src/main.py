@@ -9,11 +9,16 @@ if os.getenv("ID") is None:
 	logging.error("Missing var \"ID\" in .env")
 	exit(-1)
 	
+import atexit
 import redis
 import logging
+import threading
 import display
+import protocol
 
 from consts import *
+from dataclasses import dataclass
+from draw_queue import DrawQueue
 from logging import Logger, getLogger
 
 logging.basicConfig(level=logging.DEBUG)
@@ -37,90 +42,313 @@ def redis_publish(key: str, *args) -> None:
 	redis_client.publish(R_CH_PUB, msg)
 
 
-def set_epd_busy(busy: bool) -> None:
-	os.environ[EPD_BUSY] = "1" if busy else "0"
+def publish_result(command: str, result: int, *args) -> int:
+	redis_publish(R_MSG_RESULT, command, f"{result}", *args)
+	return result
 
 
-def get_epd_busy() -> bool:
-	return False if os.environ.get(EPD_BUSY, "0") == "0" else True
-
-
-def can_draw() -> bool:
+def can_draw(command: str) -> int:
+	"""
+	Acquire the panel, the caller releases it when RETURN_CODE_SUCCESS is returned.
+	Failures are published as results of command.
+	"""
 	if not is_machine_valid():
 		logging.warning("Invalid machine")
-		redis_publish(
-			R_MSG_RESULT,
-			R_MSG_CLEAR,
-			f"{RETURN_CODE_INVALID_MACHINE}",
-			"Invalid machine.",
-		)
-		return False
-
-	if get_epd_busy():
-		logging.warning("EPD is busy")
-		redis_publish(
-			R_MSG_RESULT,
-			R_MSG_CLEAR,
-			f"{RETURN_CODE_EPD_BUSY}",
-			"E-Paper display is busy.",
-		)
-		return False
+		return publish_result(command, RETURN_CODE_INVALID_MACHINE, "Invalid machine.")
+
+	if not display.panel.acquire(PANEL_ACQUIRE_TIMEOUT):
+		logging.warning(f"EPD is busy. {display.panel.state=}")
+		return publish_result(command, RETURN_CODE_EPD_BUSY, "E-Paper display is busy.")
 	
-	return True
+	return RETURN_CODE_SUCCESS
 
 
-def epd_clear() -> None:
+def epd_clear() -> int:
 	logging.info(f"epd_clear")
 
-	if not can_draw():
-		return
-
-	set_epd_busy(True)
+	result: int = can_draw(R_MSG_CLEAR)
+	if result != RETURN_CODE_SUCCESS:
+		return result
 
-	result, error = display.clear()
+	try:
+		result, error = display.clear()
 
-	set_epd_busy(False)
+		# Panel content is no longer a known frame
+		display.set_displayed(None)
+	finally:
+		display.panel.release()
 
 	if result == RETURN_CODE_SUCCESS:
-		redis_publish(R_MSG_RESULT, R_MSG_CLEAR, f"{RETURN_CODE_SUCCESS}")
+		return publish_result(R_MSG_CLEAR, RETURN_CODE_SUCCESS)
 	else:
-		redis_publish(R_MSG_RESULT, R_MSG_CLEAR, f"{RETURN_CODE_EXCEPTION}", f"{error}")
+		return publish_result(R_MSG_CLEAR, RETURN_CODE_EXCEPTION, f"{error}")
 
 
-def epd_draw(buffer:list[int]) -> None:
-	logging.info(f"epd_draw")
+def epd_draw(buffer: bytes, force: bool = False) -> int:
+	logging.info(f"epd_draw {force=}")
 
-	if not can_draw():
-		return
+	digest: str = protocol.digest(buffer)
+	if not force and digest == display.get_displayed_digest():
+		logging.info(f"Frame unchanged. {digest=}")
+		return publish_result(R_MSG_DRAW, RETURN_CODE_UNCHANGED, "Frame unchanged.")
 
-	set_epd_busy(True)
-	
-	result, error = display.draw(buffer)
+	result: int = can_draw(R_MSG_DRAW)
+	if result != RETURN_CODE_SUCCESS:
+		return result
 
-	set_epd_busy(False)
+	try:
+		result, error = display.draw(buffer)
+
+		if result == RETURN_CODE_SUCCESS:
+			display.set_displayed(buffer, digest)
+		else:
+			display.set_displayed(None)
+	finally:
+		display.panel.release()
 
 	if result == RETURN_CODE_SUCCESS:
-		redis_publish(R_MSG_RESULT, R_MSG_DRAW, f"{RETURN_CODE_SUCCESS}")
+		return publish_result(R_MSG_DRAW, RETURN_CODE_SUCCESS)
 	else:
-		redis_publish(R_MSG_RESULT, R_MSG_DRAW, f"{RETURN_CODE_EXCEPTION}", f"{error}")
+		return publish_result(R_MSG_DRAW, RETURN_CODE_EXCEPTION, f"{error}")
 
 
-def redis_event_handler(msg: dict[str, str]) -> None:
-	logging.info(f"Received redis {msg=}")
+def epd_draw_delta(frame: protocol.Frame, force: bool = False) -> int:
+	base_digest: str = protocol.delta_base(frame)
+	base: bytes | None = display.get_displayed_frame()
+	logging.info(f"epd_draw_delta {base_digest=}")
 
-	if msg["type"] != "message" or msg["channel"] != f"{R_CH_SUB}":
-		return
+	if base is None or base_digest != display.get_displayed_digest():
+		logging.warning(f"Delta base mismatch. {base_digest=} {display.get_displayed_digest()=}")
+		return publish_result(R_MSG_DRAW, RETURN_CODE_BASE_MISMATCH, "Base frame mismatch, send a full frame.")
+
+	try:
+		buffer: bytearray = protocol.apply_delta(base, frame)
+	except protocol.FrameError as error:
+		return publish_result(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"{error}")
+
+	return epd_draw(buffer, force)
+
+
+@dataclass(frozen=True)
+class Command:
+	"""A decoded panel command, ready for the display worker"""
+	name: str
+	buffer: bytes | None = None
+	delta: protocol.Frame | None = None
+	force: bool = False
+
+
+class CommandError(Exception):
+	def __init__(self, name: str, result: int, msg: str) -> None:
+		super().__init__(msg)
+		self.name = name
+		self.result = result
+		self.msg = msg
+
+
+def coalesce(pending: Command, command: Command) -> Command | None:
+	"""What replaces a pending command and a newer one in the queue, None to keep both"""
+	if pending.name != command.name:
+		return None
+
+	# A clear over a clear, a full frame over any draw
+	if command.delta is None:
+		return command
+
+	# A delta only replaces the full frame it was made against, applied to it
+	if pending.buffer is None or protocol.digest(pending.buffer) != protocol.delta_base(command.delta):
+		return None
+
+	try:
+		buffer: bytearray = protocol.apply_delta(pending.buffer, command.delta)
+	except protocol.FrameError:
+		return None
+
+	return Command(R_MSG_DRAW, buffer=bytes(buffer), force=command.force)
+
+
+draw_queue: DrawQueue[Command] = DrawQueue(QUEUE_SIZE, QUEUE_POLICY, coalesce)
+
+
+def decode_frame(data: bytes, force: bool = False) -> Command:
+	try:
+		frame: protocol.Frame = protocol.decode(data)
+	except protocol.FrameError as error:
+		logging.warning(f"Invalid frame. {error=}")
+		raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"{error}")
+
+	logging.info(f"decode_frame {frame.command=} {frame.codec=} {frame.model=} {frame.width=} {frame.height=} {frame.bpp=}")
+
+	if not protocol.is_supported(frame):
+		raise CommandError(
+			R_MSG_DRAW,
+			RETURN_CODE_INVALID_FRAME,
+			f"Frame does not match {EPD_MODEL} {EPD_WIDTH}x{EPD_HEIGHT} {EPD_BPP}bpp.",
+		)
+
+	force = force or bool(frame.flags & FRAME_FLAG_FORCE)
+
+	if frame.command == FRAME_CMD_CLEAR:
+		return Command(R_MSG_CLEAR)
+
+	elif frame.command == FRAME_CMD_DRAW:
+		try:
+			buffer: bytes = protocol.unpack(frame)
+		except protocol.FrameError as error:
+			logging.warning(f"Invalid frame payload. {error=}")
+			raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"{error}")
 
-	data: list[str] = msg["data"].split("^")
+		return Command(R_MSG_DRAW, buffer=buffer, force=force)
+
+	elif frame.command == FRAME_CMD_DRAW_DELTA:
+		# Applied by the worker, against whatever is displayed by then
+		return Command(R_MSG_DRAW, delta=frame, force=force)
+
+	raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"Unknown command {frame.command}.")
+
+
+def decode_frame_ref(value: str, force: bool = False) -> Command:
+	"""Fetch a frame stored under its content hash and decode it like an inline frame"""
+	logging.info(f"decode_frame_ref {value=}")
+
+	if not protocol.is_digest(value):
+		raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"Invalid frame hash {value}.")
+
+	data: bytes | None = redis_client.get(protocol.frame_key(value))
+	if data is None:
+		logging.warning(f"Frame not found. {value=}")
+		raise CommandError(R_MSG_DRAW, RETURN_CODE_FRAME_NOT_FOUND, f"Frame {value} not found.")
+
+	if protocol.digest(data) != value:
+		raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"Frame {value} hash mismatch.")
+
+	return decode_frame(data, force)
+
+
+def decode_legacy_buffer(value: str) -> bytes:
+	"""Legacy text protocol buffer, ":" joined decimal bytes of a full frame"""
+	try:
+		buffer: bytes = bytes(int(e) for e in value.split(":"))
+	except ValueError as error:
+		raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"Invalid buffer. {error}")
+
+	size: int = EPD_WIDTH * EPD_HEIGHT * EPD_BPP // 8
+	if len(buffer) != size:
+		raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"Invalid buffer size {len(buffer)}, expected {size}.")
+
+	return buffer
+
+
+def decode_message(raw: bytes) -> Command:
+	if protocol.is_frame(raw):
+		return decode_frame(raw)
+
+	try:
+		data: list[str] = raw.decode().split("^")
+	except UnicodeDecodeError as error:
+		logging.warning(f"Invalid message. {error=}")
+		raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"Invalid message. {error}")
+
+	# Empty when missing, rejected below as an invalid buffer or hash
+	argument: str = data[1] if len(data) > 1 else ""
+	force: bool = R_MSG_FORCE in data[2:]
 
 	if data[0] == R_MSG_CLEAR:
-		epd_clear()
+		return Command(R_MSG_CLEAR)
 
 	elif data[0] == R_MSG_DRAW:
-		buffer: list[int] = list(int(e) for e in data[1].split(":"))
-		
-		epd_draw(buffer)
-		
+		return Command(R_MSG_DRAW, buffer=decode_legacy_buffer(argument), force=force)
+
+	elif data[0] == R_MSG_DRAW_REF:
+		return decode_frame_ref(argument, force)
+
+	logging.warning(f"Unknown message. {data[0]=}")
+	raise CommandError(R_MSG_DRAW, RETURN_CODE_INVALID_FRAME, f"Unknown message {data[0]}.")
+
+
+def execute(command: Command) -> int:
+	if command.name == R_MSG_CLEAR:
+		return epd_clear()
+
+	if command.delta is not None:
+		return epd_draw_delta(command.delta, command.force)
+
+	return epd_draw(command.buffer, command.force)
+
+
+def handle_message(raw: bytes) -> int:
+	try:
+		command: Command = decode_message(raw)
+	except CommandError as error:
+		return publish_result(error.name, error.result, error.msg)
+
+	return execute(command)
+
+
+def enqueue(raw: bytes) -> None:
+	"""Decode raw and queue it for the display worker"""
+	try:
+		command: Command = decode_message(raw)
+	except CommandError as error:
+		publish_result(error.name, error.result, error.msg)
+		return
+
+	for dropped in draw_queue.put(command):
+		if dropped is command:
+			logging.warning(f"Queue full, command rejected. {len(draw_queue)=}")
+			publish_result(dropped.name, RETURN_CODE_EPD_BUSY, "E-Paper display is busy.")
+		else:
+			publish_result(dropped.name, RETURN_CODE_SUPERSEDED, "Superseded by a newer frame.")
+
+	logging.info(f"enqueue {command.name=} {len(draw_queue)=} {draw_queue.max_depth=} {draw_queue.dropped=}")
+
+
+def epd_status() -> str:
+	return display.panel.state.value
+
+
+def redis_status() -> None:
+	redis_publish(
+		R_MSG_STATUS,
+		epd_status(),
+		display.get_displayed_digest() or "",
+		f"{len(draw_queue)}",
+		f"{draw_queue.max_depth}",
+		f"{draw_queue.dropped}",
+	)
+
+
+def display_worker() -> None:
+	"""Owns the panel, runs queued commands one at a time"""
+	while True:
+		command: Command | None = draw_queue.get(display.idle_timeout())
+		if command is None:
+			if draw_queue.closed:
+				return
+
+			display.sleep_if_idle()
+			continue
+
+		try:
+			execute(command)
+		except Exception as error:
+			logging.error(f"Unable to execute command. {error=}")
+
+
+def redis_event_handler(msg: dict) -> None:
+	if msg["type"] != "message" or msg["channel"] != R_CH_SUB.encode():
+		return
+
+	raw: bytes = msg["data"]
+	logging.info(f"Received redis {msg['channel']=} {len(raw)=}")
+
+	# Answered right away, even while a refresh is running
+	if raw == R_MSG_STATUS.encode():
+		redis_status()
+		return
+
+	enqueue(raw)
+
 
 def redis_exception_handler(ex, pubsub, thread) -> None:
 	logging.error(f"{ex=}")
@@ -129,15 +357,154 @@ def redis_exception_handler(ex, pubsub, thread) -> None:
 	pubsub.close()
 
 
+# Stream ID of the last entry the panel executed, see redis_stream_entry
+redis_stream_last_id: tuple[int, int] | None = None
+
+
+def stream_id(entry_id: bytes) -> tuple[int, int]:
+	ms, _, seq = entry_id.decode().partition("-")
+	return int(ms), int(seq or 0)
+
+
+def redis_stream_dead_letter(entry_id: bytes, fields: dict, deliveries: int) -> None:
+	logging.error(f"Entry failed too often, moved to {R_STREAM_DEAD}. {entry_id=} {deliveries=}")
+
+	redis_client.xadd(R_STREAM_DEAD, {**fields, b"id": entry_id}, maxlen=R_STREAM_DEAD_MAXLEN, approximate=True)
+	redis_client.xack(R_STREAM, R_STREAM_GROUP, entry_id)
+	publish_result(R_MSG_DRAW, RETURN_CODE_EXCEPTION, f"Dropped after {deliveries} deliveries.")
+
+
+def redis_stream_entry(entry_id: bytes, fields: dict | None, deliveries: int = 1) -> None:
+	global redis_stream_last_id
+
+	# None once the entry was trimmed from the stream
+	fields = fields or {}
+	raw: bytes | None = fields.get(R_STREAM_FIELD.encode())
+	logging.info(f"Received redis stream {entry_id=} {deliveries=} {len(raw or b'')=}")
+
+	# A retry older than the last executed entry would replace a newer frame
+	if redis_stream_last_id is not None and stream_id(entry_id) < redis_stream_last_id:
+		logging.warning(f"Stale entry acked without drawing. {entry_id=}")
+		redis_client.xack(R_STREAM, R_STREAM_GROUP, entry_id)
+		publish_result(R_MSG_DRAW, RETURN_CODE_SUPERSEDED, "Superseded by a newer frame.")
+		return
+
+	if deliveries > R_STREAM_MAX_DELIVERIES:
+		redis_stream_dead_letter(entry_id, fields, deliveries)
+		return
+
+	try:
+		result: int = handle_message(raw) if raw is not None else RETURN_CODE_INVALID_FRAME
+	except Exception as error:
+		logging.error(f"Unable to execute entry. {entry_id=} {error=}")
+		result = RETURN_CODE_EXCEPTION
+
+	# Leave the entry pending so it is claimed again once the panel recovers
+	if result in (RETURN_CODE_EPD_BUSY, RETURN_CODE_EXCEPTION):
+		logging.warning(f"Entry left pending. {entry_id=} {result=}")
+		return
+
+	if result in (RETURN_CODE_SUCCESS, RETURN_CODE_UNCHANGED):
+		redis_stream_last_id = stream_id(entry_id)
+
+	redis_client.xack(R_STREAM, R_STREAM_GROUP, entry_id)
+
+
+def redis_stream_entries(entries: list) -> None:
+	"""Handle redelivered entries, oldest first, with their delivery counts from XPENDING"""
+	if not entries:
+		return
+
+	pending: list[dict] = redis_client.xpending_range(
+		R_STREAM, R_STREAM_GROUP, min=entries[0][0], max=entries[-1][0], count=len(entries), consumername=os.getenv("ID")
+	)
+	deliveries: dict[bytes, int] = {p["message_id"]: p["times_delivered"] for p in pending}
+
+	for entry_id, fields in entries:
+		redis_stream_entry(entry_id, fields, deliveries.get(entry_id, 1))
+
+
+def redis_stream_pending() -> None:
+	"""Entries this consumer read before a restart and never acked"""
+	response = redis_client.xreadgroup(R_STREAM_GROUP, os.getenv("ID"), {R_STREAM: "0"})
+
+	for _, entries in response or []:
+		redis_stream_entries(entries)
+
+
+def redis_stream_claim() -> None:
+	"""Take over entries left pending, e.g. by a failed draw"""
+	start_id: bytes | str = "0-0"
+
+	while True:
+		response = redis_client.xautoclaim(
+			R_STREAM, R_STREAM_GROUP, os.getenv("ID"), R_STREAM_CLAIM_IDLE_MS, start_id=start_id
+		)
+		start_id, entries = response[0], response[1]
+
+		redis_stream_entries(entries)
+
+		if start_id in (b"0-0", "0-0"):
+			return
+
+
+def redis_stream_loop() -> None:
+	try:
+		redis_client.xgroup_create(R_STREAM, R_STREAM_GROUP, id="0", mkstream=True)
+	except redis.ResponseError as error:
+		if "BUSYGROUP" not in f"{error}":
+			raise
+
+	redis_stream_pending()
+
+	while True:
+		block: int = R_STREAM_BLOCK_MS
+		if (timeout := display.idle_timeout()) is not None:
+			block = max(1, min(block, int(timeout * 1000)))
+
+		response = redis_client.xreadgroup(
+			R_STREAM_GROUP, os.getenv("ID"), {R_STREAM: ">"}, count=1, block=block
+		)
+
+		# Idle, put the panel to sleep and look for entries that were never acked
+		if not response:
+			display.sleep_if_idle()
+			redis_stream_claim()
+			continue
+
+		for _, entries in response:
+			for entry_id, fields in entries:
+				redis_stream_entry(entry_id, fields)
+
+
+def redis_announce() -> None:
+	# Announce the panel and the payload codecs this device accepts
+	redis_publish(R_MSG_HELLO, EPD_MODEL, f"{EPD_WIDTH}x{EPD_HEIGHT}", f"{EPD_BPP}", ",".join(FRAME_CODECS))
+
+
 if __name__ == "__main__":
-	# Set epd_busy to FALSE by default
-	set_epd_busy(False)
+	# Restore the frame shown before restart
+	display.load_displayed()
+
+	# Leave the panel in deep sleep
+	atexit.register(display.sleep_if_idle, True)
 
 	# Initialize Redis
-	redis_client = redis.Redis(host="localhost", port=6379, password=os.getenv("REDIS_PASSWORD"), decode_responses=True)
-	redis_pubsub = redis_client.pubsub()
-	redis_pubsub.subscribe(**{f"{R_CH_SUB}": redis_event_handler})
-	redis_thread = redis_pubsub.run_in_thread(
-		sleep_time=1, exception_handler=redis_exception_handler
-	)
-	redis_thread.name = "redis pubsub thread"
+	redis_client = redis.Redis(host="localhost", port=6379, password=os.getenv("REDIS_PASSWORD"), decode_responses=False)
+
+	if INGEST == INGEST_STREAM:
+		redis_announce()
+		redis_stream_loop()
+
+	else:
+		display_thread = threading.Thread(target=display_worker, name="display worker", daemon=True)
+		display_thread.start()
+
+		redis_pubsub = redis_client.pubsub()
+		redis_pubsub.subscribe(**{f"{R_CH_SUB}": redis_event_handler})
+		redis_thread = redis_pubsub.run_in_thread(
+			sleep_time=1, exception_handler=redis_exception_handler
+		)
+		redis_thread.name = "redis pubsub thread"
+
+		redis_announce()
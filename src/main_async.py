@@ -0,0 +1,119 @@
+#!/usr/bin/python
+
+import asyncio
+import logging
+import os
+
+import redis.asyncio
+import display
+import main
+
+from concurrent.futures import ThreadPoolExecutor
+from consts import *
+
+
+class RedisBridge:
+	"""
+	Stands in for the sync redis client used by the handlers in main.
+	Publishes are handed to the result publisher coroutine, other calls
+	are run on the event loop and waited for from the display executor.
+	"""
+
+	def __init__(self, client: redis.asyncio.Redis, loop: asyncio.AbstractEventLoop, results: asyncio.Queue) -> None:
+		self.client = client
+		self.loop = loop
+		self.results = results
+
+	def publish(self, channel: str, msg: str) -> None:
+		self.loop.call_soon_threadsafe(self.results.put_nowait, (channel, msg))
+
+	def get(self, key: str) -> bytes | None:
+		return asyncio.run_coroutine_threadsafe(self.client.get(key), self.loop).result()
+
+
+async def subscriber(client: redis.asyncio.Redis, pending: asyncio.Event, decoder: ThreadPoolExecutor) -> None:
+	loop = asyncio.get_running_loop()
+	pubsub = client.pubsub()
+	await pubsub.subscribe(R_CH_SUB)
+
+	main.redis_announce()
+
+	async for msg in pubsub.listen():
+		if msg["type"] != "message":
+			continue
+
+		raw: bytes = msg["data"]
+		logging.info(f"Received redis {msg['channel']=} {len(raw)=}")
+
+		# Answered right away, even while a refresh is running
+		if raw == R_MSG_STATUS.encode():
+			main.redis_status()
+			continue
+
+		# Decompression and frame fetches run off the loop, in arrival order
+		await loop.run_in_executor(decoder, main.enqueue, raw)
+		pending.set()
+
+
+async def display_worker(pending: asyncio.Event, executor: ThreadPoolExecutor) -> None:
+	loop = asyncio.get_running_loop()
+
+	while True:
+		# A command already waiting goes before the deep sleep tail
+		if not pending.is_set():
+			try:
+				await asyncio.wait_for(pending.wait(), display.idle_timeout())
+			except asyncio.TimeoutError:
+				await loop.run_in_executor(executor, display.sleep_if_idle)
+				continue
+
+		pending.clear()
+
+		while (command := main.draw_queue.get_nowait()) is not None:
+			try:
+				# Driver calls block on SPI, GPIO and the BUSY pin, keep them off the loop
+				await loop.run_in_executor(executor, main.execute, command)
+			except Exception as error:
+				logging.error(f"Unable to execute command. {error=}")
+
+
+async def heartbeat() -> None:
+	while True:
+		main.redis_publish(R_MSG_HEARTBEAT, main.epd_status(), f"{len(main.draw_queue)}")
+		await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+async def result_publisher(client: redis.asyncio.Redis, results: asyncio.Queue) -> None:
+	while True:
+		channel, msg = await results.get()
+		await client.publish(channel, msg)
+
+
+async def run() -> None:
+	client = redis.asyncio.Redis(host="localhost", port=6379, password=os.getenv("REDIS_PASSWORD"), decode_responses=False)
+	pending = asyncio.Event()
+	results: asyncio.Queue = asyncio.Queue()
+	executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="epd")
+	decoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="decode")
+
+	main.redis_client = RedisBridge(client, asyncio.get_running_loop(), results)
+
+	try:
+		await asyncio.gather(
+			subscriber(client, pending, decoder),
+			display_worker(pending, executor),
+			heartbeat(),
+			result_publisher(client, results),
+		)
+	finally:
+		decoder.shutdown(wait=True)
+		executor.shutdown(wait=True)
+		display.sleep_if_idle(force=True)
+		await client.aclose()
+
+
+if __name__ == "__main__":
+	# Restore the frame shown before restart
+	display.load_displayed()
+
+	asyncio.run(run())
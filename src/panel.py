@@ -0,0 +1,68 @@
+import threading
+
+from enum import Enum
+from logging import Logger, getLogger
+
+
+log: Logger = getLogger(__name__)
+
+
+class PanelState(Enum):
+	OFF = "off"
+	INITIALISED = "initialised"
+	IDLE_AWAKE = "idle_awake"
+	REFRESHING = "refreshing"
+	SLEEPING = "sleeping"
+
+
+# OFF is always allowed, it marks the panel as unknown after an error
+TRANSITIONS: dict[PanelState, set[PanelState]] = {
+	PanelState.OFF: {PanelState.INITIALISED},
+	PanelState.INITIALISED: {PanelState.REFRESHING, PanelState.SLEEPING},
+	PanelState.REFRESHING: {PanelState.IDLE_AWAKE},
+	PanelState.IDLE_AWAKE: {PanelState.INITIALISED, PanelState.REFRESHING, PanelState.SLEEPING},
+	PanelState.SLEEPING: {PanelState.INITIALISED},
+}
+
+
+class PanelController:
+	"""
+	Owner of the panel. A command acquires it for its whole duration,
+	the state tracks what the hardware is doing so work can be skipped.
+	"""
+
+	def __init__(self) -> None:
+		self._owner = threading.Lock()
+		self._lock = threading.Lock()
+		self._state: PanelState = PanelState.OFF
+
+	@property
+	def state(self) -> PanelState:
+		with self._lock:
+			return self._state
+
+	@property
+	def is_busy(self) -> bool:
+		return self._owner.locked()
+
+	@property
+	def needs_init(self) -> bool:
+		return self.state in (PanelState.OFF, PanelState.SLEEPING)
+
+	def set_state(self, state: PanelState) -> None:
+		with self._lock:
+			if state != PanelState.OFF and state not in TRANSITIONS[self._state]:
+				raise ValueError(f"Invalid panel transition. {self._state=} {state=}")
+
+			log.debug(f"set_state {self._state.value} -> {state.value}")
+			self._state = state
+
+	def acquire(self, timeout: float = 0) -> bool:
+		"""Take ownership of the panel, waiting up to timeout seconds"""
+		if timeout > 0:
+			return self._owner.acquire(timeout=timeout)
+
+		return self._owner.acquire(blocking=False)
+
+	def release(self) -> None:
+		self._owner.release()
@@ -0,0 +1,234 @@
+import compression
+import hashlib
+import re
+import struct
+
+from dataclasses import dataclass
+from consts import *
+
+
+"""
+Binary frame layout, network byte order:
+
+	magic    2s   FRAME_MAGIC
+	version  B    FRAME_VERSION
+	command  B    FRAME_CMD_*
+	flags    B    FRAME_FLAG_*
+	codec    B    FRAME_CODEC_* of the payload, absent in version 1 (raw)
+	width    H    panel width in pixels
+	height   H    panel height in pixels
+	bpp      B    bits per pixel of the payload
+	model    16s  panel model, NUL padded ascii (e.g. "epd7in3e")
+	payload  ...  packed pixel bytes as returned by EPD.getbuffer
+"""
+HEADER: struct.Struct = struct.Struct("!2sBBBBHHB16s")
+HEADER_V1: struct.Struct = struct.Struct("!2sBBBHHB16s")
+
+"""
+FRAME_CMD_DRAW_DELTA payload:
+
+	base     32s  sha256 of the packed buffer the delta applies to
+	runs     ...  repeated (offset I, length H, bytes), replacing
+	              length bytes of the base buffer at offset
+"""
+DELTA_RUN: struct.Struct = struct.Struct("!IH")
+DELTA_RUN_MAX: int = 0xFFFF
+
+DIGEST_SIZE: int = 32
+DIGEST_PATTERN: re.Pattern = re.compile(r"[0-9a-f]{64}")
+
+
+class FrameError(ValueError):
+	pass
+
+
+@dataclass(frozen=True)
+class Frame:
+	command: int
+	flags: int
+	codec: int
+	model: str
+	width: int
+	height: int
+	bpp: int
+	payload: memoryview
+
+	@property
+	def buffer_size(self) -> int:
+		return self.width * self.height * self.bpp // 8
+
+
+def is_frame(data: bytes) -> bool:
+	return data[:len(FRAME_MAGIC)] == FRAME_MAGIC
+
+
+def encode(
+	command: int,
+	payload: bytes = b"",
+	model: str = EPD_MODEL,
+	width: int = EPD_WIDTH,
+	height: int = EPD_HEIGHT,
+	bpp: int = EPD_BPP,
+	flags: int = 0,
+	codec: int = FRAME_CODEC_RAW,
+) -> bytes:
+	"""Build a frame, compressing the packed payload with codec"""
+	header: bytes = HEADER.pack(
+		FRAME_MAGIC, FRAME_VERSION, command, flags, codec, width, height, bpp, model.encode("ascii")
+	)
+	try:
+		return header + compression.compress(codec, payload)
+	except compression.CodecError as error:
+		raise FrameError(f"{error}")
+
+
+def decode(data: bytes) -> Frame:
+	if len(data) < HEADER_V1.size:
+		raise FrameError(f"Frame too short. {len(data)=}")
+
+	version: int = data[len(FRAME_MAGIC)]
+
+	if version == 1:
+		header: struct.Struct = HEADER_V1
+		magic, version, command, flags, width, height, bpp, model = header.unpack_from(data)
+		codec: int = FRAME_CODEC_RAW
+
+	elif version == FRAME_VERSION:
+		header: struct.Struct = HEADER
+		if len(data) < header.size:
+			raise FrameError(f"Frame too short. {len(data)=}")
+		magic, version, command, flags, codec, width, height, bpp, model = header.unpack_from(data)
+
+	else:
+		raise FrameError(f"Unsupported frame version. {version=}")
+
+	if magic != FRAME_MAGIC:
+		raise FrameError(f"Invalid frame magic. {magic=}")
+
+	if codec not in FRAME_CODECS.values():
+		raise FrameError(f"Unsupported codec. {codec=}")
+
+	frame = Frame(
+		command=command,
+		flags=flags,
+		codec=codec,
+		model=model.rstrip(b"\0").decode("ascii", errors="replace"),
+		width=width,
+		height=height,
+		bpp=bpp,
+		payload=memoryview(data)[header.size:],
+	)
+
+	if command == FRAME_CMD_DRAW and codec == FRAME_CODEC_RAW and len(frame.payload) != frame.buffer_size:
+		raise FrameError(f"Invalid payload size. {len(frame.payload)=} {frame.buffer_size=}")
+
+	if command == FRAME_CMD_DRAW_DELTA and codec != FRAME_CODEC_RAW:
+		raise FrameError(f"Delta frames must be raw. {codec=}")
+
+	if command == FRAME_CMD_DRAW_DELTA and len(frame.payload) < DIGEST_SIZE:
+		raise FrameError(f"Delta payload too short. {len(frame.payload)=}")
+
+	return frame
+
+
+def is_supported(frame: Frame) -> bool:
+	return (
+		frame.model == EPD_MODEL
+		and frame.width == EPD_WIDTH
+		and frame.height == EPD_HEIGHT
+		and frame.bpp == EPD_BPP
+	)
+
+
+def unpack(frame: Frame) -> bytes:
+	"""Packed pixel buffer of a draw frame, decompressed into a buffer of the final size"""
+	if frame.codec == FRAME_CODEC_RAW:
+		return frame.payload
+
+	buffer = bytearray(frame.buffer_size)
+	try:
+		compression.decompress_into(frame.codec, frame.payload, buffer)
+	except compression.CodecError as error:
+		raise FrameError(f"{error}")
+
+	return buffer
+
+
+def encode_delta(base: bytes, target: bytes) -> bytes:
+	"""Payload for FRAME_CMD_DRAW_DELTA turning base into target, both packed buffers of equal size"""
+	if len(base) != len(target):
+		raise FrameError(f"Buffer size mismatch. {len(base)=} {len(target)=}")
+
+	payload = bytearray(hashlib.sha256(base).digest())
+
+	def add_run(start: int, end: int) -> None:
+		payload.extend(DELTA_RUN.pack(start, end - start))
+		payload.extend(target[start:end])
+
+	start: int | None = None
+	end: int = 0
+	for i in range(len(target)):
+		if base[i] == target[i]:
+			continue
+
+		if start is None:
+			start = i
+		# Gaps shorter than a run header are cheaper to resend than to split on
+		elif i - end > DELTA_RUN.size or i + 1 - start > DELTA_RUN_MAX:
+			add_run(start, end)
+			start = i
+
+		end = i + 1
+
+	if start is not None:
+		add_run(start, end)
+
+	return bytes(payload)
+
+
+def delta_base(frame: Frame) -> str:
+	return frame.payload[:DIGEST_SIZE].hex()
+
+
+def apply_delta(base: bytes, frame: Frame) -> bytearray:
+	if len(base) != frame.buffer_size:
+		raise FrameError(f"Base size mismatch. {len(base)=} {frame.buffer_size=}")
+
+	buffer = bytearray(base)
+	payload: memoryview = frame.payload
+	pos: int = DIGEST_SIZE
+
+	while pos < len(payload):
+		if pos + DELTA_RUN.size > len(payload):
+			raise FrameError(f"Truncated delta run. {pos=}")
+
+		offset, length = DELTA_RUN.unpack_from(payload, pos)
+		pos += DELTA_RUN.size
+
+		if offset + length > len(buffer) or pos + length > len(payload):
+			raise FrameError(f"Delta run out of bounds. {offset=} {length=}")
+
+		buffer[offset:offset + length] = payload[pos:pos + length]
+		pos += length
+
+	return buffer
+
+
+def digest(data: bytes) -> str:
+	return hashlib.sha256(data).hexdigest()
+
+
+def is_digest(value: str) -> bool:
+	return DIGEST_PATTERN.fullmatch(value) is not None
+
+
+def frame_key(value: str) -> str:
+	"""Redis key of a frame stored by content hash, e.g. epdpi:frame:<sha256>"""
+	return f"{R_KEY_FRAME}{value}"
+
+
+def store(client, data: bytes, ttl: int = R_KEY_FRAME_TTL) -> str:
+	"""Producer side of R_MSG_DRAW_REF, store a frame under its content hash and return the hash"""
+	value: str = digest(data)
+	client.set(frame_key(value), data, ex=ttl)
+	return value
@@ -0,0 +1,68 @@
+import os
+import sys
+
+
+DIR_ROOT: str = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(DIR_ROOT, "src"))
+os.environ.setdefault("ID", "test")
+
+import main
+import protocol
+
+from consts import *
+from draw_queue import DrawQueue
+from main import Command
+
+
+BUFFER_SIZE: int = EPD_WIDTH * EPD_HEIGHT * EPD_BPP // 8
+
+
+def frame(fill: int) -> bytes:
+	return bytes([fill]) * BUFFER_SIZE
+
+
+def delta(base: bytes, target: bytes) -> Command:
+	data: bytes = protocol.encode(FRAME_CMD_DRAW_DELTA, protocol.encode_delta(base, target))
+	return Command(R_MSG_DRAW, delta=protocol.decode(data))
+
+
+def test_coalesce_bounds_unmergeable_deltas() -> None:
+	queue: DrawQueue[Command] = DrawQueue(1, QUEUE_POLICY_COALESCE, main.coalesce)
+
+	superseded: int = 0
+	for i in range(20):
+		# Each delta is against a base that is not pending, none can be merged
+		dropped: list[Command] = queue.put(delta(frame(i), frame(i + 1)))
+		assert len(queue) == 1
+		superseded += len(dropped)
+
+	assert superseded == 19
+	assert queue.dropped == 19
+	assert queue.max_depth == 1
+
+
+def test_coalesce_bound_larger_queue() -> None:
+	queue: DrawQueue[Command] = DrawQueue(3, QUEUE_POLICY_COALESCE, main.coalesce)
+
+	for i in range(10):
+		queue.put(delta(frame(i), frame(i + 1)))
+
+	assert len(queue) == 3
+	assert queue.max_depth == 3
+	# The newest ones are kept, in order
+	assert [protocol.delta_base(queue.get_nowait().delta) for _ in range(3)] == [protocol.digest(frame(i)) for i in (7, 8, 9)]
+
+
+def test_coalesce_keeps_clear_and_merges_delta_into_base() -> None:
+	queue: DrawQueue[Command] = DrawQueue(2, QUEUE_POLICY_COALESCE, main.coalesce)
+
+	assert queue.put(Command(R_MSG_CLEAR)) == []
+	assert queue.put(Command(R_MSG_DRAW, buffer=frame(1))) == []
+
+	dropped: list[Command] = queue.put(delta(frame(1), frame(2)))
+	assert [command.buffer for command in dropped] == [frame(1)]
+
+	assert queue.get_nowait().name == R_MSG_CLEAR
+	merged: Command = queue.get_nowait()
+	assert merged.delta is None
+	assert bytes(merged.buffer) == frame(2)
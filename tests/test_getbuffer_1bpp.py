@@ -0,0 +1,129 @@
+import glob
+import importlib
+import os
+import random
+import sys
+
+import pytest
+from PIL import Image
+
+
+DIR_ROOT: str = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DIR_IMG: str = os.path.join(DIR_ROOT, "img")
+sys.path.append(os.path.join(DIR_ROOT, "lib"))
+
+
+def getbuffer_loop(image: Image.Image, width: int, height: int) -> bytes:
+	"""Previous per-pixel getbuffer of the 1bpp drivers, rows padded to a whole byte"""
+	linewidth: int = (width + 7) // 8
+	buf: list[int] = [0xFF] * (linewidth * height)
+	image_monocolor = image.convert("1")
+	imwidth, imheight = image_monocolor.size
+	pixels = image_monocolor.load()
+	if imwidth == width and imheight == height:
+		for y in range(imheight):
+			for x in range(imwidth):
+				if pixels[x, y] == 0:
+					buf[x // 8 + y * linewidth] &= ~(0x80 >> (x % 8))
+	elif imwidth == height and imheight == width:
+		for y in range(imheight):
+			for x in range(imwidth):
+				newx = y
+				newy = height - x - 1
+				if pixels[x, y] == 0:
+					buf[newx // 8 + newy * linewidth] &= ~(0x80 >> (y % 8))
+	return bytes(b & 0xFF for b in buf)
+
+
+def getbuffer_loop_mirrored(image: Image.Image, width: int, height: int) -> bytes:
+	"""Previous epd2in13_V2 getbuffer, rows mirrored one pixel to the right"""
+	linewidth: int = (width + 7) // 8
+	buf: list[int] = [0xFF] * (linewidth * height)
+	image_monocolor = image.convert("1")
+	imwidth, imheight = image_monocolor.size
+	pixels = image_monocolor.load()
+	if imwidth == width and imheight == height:
+		for y in range(imheight):
+			for x in range(imwidth):
+				if pixels[x, y] == 0:
+					x = imwidth - x
+					buf[x // 8 + y * linewidth] &= ~(0x80 >> (x % 8))
+	elif imwidth == height and imheight == width:
+		for y in range(imheight):
+			for x in range(imwidth):
+				newx = y
+				newy = height - x - 1
+				if pixels[x, y] == 0:
+					newy = imwidth - newy - 1
+					buf[newx // 8 + newy * linewidth] &= ~(0x80 >> (y % 8))
+	return bytes(b & 0xFF for b in buf)
+
+
+def getbuffer_tobytes(image: Image.Image, width: int, height: int) -> bytes:
+	"""Previous getbuffer of the drivers that rotated, then dithered and used tobytes()"""
+	if image.size == (height, width):
+		image = image.rotate(90, expand=True)
+	return image.convert("1").tobytes("raw")
+
+
+def getbuffer_tobytes_inverted(image: Image.Image, width: int, height: int) -> bytes:
+	return bytes(b ^ 0xFF for b in getbuffer_tobytes(image, width, height))
+
+
+REFERENCES = {
+	"epd2in13_V2": getbuffer_loop_mirrored,
+	"epd2in13_V3": getbuffer_tobytes,
+	"epd2in13_V4": getbuffer_tobytes,
+	"epd2in13b_V4": getbuffer_tobytes,
+	"epd2in15b": getbuffer_tobytes,
+	"epd7in5_HD": getbuffer_tobytes,
+	"epd7in5_V2": getbuffer_tobytes_inverted,
+	"epd7in5_V2_old": getbuffer_tobytes_inverted,
+	"epd7in5b_V2": getbuffer_tobytes_inverted,
+	"epd7in5b_V2_old": getbuffer_tobytes_inverted,
+}
+
+MODELS: list[str] = [
+	"epd1in02", "epd1in54", "epd1in54_V2", "epd1in54b", "epd1in54b_V2", "epd1in54c",
+	"epd2in13", "epd2in13_V2", "epd2in13_V3", "epd2in13_V4", "epd2in13b_V3", "epd2in13b_V4",
+	"epd2in13bc", "epd2in13d", "epd2in15b", "epd2in66", "epd2in66b", "epd2in7", "epd2in7_V2",
+	"epd2in7b", "epd2in7b_V2", "epd2in9", "epd2in9_V2", "epd2in9b_V3", "epd2in9b_V4",
+	"epd2in9bc", "epd2in9d", "epd3in52", "epd3in7", "epd4in2", "epd4in26", "epd4in2_V2",
+	"epd4in2b_V2", "epd4in2b_V2_old", "epd4in2bc", "epd5in79", "epd5in79b", "epd5in83_V2",
+	"epd5in83b_V2", "epd5in83bc", "epd7in5_HD", "epd7in5_V2", "epd7in5_V2_old", "epd7in5b_HD",
+	"epd7in5b_V2", "epd7in5b_V2_old", "epd7in5bc", "epd13in3b", "epd13in3k",
+]
+
+
+def random_image(size: tuple[int, int], seed: int) -> Image.Image:
+	# Mid-grey noise, so dithering and the rotation order both show in the output
+	rng = random.Random(seed)
+	return Image.frombytes("L", size, bytes(rng.randrange(256) for _ in range(size[0] * size[1])))
+
+
+def images(width: int, height: int) -> list[tuple[str, Image.Image]]:
+	result: list[tuple[str, Image.Image]] = []
+	for path in sorted(glob.glob(os.path.join(DIR_IMG, "*.bmp"))):
+		image = Image.open(path)
+		if image.size in ((width, height), (height, width)):
+			image.load()
+			result.append((os.path.basename(path), image))
+
+	result.append(("random landscape", random_image((width, height), 1)))
+	result.append(("random portrait", random_image((height, width), 2)))
+	return result
+
+
+@pytest.mark.parametrize("model", MODELS)
+def test_getbuffer_matches_previous(model: str) -> None:
+	epd = importlib.import_module(f"waveshare_epd.{model}").EPD()
+	reference = REFERENCES.get(model, getbuffer_loop)
+
+	for name, image in images(epd.width, epd.height):
+		if model in ("epd1in54b", "epd1in54b_V2") and image.size != (epd.width, epd.height):
+			# Never rotated, a portrait image is refused
+			with pytest.raises(ValueError):
+				epd.getbuffer(image)
+			continue
+
+		assert bytes(epd.getbuffer(image)) == reference(image, epd.width, epd.height), name